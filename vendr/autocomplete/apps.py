@@ -5,3 +5,8 @@ from django.apps import AppConfig
 
 class AutocompleteConfig(AppConfig):
     name = 'autocomplete'
+
+    ''' Register our city count signals. '''
+    def ready(self):
+
+        from . import signals
@@ -0,0 +1,257 @@
+#
+# In-process autocomplete.
+#
+# Each worker keeps a sorted array of normalized city and address strings,
+# and answers prefix queries with a pair of binary searches, so typeahead
+# requests never have to touch Postgres. The indices are loaded lazily on
+# the first query, and then kept up to date by replaying the
+# `CompletionChange` feed every few seconds.
+#
+# ==========================================================================
+
+from __future__ import unicode_literals
+
+import time
+import heapq
+import threading
+import unicodedata
+from bisect import bisect_left, insort
+from datetime import timedelta
+
+from django.db.models import Count
+from django.utils import timezone
+from django.utils.encoding import force_text
+
+from kproperty.models import Location
+from autocomplete.models import CityCount, CompletionChange
+
+
+def normalize(term):
+    """
+    Returns the lowercased term, stripped of accents and extra whitespace.
+    Args:
+        `term` (str) -- The term to normalize.
+    """
+
+    term = unicodedata.normalize('NFKD', force_text(term))
+    term = ''.join(char for char in term if not unicodedata.combining(char))
+
+    return ' '.join(term.lower().split())
+
+
+class PrefixIndex(object):
+    """
+    Sorted array of normalized completions. A prefix matches a contiguous
+    run of the array, which we find with `bisect`.
+    Fields:
+        `keys` (list of str) -- The sorted, normalized completions.
+        `terms` (dict) -- Maps each key to the weight of each of its
+            displayed forms (e.g. 'Toronto' and 'toronto').
+    """
+
+    # Results for prefixes up to this length are memoized, as they match
+    # the largest runs of the array.
+    memo_length = 2
+
+    def __init__(self):
+
+        self.keys = []
+        self.terms = {}
+        self._memo = {}
+
+    @classmethod
+    def build(cls, weights):
+        """
+        Returns an index of the given completions. Note, this sorts the keys
+        once, rather than inserting them one at a time.
+        Args:
+            `weights` (iterable of tuple) -- The (term, weight) completions.
+        """
+
+        index = cls()
+        for term, weight in weights:
+            key = normalize(term)
+            if key and (weight > 0):
+                terms = index.terms.setdefault(key, {})
+                terms[term] = terms.get(term, 0) + weight
+
+        index.keys = sorted(index.terms)
+        return index
+
+    def adjust(self, term, delta):
+        """
+        Adjust a completion's weight, adding or removing it as needed.
+        Args:
+            `term` (str) -- The completion, as it should be displayed.
+            `delta` (int) -- The amount to adjust its weight by.
+        """
+
+        key = normalize(term)
+        if not key:
+            return
+
+        if key not in self.terms:
+            if delta <= 0:
+                return
+            insort(self.keys, key)
+            self.terms[key] = {}
+
+        weights = self.terms[key]
+        weights[term] = weights.get(term, 0) + delta
+        if weights[term] <= 0:
+            del weights[term]
+        if not weights:
+            del self.terms[key]
+            del self.keys[bisect_left(self.keys, key)]
+
+        self._memo.clear()
+
+    def complete(self, prefix, limit=None):
+        """
+        Returns the `limit` heaviest (term, weight) completions of a prefix.
+        Args:
+            `prefix` (str) -- The prefix to complete.
+            `limit` (int) -- The maximum number of completions. If None, every
+                completion is returned.
+        """
+
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+
+        memoize = len(prefix) <= self.memo_length
+        if memoize and (prefix, limit) in self._memo:
+            return self._memo[(prefix, limit)]
+
+        start = bisect_left(self.keys, prefix)
+        end = bisect_left(self.keys, prefix + '\uffff')
+        candidates = (
+                (term, weight) for key in self.keys[start:end]
+                for term, weight in self.terms[key].items()
+        )
+        rank = lambda completion: (-completion[1], completion[0])
+        if limit is None:
+            completions = sorted(candidates, key=rank)
+        else:
+            completions = heapq.nsmallest(limit, candidates, key=rank)
+
+        if memoize:
+            self._memo[(prefix, limit)] = completions
+        return completions
+
+
+class Completions(object):
+    """
+    The city and address indices for this worker.
+    Fields:
+        `refresh_interval` (int) -- Seconds between replays of the feed.
+        `max_age` (int) -- Seconds before the indices are reloaded from
+            scratch. This must be shorter than the feed's retention.
+        `overlap` (int) -- Seconds each replay reaches back past the previous
+            one. Changes commit in any order, so a change recorded before the
+            last replay may only become visible after it. Any change that
+            takes longer than this to commit is picked up on the next reload.
+    """
+
+    KINDS = (CompletionChange.CITY, CompletionChange.ADDRESS)
+
+    refresh_interval = 5
+    max_age = 60 * 60
+    overlap = 60
+
+    def __init__(self):
+
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """
+        Drop the indices. They'll be reloaded on the next query.
+        """
+
+        self.indices = None
+        self.replayed_to, self.seen = None, {}
+        self.loaded_at, self.refreshed_at = 0, 0
+
+    def complete(self, kind, prefix, limit=None):
+        """
+        Returns the `limit` heaviest (term, weight) completions of a prefix.
+        Args:
+            `kind` (str) -- The index to search (i.e. city, or address).
+            `prefix` (str) -- The prefix to complete.
+            `limit` (int) -- The maximum number of completions. If None, every
+                completion is returned.
+        """
+
+        self.refresh()
+        return self.indices[kind].complete(prefix, limit)
+
+    def refresh(self, force=False):
+        """
+        Reload the indices if they're missing or too old. Otherwise, replay
+        any new changes, at most once every `refresh_interval` seconds.
+        Args:
+            `force` (bool) -- Replay the feed now, regardless of the interval.
+        """
+
+        now = time.time()
+        with self._lock:
+            if (self.indices is None) or (now - self.loaded_at > self.max_age):
+                self._load(now)
+            elif force or (now - self.refreshed_at >= self.refresh_interval):
+                self._replay(now)
+
+    def _load(self, now):
+        """
+        (Helper) Build the indices from scratch. Note, the recent changes are
+        read after the snapshot, so any change made while loading is skipped
+        rather than counted twice. Either way, it's corrected on the next
+        reload.
+        """
+
+        replayed_to = timezone.now()
+        cities = CityCount.objects.filter(count__gt=0).\
+                values_list('city', 'count')
+        addresses = Location.objects.values('address').\
+                annotate(count=Count('id')).values_list('address', 'count')
+        indices = {
+                CompletionChange.CITY: PrefixIndex.build(cities),
+                CompletionChange.ADDRESS: PrefixIndex.build(addresses)
+        }
+
+        since = replayed_to - timedelta(seconds=self.overlap)
+        seen = CompletionChange.objects.filter(timestamp__gte=since).\
+                values_list('id', 'timestamp')
+
+        self.indices = indices
+        self.replayed_to, self.seen = replayed_to, dict(seen)
+        self.loaded_at, self.refreshed_at = now, now
+
+    def _replay(self, now):
+        """
+        (Helper) Apply any changes we haven't seen yet. Rather than reading
+        past the last id, each replay rereads the last `overlap` seconds of
+        the feed, and skips the ids it has already applied.
+        """
+
+        replayed_to = timezone.now()
+        since = self.replayed_to - timedelta(seconds=self.overlap)
+        changes = CompletionChange.objects.filter(timestamp__gte=since).\
+                order_by('id').values_list('id', 'timestamp', 'kind', 'term',
+                                           'delta')
+        for change_id, timestamp, kind, term, delta in changes:
+            if change_id not in self.seen:
+                self.indices[kind].adjust(term, delta)
+                self.seen[change_id] = timestamp
+
+        # The next replay won't reach back past this.
+        since = replayed_to - timedelta(seconds=self.overlap)
+        self.seen = {
+                change_id: timestamp
+                for change_id, timestamp in self.seen.items()
+                if timestamp >= since
+        }
+        self.replayed_to, self.refreshed_at = replayed_to, now
+
+
+completions = Completions()
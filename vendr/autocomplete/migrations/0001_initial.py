@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_cities(apps, schema_editor):
+    """
+    Backfill the listing count of every city that already has listings.
+    """
+
+    Location = apps.get_model('kproperty', 'Location')
+    CityCount = apps.get_model('autocomplete', 'CityCount')
+
+    counts = Location.objects.values('city').annotate(count=Count('id'))
+    CityCount.objects.bulk_create([
+        CityCount(city=row['city'], normalized=row['city'].strip().lower(),
+                  count=row['count'])
+        for row in counts
+    ])
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('kproperty', '0013_auto_20170804_1832'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CityCount',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('city', models.CharField(max_length=30, unique=True)),
+                ('normalized', models.CharField(db_index=True, max_length=30)),
+                ('count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(count_cities, migrations.RunPython.noop),
+    ]
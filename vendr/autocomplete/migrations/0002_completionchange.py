@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('autocomplete', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CompletionChange',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('city', 'City'), ('address', 'Address')], max_length=7)),
+                ('term', models.CharField(max_length=100)),
+                ('delta', models.IntegerField()),
+                ('timestamp', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+    ]
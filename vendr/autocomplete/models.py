@@ -1,5 +1,112 @@
+#
+# Autocomplete models.
+#
+# ==========================================================================
+
 from __future__ import unicode_literals
 
-from django.db import models
+from django.db import models, transaction, IntegrityError
+from django.db.models import F, Count
+
+
+class CityCountManager(models.Manager):
+
+    """ Adjust a city's listing count by the given amount. Note, the counter
+        is updated in place, so concurrent adjustments can't clobber each other.
+        Args:
+            city (str) -- The city to adjust.
+            delta (int) -- The amount to adjust the count by.
+    """
+    def adjust(self, city, delta):
+
+        if not city:
+            return
+
+        updated = self.filter(city=city).update(count=F('count') + delta)
+        if updated or (delta < 0):
+            return
+
+        # This is the city's first listing. If another request beat us to
+        # creating its row, then we can just fall back to updating it.
+        try:
+            with transaction.atomic():
+                self.create(city=city, count=delta)
+        except IntegrityError:
+            self.filter(city=city).update(count=F('count') + delta)
+
+    """ Recompute every city's listing count from scratch. """
+    def rebuild(self):
+
+        from kproperty.models import Location
+
+        counts = Location.objects.values('city').annotate(count=Count('id'))
+        with transaction.atomic():
+            self.all().delete()
+            self.bulk_create([
+                CityCount(city=row['city'], count=row['count'],
+                    normalized=CityCount.normalize(row['city']))
+                for row in counts
+            ])
+
+
+class CityCount(models.Model):
+    """
+    The number of listings in each city. This is kept up to date as locations
+    are created, moved, and deleted, so that autocomplete never has to count.
+    Fields:
+        `city` (str) -- The city's name, as it appears on its locations.
+        `normalized` (str) -- The lowercased name, used for prefix lookups.
+        `count` (int) -- The number of listings in the city.
+    """
+
+    objects = CityCountManager()
+
+    city = models.CharField(max_length=30, unique=True)
+    normalized = models.CharField(max_length=30, db_index=True)
+    count = models.IntegerField(default=0)
+
+    def save(self, *args, **kwargs):
+
+        self.normalized = self.normalize(self.city)
+        super(CityCount, self).save(*args, **kwargs)
+
+    @staticmethod
+    def normalize(city):
+        return city.strip().lower()
+
+
+class CompletionChangeManager(models.Manager):
+
+    """ Delete changes that every worker has since reloaded past.
+        Args:
+            before (datetime) -- Changes older than this are deleted.
+    """
+    def prune(self, before):
+
+        return self.filter(timestamp__lt=before).delete()
+
+
+class CompletionChange(models.Model):
+    """
+    Change feed for the in-process autocomplete indices. Each row adjusts the
+    weight of a single completion, and workers replay the rows they haven't
+    seen yet, rather than reloading their indices from scratch.
+    Fields:
+        `kind` (str) -- The index the completion belongs to.
+        `term` (str) -- The completion, as it should be displayed.
+        `delta` (int) -- The amount to adjust the completion's weight by.
+        `timestamp` (datetime) -- When the change was recorded.
+    """
+
+    objects = CompletionChangeManager()
 
-# Create your models here.
+    CITY = 'city'
+    ADDRESS = 'address'
+    _KINDS = (
+            (CITY, 'City'),
+            (ADDRESS, 'Address')
+    )
+    kind = models.CharField(choices=_KINDS, max_length=7)
+    term = models.CharField(max_length=100)
+    delta = models.IntegerField()
+    timestamp = models.DateTimeField(auto_now_add=True, db_index=True)
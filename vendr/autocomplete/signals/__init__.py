@@ -0,0 +1,2 @@
+from kproperty_signals import location_save_receiver, \
+        location_delete_receiver
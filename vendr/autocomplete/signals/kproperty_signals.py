@@ -0,0 +1,54 @@
+#
+# KProperty signals. Keeps the city listing counts, and the autocomplete
+# change feed, in sync with changes to Location models. Note, deleting a
+# property cascades to its location, so property deletions are counted
+# here too.
+#
+# ===============================================================
+
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from kproperty.models import Location
+from autocomplete.models import CityCount, CompletionChange
+
+
+""" (Helper) Record a set of completion changes in the feed.
+    Args:
+        changes (list of tuple) -- The (kind, term, delta) of each change.
+"""
+def record_changes(changes):
+
+    CompletionChange.objects.bulk_create([
+        CompletionChange(kind=kind, term=term, delta=delta)
+        for kind, term, delta in changes if term
+    ])
+
+
+""" Count a location against its new city and address. The place it left
+    is loaded by kproperty's location_previous_receiver. """
+@receiver(post_save, sender=Location)
+def location_save_receiver(sender, instance, created, **kwargs):
+
+    previous_city = getattr(instance, '_previous_city', None)
+    previous_address = getattr(instance, '_previous_address', None)
+
+    changes = []
+    if created or (previous_city != instance.city):
+        CityCount.objects.adjust(previous_city, -1)
+        CityCount.objects.adjust(instance.city, 1)
+        changes += [(CompletionChange.CITY, previous_city, -1),
+                    (CompletionChange.CITY, instance.city, 1)]
+    if created or (previous_address != instance.address):
+        changes += [(CompletionChange.ADDRESS, previous_address, -1),
+                    (CompletionChange.ADDRESS, instance.address, 1)]
+
+    record_changes(changes)
+
+
+@receiver(post_delete, sender=Location)
+def location_delete_receiver(sender, instance, **kwargs):
+
+    CityCount.objects.adjust(instance.city, -1)
+    record_changes([(CompletionChange.CITY, instance.city, -1),
+                    (CompletionChange.ADDRESS, instance.address, -1)])
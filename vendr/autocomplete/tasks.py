@@ -0,0 +1,21 @@
+#
+# Periodic tasks for autocomplete.
+#
+# ================================================================
+
+from __future__ import absolute_import
+from celery import shared_task
+
+from datetime import timedelta
+
+from django.utils import timezone
+
+from autocomplete.models import CompletionChange
+
+
+""" Prune the autocomplete change feed. Workers reload their indices well
+    within a day, so they'll never need anything older. """
+@shared_task
+def completion_change_prune_task():
+
+    CompletionChange.objects.prune(before=timezone.now() - timedelta(days=1))
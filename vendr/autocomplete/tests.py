@@ -1,3 +1,165 @@
-from django.test import TestCase
+from django.test import TestCase, SimpleTestCase
+from django.contrib.auth import get_user_model
 
-# Create your tests here.
+from rest_framework.test import APIRequestFactory, APITestCase
+from rest_framework import status
+
+from kproperty.models import *
+from autocomplete.models import CityCount, CompletionChange
+from autocomplete.completions import PrefixIndex, completions
+from autocomplete.views import LocationSearch
+
+User = get_user_model()
+
+
+'''   Tests for the city listing counts, and the LocationSearch() view. '''
+class TestLocationSearch(APITestCase):
+
+    def setUp(self):
+
+        self.view = LocationSearch.as_view()
+        self.factory = APIRequestFactory()
+        completions.reset()
+
+        self.user = User.objects.create_user(email='test@kanga.xyz', password='test')
+        self.toronto_0 = self.create_house(city='Toronto')
+        self.toronto_1 = self.create_house(city='Toronto')
+        self.tokyo_0 = self.create_house(city='Tokyo')
+
+    ''' (Helper Function) Create a house in the given city. '''
+    def create_house(self, city, address='18 Bay Street'):
+
+        house = House.objects.create(owner=self.user, n_bathrooms=3,
+                n_bedrooms=3, price=4500000, sqr_ftg=4200)
+        Location.objects.create(kproperty=house, address=address,
+                city=city, country='Canada', province='Ontario',
+                postal_code='M230B3', latitude=43.773313, longitude=-79.258729
+        )
+
+        return house
+
+    ''' (Helper Function) Returns the autocomplete results for a term. '''
+    def autocomplete(self, term):
+
+        request = self.factory.get('/v1/autocomplete?type=location&term=' + term)
+        response = self.view(request)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data['cities']
+
+    ''' Addresses are completed alongside cities, if asked for. '''
+    def test_address(self):
+
+        request = self.factory.get('/v1/autocomplete?type=location&term=18 b')
+        self.assertNotIn('addresses', self.view(request).data)
+
+        request = self.factory.get('/v1/autocomplete?type=location&term=18 b'
+                '&addresses=true')
+        addresses = self.view(request).data['addresses']
+        self.assertEqual(addresses, [{'address': '18 Bay Street', 'count': 3}])
+
+    ''' Every match is returned, unless a limit is given. '''
+    def test_limit(self):
+
+        for i in range(12):
+            self.create_house(city='Town {}'.format(i))
+        self.assertEqual(len(self.autocomplete('t')), 14)
+
+        request = self.factory.get('/v1/autocomplete?type=location&term=t'
+                '&limit=1')
+        cities = self.view(request).data['cities']
+        self.assertEqual(cities, [{'city': 'Toronto', 'count': 2}])
+
+    ''' Loaded indices should pick up changes from the feed. '''
+    def test_refresh(self):
+
+        self.assertEqual(self.autocomplete('tof'), [])
+        self.create_house(city='Tofino')
+        self.tokyo_0.delete()
+
+        completions.refresh(force=True)
+        self.assertEqual(self.autocomplete('tof'), [{'city': 'Tofino', 'count': 1}])
+        self.assertEqual(self.autocomplete('tok'), [])
+
+    ''' A change that commits after a later one should still be replayed,
+        but only once. '''
+    def test_refresh_out_of_order(self):
+
+        self.assertEqual(self.autocomplete('tof'), [])
+        first, later = [
+            CompletionChange.objects.create(kind=CompletionChange.CITY,
+                                            term='Tofino', delta=1)
+            for i in range(2)
+        ]
+        first_id = first.id
+        first.delete()
+
+        completions.refresh(force=True)
+        self.assertEqual(self.autocomplete('tof'), [{'city': 'Tofino', 'count': 1}])
+
+        CompletionChange.objects.create(id=first_id, kind=CompletionChange.CITY,
+                                        term='Tofino', delta=1)
+        completions.refresh(force=True)
+        completions.refresh(force=True)
+        self.assertEqual(self.autocomplete('tof'), [{'city': 'Tofino', 'count': 2}])
+
+    ''' Results are matched case-insensitively, and sorted by count. '''
+    def test_autocomplete(self):
+
+        cities = self.autocomplete('to')
+        self.assertEqual(cities, [{'city': 'Toronto', 'count': 2},
+                                  {'city': 'Tokyo', 'count': 1}])
+        self.assertEqual(self.autocomplete('tor'), [{'city': 'Toronto', 'count': 2}])
+
+    ''' Moving a property should move its count to the new city. '''
+    def test_move(self):
+
+        location = self.toronto_0.location
+        location.city = 'Tokyo'; location.save()
+
+        self.assertEqual(CityCount.objects.get(city='Toronto').count, 1)
+        self.assertEqual(CityCount.objects.get(city='Tokyo').count, 2)
+
+    ''' Deleting a property should remove it from its city's count. Cities
+        without listings shouldn't be suggested. '''
+    def test_delete(self):
+
+        self.tokyo_0.delete()
+        self.assertEqual(CityCount.objects.get(city='Tokyo').count, 0)
+        self.assertEqual(self.autocomplete('to'), [{'city': 'Toronto', 'count': 2}])
+
+    ''' Rebuilding the counts should agree with the incremental counts. '''
+    def test_rebuild(self):
+
+        CityCount.objects.rebuild()
+        self.assertEqual(CityCount.objects.get(city='Toronto').count, 2)
+        self.assertEqual(CityCount.objects.get(normalized='tokyo').count, 1)
+
+
+
+'''   Tests for the PrefixIndex() used by autocomplete. '''
+class TestPrefixIndex(SimpleTestCase):
+
+    def setUp(self):
+
+        self.index = PrefixIndex.build([('Toronto', 5), ('Tokyo', 2),
+                                        (u'Montr\xe9al', 3), ('Oakville', 1)])
+
+    ''' Completions are ranked by weight, and then name. '''
+    def test_rank(self):
+
+        self.assertEqual(self.index.complete('to', 10), [('Toronto', 5), ('Tokyo', 2)])
+        self.assertEqual(self.index.complete('T', 1), [('Toronto', 5)])
+
+    ''' Prefixes are matched regardless of case, accents, or spacing. '''
+    def test_normalize(self):
+
+        self.assertEqual(self.index.complete(' MONTRE', 10), [(u'Montr\xe9al', 3)])
+
+    ''' Completions are dropped once their weight reaches zero. '''
+    def test_adjust(self):
+
+        self.index.adjust('Oakville', -1)
+        self.index.adjust('Ottawa', 4)
+        self.assertEqual(self.index.complete('o', 10), [('Ottawa', 4)])
+        self.assertNotIn('oakville', self.index.keys)
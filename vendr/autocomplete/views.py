@@ -9,7 +9,8 @@ from rest_framework.response import Response
 
 import json
 
-from kproperty.models import *
+from autocomplete.models import CompletionChange
+from autocomplete.completions import completions
 
 
 ''' Handles search requests by routing to the appropriate view depending
@@ -30,35 +31,39 @@ def search_router(request):
 '''   Autocomplete for Locations. '''
 class LocationSearch(generics.ListAPIView):
 
-    ''' Filters the queryset according to the specified paramters. '''
-    def get_queryset(self):
-        
-        term = self.request.GET.get('term')
-        if not term:
-            raise Http404('Term must be specified.')
-
-        queryset = Location.objects.filter(city__istartswith=term).distinct('city')
-        return queryset
+    max_limit = 50
 
-    ''' Custom list method. Retrieves the queryset of Location models and
-        serializes each entry as a dictionary containing the city name, and the
-        number of properties in the database (count) in that city. '''
+    ''' Custom list method. Completes the term against the cities in this
+        worker's autocomplete indices. Each completion is serialized as a
+        dictionary containing the name, and the number of properties in the
+        database (count) with it. Results are sorted by count. Every matching
+        city is returned, unless a `limit` is given (at most `max_limit`).
+        Matching addresses are only returned if asked for (addresses=true). '''
     def list(self, request, *args, **kwargs):
         
-        queryset = self.get_queryset()
-
-        # Get the city name and overall count for each city.
-        data = { 'cities': [] }
-        for location in queryset:
-            count = Property.objects.filter(location__city=location.city).count()
-            city = {
-                        'city': location.city,
-                        'count': count
-            }
-            data['cities'].append(city)
+        term = request.GET.get('term')
+        if not term:
+            raise Http404('Term must be specified.')
 
-        # Sort results by count.
-        data['cities'] = sorted(data['cities'], key=lambda k: k['count'], reverse=True)
+        limit = None
+        if 'limit' in request.GET:
+            try:
+                limit = min(int(request.GET['limit']), self.max_limit)
+            except ValueError:
+                limit = self.max_limit
+
+        cities = completions.complete(CompletionChange.CITY, term, limit)
+        data = {
+                'cities': [
+                    { 'city': city, 'count': count } for city, count in cities
+                ]
+        }
+
+        if request.GET.get('addresses') in ('1', 'true'):
+            addresses = completions.complete(CompletionChange.ADDRESS, term, limit)
+            data['addresses'] = [
+                    { 'address': address, 'count': count }
+                    for address, count in addresses
+            ]
 
         return Response(data)
-
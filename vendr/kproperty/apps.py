@@ -9,4 +9,5 @@ class KpropertyConfig(AppConfig):
     ''' Register our signals. '''
     def ready(self):
 	import signals.dispatch
+	import signals.location_signals
         
@@ -0,0 +1,100 @@
+#
+# Buffered counters for Property models.
+#
+# Viewing a property shouldn't write to its row. Instead, views are counted
+# in a Redis hash (one field per property), and periodically flushed to the
+# database in batched `F('views') + n` updates.
+#
+# ==========================================================================
+
+from __future__ import unicode_literals
+
+from collections import defaultdict
+
+import redis
+
+from django.db import transaction
+from django.db.models import F
+from django.core.cache import cache
+
+from vendr_core.publisher import get_redis
+
+
+class ViewCounter(object):
+    """
+    Increment-only view counter.
+    Fields:
+        `key` (str) -- The Redis hash holding the pending views.
+        `flush_key` (str) -- The hash being flushed. The pending views are
+            moved here first, so views counted mid-flush aren't lost.
+    """
+
+    key = 'kproperty.views.pending'
+    flush_key = 'kproperty.views.flushing'
+
+    # Only one worker flushes at a time, otherwise overlapping flushes would
+    # both apply the views being flushed.
+    lock_key = 'kproperty.views.lock'
+    lock_timeout = 60 * 5
+
+    def __init__(self):
+
+        self.redis = get_redis()
+
+    def incr(self, pk):
+        """
+        Count a view, and return the number of views that haven't been
+        flushed yet. Note, views are best-effort, so if Redis is down we
+        simply don't count them.
+        Args:
+            `pk` (int) -- The primary key of the property that was viewed.
+        """
+
+        try:
+            return self.redis.hincrby(self.key, pk, 1)
+        except redis.RedisError:
+            return 0
+
+    def flush(self):
+        """
+        Apply the pending views to the database. Properties with the same
+        number of pending views are updated together, so a flush costs one
+        UPDATE per distinct count, rather than one per property. Returns the
+        number of properties updated.
+        """
+
+        if not cache.add(self.lock_key, True, self.lock_timeout):
+            return 0
+
+        try:
+            return self._flush()
+        finally:
+            cache.delete(self.lock_key)
+
+    def _flush(self):
+
+        from kproperty.models import Property
+
+        # If the last flush didn't finish, then retry its views before
+        # taking any new ones.
+        if not self.redis.exists(self.flush_key):
+            try:
+                self.redis.rename(self.key, self.flush_key)
+            except redis.ResponseError:
+                return 0
+
+        pending = self.redis.hgetall(self.flush_key)
+        pks_by_count = defaultdict(list)
+        for pk, count in pending.items():
+            pks_by_count[int(count)].append(int(pk))
+
+        with transaction.atomic():
+            for count, pks in pks_by_count.items():
+                Property.objects.filter(pk__in=pks).\
+                        update(views=F('views') + count)
+
+        self.redis.delete(self.flush_key)
+        return len(pending)
+
+
+view_counter = ViewCounter()
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.5 on 2026-10-18 14:00
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kproperty', '0013_auto_20170804_1832'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='property',
+            index_together=set([('price', 'id'), ('created_time', 'id')]),
+        ),
+    ]
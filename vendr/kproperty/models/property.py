@@ -7,6 +7,7 @@
 from __future__ import unicode_literals
 
 from datetime import datetime, timedelta
+from collections import defaultdict
 
 from django.db import models
 from django.conf import settings
@@ -23,6 +24,11 @@ from vendr_core.models import IndexedModel
 
 class PropertyManager(InheritanceManager):
 
+    # Relations read by the property serializers.
+    SERIALIZER_SELECT = ('owner', 'location', 'history')
+    SERIALIZER_PREFETCH = ('features', 'tax_records', 'images',
+            'open_houses__rsvp_list__owner')
+
     """ Queue of Property objects to unfeature. """
     def unfeature_queue(self):
 
@@ -35,6 +41,77 @@ class PropertyManager(InheritanceManager):
 
         return unfeature_queue
 
+    """ Load a single property as its concrete type, along with every relation
+        its serializer reads. This costs a fixed number of queries: one for the
+        property (and its one-to-one relations), and one per prefetched
+        relation. Raises `Property.DoesNotExist` if there's no such property.
+        Note, prefetched relations are cached on the instance, so they should
+        only be prefetched if the property isn't going to be modified.
+        Args:
+            pk (int) -- The primary key of the property.
+            prefetch (bool) -- Whether to prefetch the many-to-one relations.
+    """
+    def get_detail(self, pk, prefetch=True):
+
+        queryset = self.select_subclasses().\
+                select_related(*self.SERIALIZER_SELECT)
+        if prefetch:
+            queryset = queryset.prefetch_related(*self.SERIALIZER_PREFETCH)
+
+        try:
+            kproperty = queryset.get(pk=pk)
+        except self.model.DoesNotExist:
+            raise self.model.DoesNotExist(
+                    'property with id={} does not exist.'.format(pk)
+            )
+
+        return self._share_selected(kproperty)
+
+    """ (Helper) `select_subclasses` hands back the concrete instance, but the
+        selected relations are only cached on the `Property` row it was built
+        from. Copy them over, so they aren't fetched again.
+        Args:
+            kproperty (Property) -- A property loaded by `select_subclasses`.
+    """
+    def _share_selected(self, kproperty):
+
+        parent = kproperty
+        while type(parent) is not self.model:
+            link = parent._meta.get_ancestor_link(self.model)
+            parent = getattr(parent, link.name)
+
+        for name in self.SERIALIZER_SELECT:
+            cache_name = self.model._meta.get_field(name).get_cache_name()
+            if hasattr(parent, cache_name):
+                setattr(kproperty, cache_name, getattr(parent, cache_name))
+
+        return kproperty
+
+    """ Load the properties with the given keys as their concrete types, along
+        with every relation their serializers read. Properties are grouped by
+        type, so that a page of any size costs a fixed number of queries (one
+        per type, plus one per prefetched relation).
+        Args:
+            keys (list of tuple) -- The (pk, _type) of each property, in order.
+            prefetch (bool) -- Whether to prefetch the many-to-one relations.
+    """
+    def hydrate(self, keys, prefetch=True):
+
+        pks_by_type = defaultdict(list)
+        for pk, _type in keys:
+            pks_by_type[_type].append(pk)
+
+        kproperties = {}
+        for _type, pks in pks_by_type.items():
+            model = PROPERTY_TYPES.get(_type)
+            queryset = model.objects.all() if model else self.select_subclasses()
+            queryset = queryset.select_related(*self.SERIALIZER_SELECT)
+            if prefetch:
+                queryset = queryset.prefetch_related(*self.SERIALIZER_PREFETCH)
+            kproperties.update(queryset.in_bulk(pks))
+
+        return [kproperties[pk] for pk, _type in keys if pk in kproperties]
+
 
 class Property(IndexedModel):
     """
@@ -81,6 +158,14 @@ class Property(IndexedModel):
     is_featured = models.BooleanField(default=True, db_index=True)
     display_pic = models.PositiveIntegerField(default=0)
 
+    class Meta:
+
+        # Keyset pagination orderings for search.
+        index_together = [
+                ('price', 'id'),
+                ('created_time', 'id'),
+        ]
+
     def get_serializer(self):
         """
         (Abstract) Returns the serializer type for this model.
@@ -122,20 +207,67 @@ class Property(IndexedModel):
         Configuration for property indexing.
         """
 
-        # Meta-Details for indexing.
+        # Meta-Details for indexing. Note, the indexed fields double as the
+        # search filters that `ksearch` can answer from the index.
         _meta = {
                 "_index": "property",
                 "_indexable": [
+                    "_type",
+                    "price",
+                    "sqr_ftg",
+                    "n_bedrooms",
+                    "n_bathrooms",
+                    "is_featured",
+                    "created_time",
                     "location__country",
                     "location__province",
                     "location__city",
                     "location__address",
-                    "location__postal_code"
+                    "location__postal_code",
+                    "location__latitude",
+                    "location__longitude"
                 ],
-                "_doc_type": "property_doc"
+                "_doc_type": "property_doc",
+                "_mapping": {
+                    "properties": {
+                        "pk": {"type": "integer"},
+                        "property_type": {"type": "keyword"},
+                        "price": {"type": "double"},
+                        "sqr_ftg": {"type": "double"},
+                        "n_bedrooms": {"type": "integer"},
+                        "n_bathrooms": {"type": "integer"},
+                        "is_featured": {"type": "boolean"},
+                        "created_time": {"type": "date"},
+                        "location__country": {"type": "keyword"},
+                        "location__province": {"type": "keyword"},
+                        "location__city": {"type": "keyword"},
+                        "location__address": {"type": "keyword"},
+                        "location__postal_code": {"type": "keyword"},
+                        "location__geo_point": {"type": "geo_point"}
+                    }
+                }
         }
 
         return _meta
+
+    def _prepare_document(self, values):
+        """
+        Index the location's coordinates as a single geo-point. Note, `_type`
+        is reserved by ES, so the property's type is indexed under
+        `property_type`.
+        """
+
+        values["property_type"] = values.pop("_type")
+        latitude = values.pop("location__latitude")
+        longitude = values.pop("location__longitude")
+
+        values["location__geo_point"] = None
+        if (latitude is not None) and (longitude is not None):
+            values["location__geo_point"] = {
+                    "lat": float(latitude), "lon": float(longitude)
+            }
+
+        return values
     
 
 '''   Parent for all cooperative ownership properties. '''
@@ -283,3 +415,12 @@ class VacantLand(Property):
         from kproperty.serializers import VacantLandSerializer
         return VacantLandSerializer
 
+
+# Concrete model for each property type.
+PROPERTY_TYPES = {
+        'condo': Condo,
+        'house': House,
+        'townhouse': Townhouse,
+        'manufactured': Manufactured,
+        'vacant_land': VacantLand
+}
@@ -0,0 +1,25 @@
+#
+# Location signals. Loads a location's previous city and address once per
+# save, for the receivers in other apps (autocomplete counts, search cache
+# invalidation) that need to know where a property moved from.
+#
+# ===============================================================
+
+from django.db.models.signals import pre_save
+from django.dispatch import receiver
+
+from kproperty.models import Location
+
+
+""" Keep track of a location's previous city and address, as
+    `_previous_city` and `_previous_address`. Both are None for a new
+    location. """
+@receiver(pre_save, sender=Location)
+def location_previous_receiver(sender, instance, **kwargs):
+
+    instance._previous_city, instance._previous_address = None, None
+    if instance.pk:
+        previous = Location.objects.filter(pk=instance.pk).\
+                values_list('city', 'address').first()
+        if previous:
+            instance._previous_city, instance._previous_address = previous
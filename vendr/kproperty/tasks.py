@@ -10,6 +10,7 @@ import django.dispatch
 from django.conf import settings
 
 from kproperty.models import Property, OpenHouse, RSVP
+from kproperty.counters import view_counter
 from kproperty.signals.dispatch import openhouse_start_signal
 
 
@@ -46,3 +47,9 @@ def openhouse_start():
             )
             openhouse_start_signal.send(sender=openhouse, resource=resource)
 
+
+""" Flush the buffered property views to the database. """
+@shared_task
+def property_views_flush_task():
+
+    view_counter.flush()
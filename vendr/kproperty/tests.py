@@ -1,4 +1,5 @@
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 
 from oauth2_provider.models import Application, AccessToken
 
@@ -9,6 +10,7 @@ from rest_framework.test import force_authenticate
 from kproperty.views import *
 from kproperty.models import *
 from kproperty.serializers import *
+from kproperty.counters import view_counter
 
 User = get_user_model()
 
@@ -377,6 +379,50 @@ class TestPropertyDetail(APITestCase):
                 path=self.house_path, pid=self.house_id,
                 expected_status=status.HTTP_401_UNAUTHORIZED)
 
+    ''' GET: A property and its relations are loaded in a fixed number of
+        queries (the property, plus features, tax records, images, and open
+        houses). '''
+    def test_get_query_count(self):
+
+        request = self.factory.get(self.condo_path)
+        with self.assertNumQueries(5):
+            response = self.view(request, self.condo_id)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['unit_num'], 11)
+        self.assertEqual(len(response.data['features']), 2)
+
+    ''' GET: Views are buffered, and only written to the database on a flush. '''
+    def test_views_buffered(self):
+
+        view_counter.flush()
+        for _ in range(2):
+            request = self.factory.get(self.condo_path)
+            response = self.view(request, self.condo_id)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.assertEqual(response.data['views'], 2)
+        self.assertEqual(Property.objects.get(pk=self.condo_id).views, 0)
+
+        view_counter.flush()
+        self.assertEqual(Property.objects.get(pk=self.condo_id).views, 2)
+
+    ''' Only one flush can run at a time, so views are never applied twice. '''
+    def test_views_flush_lock(self):
+
+        view_counter.flush()
+        views = Property.objects.get(pk=self.condo_id).views
+        request = self.factory.get(self.condo_path)
+        self.view(request, self.condo_id)
+
+        cache.add(view_counter.lock_key, True)
+        self.assertEqual(view_counter.flush(), 0)
+        self.assertEqual(Property.objects.get(pk=self.condo_id).views, views)
+
+        cache.delete(view_counter.lock_key)
+        self.assertEqual(view_counter.flush(), 1)
+        self.assertEqual(Property.objects.get(pk=self.condo_id).views, views + 1)
+
          
 '''   Tests on the Nested Model List views. '''
 class TestNestedModelsList(APITestCase):
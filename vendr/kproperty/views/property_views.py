@@ -1,5 +1,4 @@
 from django.http import Http404
-from django.apps import apps
 from django.contrib.auth.models import User
 
 from rest_framework.views import APIView
@@ -13,6 +12,7 @@ from oauth2_provider.contrib.rest_framework import TokenHasReadWriteScope, Token
 from kproperty.models import *
 from kproperty.serializers import *
 from kproperty.permissions import IsOwnerOrReadOnly
+from kproperty.counters import view_counter
 
 
 '''   Lists all properties. '''
@@ -81,18 +81,15 @@ class PropertyDetail(APIView):
     '''
     def get_object(self, pk):
 
-        # Get the object in question and its serializer. Note, we're
-        # also going to increment its `views`.
+        # Get the object in question and its serializer. Note, we can only
+        # prefetch its relations if we're not going to modify it.
         try:
-            model_type = Property.objects.filter(pk=pk).\
-                            values_list('_type', flat=True)[0]
-            model = apps.get_model(app_label='kproperty', model_name=model_type)
-            kproperty = model.objects.get(pk=pk)
+            kproperty = Property.objects.get_detail(pk,
+                    prefetch=(self.request.method == 'GET'))
             self.check_object_permissions(self.request, kproperty)
             self.serializer = kproperty.get_serializer()
-            kproperty.views += 1; kproperty.save()
             return kproperty
-        except (Property.DoesNotExist, IndexError):
+        except Property.DoesNotExist:
             error_msg = {'error': 'property with id=' + str(pk) + ' does not exist.'}
             dne_exc = APIException(detail=error_msg)
             dne_exc.status_code = status.HTTP_400_BAD_REQUEST
@@ -107,7 +104,10 @@ class PropertyDetail(APIView):
     '''
     def get(self, request, pk, format=None):
         
+        # Count the view. Note, views are buffered and flushed to the database
+        # periodically, so we only add the pending views for display.
         kproperty = self.get_object(pk)
+        kproperty.views += view_counter.incr(kproperty.pk)
         self.serializer = self.serializer(kproperty)
         
         return Response(self.serializer.data)
@@ -26,7 +26,6 @@ from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.common.by import By
 
-from django.apps import apps
 from django.conf import settings
 
 from rest_framework.views import APIView
@@ -61,10 +60,7 @@ class VendrShare(APIView):
     def post(self, request, pk, *args, **kwargs):
 
         # Get the property.
-        model_type = Property.objects.filter(pk=pk).\
-                        values_list('_type', flat=True)[0]
-        model = apps.get_model(app_label='kproperty', model_name=model_type)
-        kproperty = model.objects.get(pk=pk)
+        kproperty = Property.objects.get_detail(pk)
 
         self.username = 'andrew.tallos@gmail.com'
         self.password = 'iZappNewton77'
@@ -357,10 +353,7 @@ class KijijiShare(APIView):
     def post(self, request, pk, *args, **kwargs):
 
         # Get the property.
-        model_type = Property.objects.filter(pk=pk).\
-                        values_list('_type', flat=True)[0]
-        model = apps.get_model(app_label='kproperty', model_name=model_type)
-        kproperty = model.objects.get(pk=pk)
+        kproperty = Property.objects.get_detail(pk)
 
         # Parse it, and _upload to the site.
         listing_info = self._parse_listing(kproperty)
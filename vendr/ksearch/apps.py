@@ -5,3 +5,8 @@ from django.apps import AppConfig
 
 class KsearchConfig(AppConfig):
     name = 'ksearch'
+
+    ''' Register our cache invalidation signals. '''
+    def ready(self):
+
+        from . import signals
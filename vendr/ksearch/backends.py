@@ -0,0 +1,363 @@
+#
+# Search backends.
+#
+# Property searches are answered from the `property` index where possible.
+# The filter grammar accepted by `PropertySearch` is translated into an ES
+# bool query, and only the keys of the requested page are fetched from the
+# index. Those rows are then hydrated from Postgres. Anything the index
+# can't answer (e.g. filters on non-indexed fields) raises a
+# `SearchBackendError`, and the view falls back to the ORM. So does every
+# search, while the index doesn't have the mapping we expect.
+#
+# ==========================================================================
+
+from __future__ import unicode_literals
+
+import time
+import calendar
+
+from elasticsearch.exceptions import ElasticsearchException
+
+from kproperty.models import Property
+from vendr_core.models import es
+
+
+class SearchBackendError(Exception):
+    """
+    Raised when a search can't be answered by the backend, either because
+    the query isn't supported, or because the backend is unavailable.
+    """
+    pass
+
+
+class ElasticSearchBackend(object):
+    """
+    Answers property searches from the index.
+    Fields:
+        `max_result_window` (int) -- The deepest result ES will page to.
+        `mapping_check_interval` (int) -- Seconds between checks of an
+            index whose mapping is out of date.
+    """
+
+    MAP_COORDINATES = ('ne_lng', 'ne_lat', 'sw_lng', 'sw_lat')
+    RANGE_LOOKUPS = ('gt', 'gte', 'lt', 'lte')
+    LOOKUPS = RANGE_LOOKUPS + ('exact', 'in')
+
+    # Model fields that are indexed under a different name.
+    FIELDS = {'id': 'pk', '_type': 'property_type'}
+
+    max_result_window = 10000
+    mapping_check_interval = 60
+
+    def __init__(self, model=Property):
+
+        self.model = model
+        self._meta = model()._index_meta
+        self.field_types = dict(
+                (field, mapping['type']) for field, mapping in
+                self._meta['_mapping']['properties'].items()
+        )
+        self._mapping_current, self._mapping_checked_at = False, None
+
+    def check_mapping(self):
+        """
+        Raise a `SearchBackendError` unless the index has the mapping we
+        expect. Note, an index created before the mapping was added keeps
+        the mapping ES inferred for it (e.g. cities as analyzed text), which
+        would answer term filters and sorts wrongly. The mapping is checked
+        on the first search in each process, and then every
+        `mapping_check_interval` seconds until it's been put in place.
+        """
+
+        if self._mapping_current:
+            return
+
+        now = time.time()
+        if (self._mapping_checked_at is None) or \
+                (now - self._mapping_checked_at >= self.mapping_check_interval):
+            properties = self._get_mapping()
+            self._mapping_current = all(
+                    properties.get(field, {}).get('type') == field_type
+                    for field, field_type in self.field_types.items()
+            )
+            self._mapping_checked_at = now
+
+        if not self._mapping_current:
+            raise SearchBackendError('index mapping is out of date.')
+
+    def build_query(self, filters):
+        """
+        Translate the search filters into an ES bool query.
+        Args:
+            `filters` (QueryDict) -- The search filters.
+        """
+
+        clauses = []
+
+        # Map searches are a bounding box on the location's geo-point.
+        map_keys = [key for key in self.MAP_COORDINATES if key in filters]
+        if map_keys:
+            if len(map_keys) != len(self.MAP_COORDINATES):
+                raise SearchBackendError('incomplete map query.')
+            clauses.append(self._parse_mapkeys(filters))
+
+        for kfilter in filters.keys():
+            if kfilter in self.MAP_COORDINATES:
+                continue
+
+            field, lookup = self._parse_filter(kfilter)
+            value = filters[kfilter]
+            if lookup == 'in' or len(value.split(',')) > 1:
+                values = self._parse_multikey(value)
+                lookup = 'in' if lookup == 'exact' else lookup
+            else:
+                values = [value]
+
+            values = [self._coerce(field, value) for value in values]
+            if lookup in self.RANGE_LOOKUPS:
+                if len(values) > 1:
+                    raise SearchBackendError('invalid range filter.')
+                clauses.append({'range': {field: {lookup: values[0]}}})
+            elif lookup == 'in':
+                clauses.append({'terms': {field: values}})
+            else:
+                clauses.append({'term': {field: values[0]}})
+
+        # Note, filter clauses are unscored and cached by ES.
+        return {'bool': {'filter': clauses}}
+
+    def search(self, query, ordering, size, offset=0, search_after=None):
+        """
+        Returns the (pk, _type) keys of the matching page, in order.
+        Args:
+            `query` (dict) -- The ES query.
+            `ordering` (list of str) -- Django style ordering terms.
+            `size` (int) -- The maximum number of results.
+            `offset` (int) -- The number of results to skip.
+            `search_after` (tuple) -- (Optional) The sort values of the row
+                the page begins after.
+        """
+
+        keys, _ = self._search_keys(query, ordering, size, offset, search_after)
+        return keys
+
+    def search_page(self, query, ordering, size, offset=0, search_after=None):
+        """
+        Returns the properties of the matching page, in order. Documents
+        whose rows have already been deleted (i.e. their deletions haven't
+        been shipped to the index yet) are skipped, and the page is topped up
+        with the results that follow it, so it's only ever short if there
+        are no more results.
+        Args:
+            `query` (dict) -- The ES query.
+            `ordering` (list of str) -- Django style ordering terms.
+            `size` (int) -- The maximum number of results.
+            `offset` (int) -- The number of results to skip.
+            `search_after` (tuple) -- (Optional) The sort values of the row
+                the page begins after.
+        """
+
+        kproperties = []
+        while len(kproperties) < size:
+            n_wanted = size - len(kproperties)
+            keys, last_sort = self._search_keys(query, ordering, n_wanted,
+                    offset, search_after)
+            found, missing = self.hydrate(keys)
+            kproperties += found
+            if (not missing) or (len(keys) < n_wanted):
+                break
+
+            # Note, ES can't combine an offset with `search_after`, so we
+            # carry on from the last hit's sort values.
+            offset, search_after = 0, last_sort
+
+        return kproperties
+
+    def search_all(self, query, ordering):
+        """
+        Returns the (pk, _type) keys of every match, in order. Searches that
+        match more than `max_result_window` documents can't be answered.
+        Args:
+            `query` (dict) -- The ES query.
+            `ordering` (list of str) -- Django style ordering terms.
+        """
+
+        response = self._search({
+                'query': query,
+                'sort': [self._sort_term(term) for term in ordering],
+                'size': self.max_result_window,
+                '_source': ['pk', 'property_type']
+        })
+        if response['hits']['total'] > self.max_result_window:
+            raise SearchBackendError('result window is too large.')
+
+        return self._keys(response)
+
+    def hydrate(self, keys):
+        """
+        Load the properties with the given keys, preserving their order.
+        Returns a tuple of the properties, and the keys of any that are no
+        longer in the database (e.g. deleted properties whose deletions
+        haven't reached the index yet).
+        Args:
+            `keys` (list of tuple) -- The (pk, _type) of each property.
+        """
+
+        kproperties = self.model.objects.hydrate(keys)
+        found = set(kproperty.pk for kproperty in kproperties)
+
+        return kproperties, [key for key in keys if key[0] not in found]
+
+    def _search_keys(self, query, ordering, size, offset=0, search_after=None):
+        """
+        (Helper) Returns the keys of the matching page, and the sort values
+        of its last hit (or None, if it's empty).
+        """
+
+        if (offset + size) > self.max_result_window:
+            raise SearchBackendError('result window is too large.')
+
+        body = {
+                'query': query,
+                'sort': [self._sort_term(term) for term in ordering],
+                'size': size,
+                '_source': ['pk', 'property_type']
+        }
+        if offset:
+            body['from'] = offset
+        if search_after:
+            body['search_after'] = [
+                    self._sort_value(value) for value in search_after
+            ]
+
+        response = self._search(body)
+        hits = response['hits']['hits']
+
+        return self._keys(response), (hits[-1]['sort'] if hits else None)
+
+    def _get_mapping(self):
+        """
+        (Helper) Returns the field mappings of the index's documents.
+        """
+
+        doc_type = self._meta['_doc_type']
+        try:
+            response = es.indices.get_mapping(
+                    index=self._meta['_index'],
+                    doc_type=doc_type
+            )
+        except ElasticsearchException as es_exc:
+            raise SearchBackendError(str(es_exc))
+
+        properties = {}
+        for index in response.values():
+            properties.update(
+                    index['mappings'].get(doc_type, {}).get('properties', {})
+            )
+
+        return properties
+
+    def _search(self, body):
+
+        self.check_mapping()
+        try:
+            return es.search(
+                    index=self._meta['_index'],
+                    doc_type=self._meta['_doc_type'],
+                    body=body
+            )
+        except ElasticsearchException as es_exc:
+            raise SearchBackendError(str(es_exc))
+
+    def _keys(self, response):
+
+        return [
+                (hit['_source']['pk'], hit['_source']['property_type'])
+                for hit in response['hits']['hits']
+        ]
+
+    def _parse_filter(self, kfilter):
+        """
+        (Helper) Split a filter into its field and lookup. Only filters on
+        indexed fields can be answered.
+        """
+
+        field, lookup = kfilter, 'exact'
+        if '__' in kfilter:
+            head, tail = kfilter.rsplit('__', 1)
+            if tail in self.LOOKUPS:
+                field, lookup = head, tail
+
+        field = self.FIELDS.get(field, field)
+        if field not in self.field_types or field == 'location__geo_point':
+            raise SearchBackendError('unsupported filter {}.'.format(kfilter))
+
+        return field, lookup
+
+    def _parse_mapkeys(self, map_keys):
+        """
+        (Helper) Create a bounding box query from the given coordinates.
+        """
+
+        try:
+            lng = (float(map_keys['ne_lng']), float(map_keys['sw_lng']))
+            lat = (float(map_keys['ne_lat']), float(map_keys['sw_lat']))
+        except ValueError:
+            raise SearchBackendError('invalid map query.')
+
+        return {
+            'geo_bounding_box': {
+                'location__geo_point': {
+                    'top_left': {'lat': max(lat), 'lon': min(lng)},
+                    'bottom_right': {'lat': min(lat), 'lon': max(lng)}
+                }
+            }
+        }
+
+    def _parse_multikey(self, multi_key):
+
+        multi_key = multi_key.replace('[', '').replace(']', '')
+        return [key.strip() for key in multi_key.split(',')]
+
+    def _coerce(self, field, value):
+        """
+        (Helper) Convert a filter value to its field's type. Values that
+        don't convert are left for the ORM to reject.
+        """
+
+        field_type = self.field_types[field]
+        try:
+            if field_type == 'integer':
+                return int(value)
+            if field_type == 'double':
+                return float(value)
+        except ValueError:
+            raise SearchBackendError('invalid value for {}.'.format(field))
+
+        if field_type == 'boolean':
+            return value.lower() in ('true', '1')
+
+        return value
+
+    def _sort_term(self, term):
+
+        field = term.lstrip('-')
+        field = self.FIELDS.get(field, field)
+        if field not in self.field_types:
+            raise SearchBackendError('unsupported ordering {}.'.format(term))
+
+        return {field: {'order': 'desc' if term.startswith('-') else 'asc'}}
+
+    def _sort_value(self, value):
+        """
+        (Helper) ES sorts dates on their epoch milliseconds.
+        """
+
+        if hasattr(value, 'utctimetuple'):
+            return (calendar.timegm(value.utctimetuple()) * 1000) + \
+                    (value.microsecond // 1000)
+
+        return value
+
+
+search_backend = ElasticSearchBackend()
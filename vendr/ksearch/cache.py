@@ -0,0 +1,188 @@
+#
+# Search result cache.
+#
+# Search results are cached in memcached under a key made up of the request
+# parameters, and the current version of every namespace tag the request
+# depends on. Tags are simply versioned counters -- one per city, one per
+# property `_type`, and a global tag for unscoped searches. Bumping a tag
+# changes the key of every entry that depends on it, so stale pages are never
+# served again and are left for memcached to evict.
+#
+# ==========================================================================
+
+from __future__ import unicode_literals
+
+import time
+from hashlib import sha256
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+class SearchCache(object):
+    """
+    Tag-versioned cache for serialized search pages.
+    Fields:
+        `prefix` (str) -- Namespace for all keys written by this cache.
+        `timeout` (int) -- Time-to-live for cached result pages.
+    """
+
+    prefix = 'ksearch'
+    timeout = settings.CACHE_TTL
+
+    GLOBAL_TAG = 'global'
+    STATS = ('hits', 'misses', 'invalidations')
+
+    # Request parameters that scope a search to a single tag.
+    CITY_PARAM = 'location__city'
+    TYPE_PARAMS = ('_type', '_type__in')
+
+    def get(self, params):
+        """
+        Returns the cached response for the given request parameters, or
+        None if there isn't one.
+        Args:
+            `params` (QueryDict) -- The search request parameters.
+        """
+
+        response = cache.get(self.get_key(params))
+        self._incr('hits' if response is not None else 'misses')
+
+        return response
+
+    def set(self, params, response):
+        """
+        Cache a serialized response for the given request parameters.
+        Args:
+            `params` (QueryDict) -- The search request parameters.
+            `response` (list) -- The serialized search results.
+        """
+
+        cache.set(self.get_key(params), response, self.timeout)
+
+    def get_key(self, params):
+        """
+        Create a unique identifier for a request. The key is a hash of the
+        sorted request parameters, and the versions of its tags.
+        Args:
+            `params` (QueryDict) -- The search request parameters.
+        """
+
+        cache_key = ''
+        for param in sorted(params):
+            cache_key += param + params[param]
+
+        tags = self.get_tags(params)
+        versions = self._get_versions(tags)
+        for tag in tags:
+            cache_key += '{}:{}'.format(tag, versions[tag])
+
+        return '{}.results.{}'.format(
+                self.prefix,
+                sha256(cache_key.encode('utf-8')).hexdigest()
+        )
+
+    def get_tags(self, params):
+        """
+        Returns the tags that a search depends on. A search scoped to a
+        city and/or a property type only depends on those tags. Anything
+        else depends on the global tag.
+        Args:
+            `params` (QueryDict) -- The search request parameters.
+        """
+
+        tags = []
+        city = params.get(self.CITY_PARAM)
+        if city:
+            tags.append(self.city_tag(city))
+
+        for param in self.TYPE_PARAMS:
+            if params.get(param):
+                _types = params[param].replace('[', '').replace(']', '')
+                tags += [self.type_tag(_type) for _type in _types.split(',')]
+
+        return sorted(tags) if tags else [self.GLOBAL_TAG]
+
+    def invalidate(self, _type=None, cities=()):
+        """
+        Bump the tags affected by a change to a property. Note, any change
+        to a property also invalidates all unscoped (global) searches.
+        Args:
+            `_type` (str) -- The property's type.
+            `cities` (iterable of str) -- The cities the property was, or is, in.
+        """
+
+        tags = [self.GLOBAL_TAG]
+        if _type:
+            tags.append(self.type_tag(_type))
+        tags += [self.city_tag(city) for city in set(cities) if city]
+
+        for tag in tags:
+            try:
+                cache.incr(self._tag_key(tag))
+            except ValueError:
+                cache.set(self._tag_key(tag), self._new_version(), None)
+
+        self._incr('invalidations')
+
+    def stats(self):
+        """
+        Returns the hit, miss, and invalidation counters.
+        """
+
+        keys = dict((self._stat_key(stat), stat) for stat in self.STATS)
+        counters = cache.get_many(keys.keys())
+
+        return dict(
+                (stat, counters.get(key, 0)) for key, stat in keys.items()
+        )
+
+    @staticmethod
+    def city_tag(city):
+        return 'city:{}'.format(city.strip().lower())
+
+    @staticmethod
+    def type_tag(_type):
+        return 'type:{}'.format(_type.strip().lower())
+
+    def _get_versions(self, tags):
+        """
+        (Helper) Returns the current version of each tag. Any tag that's
+        missing (e.g. evicted) is initialized here.
+        """
+
+        keys = dict((self._tag_key(tag), tag) for tag in tags)
+        versions = cache.get_many(keys.keys())
+
+        for key, tag in keys.items():
+            if key not in versions:
+                cache.add(key, self._new_version(), None)
+                versions[key] = cache.get(key)
+
+        return dict((tag, versions[key]) for key, tag in keys.items())
+
+    def _new_version(self):
+        """
+        (Helper) Versions start at the current time, rather than zero, so that
+        an evicted tag can never be reset to a version that's been used.
+        """
+        return int(time.time() * 1000)
+
+    def _incr(self, stat):
+
+        key = self._stat_key(stat)
+        cache.add(key, 0, None)
+        try:
+            cache.incr(key)
+        except ValueError:
+            pass
+
+    def _tag_key(self, tag):
+        return sha256('{}.tag.{}'.format(self.prefix, tag).encode('utf-8')).\
+                hexdigest()
+
+    def _stat_key(self, stat):
+        return '{}.stats.{}'.format(self.prefix, stat)
+
+
+search_cache = SearchCache()
@@ -0,0 +1,240 @@
+#
+# Keyset (cursor) pagination for search results.
+#
+# Limit-offset pagination makes Postgres scan, and then throw away, `offset`
+# rows on every request, so deep pages get slower as the catalogue grows.
+# Instead, we can page on an indexed `(field, id)` ordering, and pick up
+# where the last page left off with a range filter. Every page then costs
+# the same, no matter how deep it is.
+#
+# ==========================================================================
+
+from __future__ import unicode_literals
+
+import json
+import base64
+import binascii
+from collections import OrderedDict
+
+from django.db.models import Q
+from django.utils import six
+from django.utils.dateparse import parse_datetime
+
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.pagination import BasePagination
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset pagination over a `(field, id)` ordering. The next and previous
+    pages are identified by opaque cursor tokens, which encode the position
+    of the boundary row, the direction we're paging in, and the ordering.
+    Fields:
+        `orderings` (tuple of str) -- The orderings we can page on. Each must
+            be backed by a `(field, id)` index.
+    """
+
+    cursor_query_param = 'cursor'
+    limit_query_param = 'limit'
+    ordering_query_param = 'ordering'
+    params = (cursor_query_param, limit_query_param, ordering_query_param)
+
+    default_limit = 20
+    max_limit = 100
+
+    orderings = ('price', '-price', 'created_time', '-created_time')
+    default_ordering = '-created_time'
+
+    # Fields whose cursor values are encoded as ISO 8601 strings.
+    datetime_fields = ('created_time', )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """
+        Returns the page of the queryset that follows (or precedes) the
+        position in the given cursor.
+        Args:
+            `queryset` (QuerySet) -- The queryset being paginated.
+            `request` (Request) -- The request containing the cursor params.
+        """
+
+        def fetch(ordering, position, size):
+
+            # The leading ordering term tells us which side of the
+            # boundary row we're after.
+            page = queryset
+            if position:
+                value, pk = position
+                field = ordering[0].lstrip('-')
+                lookup = 'lt' if ordering[0].startswith('-') else 'gt'
+                page = page.filter(
+                        Q(**{'{}__{}'.format(field, lookup): value}) |
+                        Q(**{field: value, 'id__{}'.format(lookup): pk})
+                )
+
+            return list(page.order_by(*ordering)[:size])
+
+        return self.paginate(fetch, request)
+
+    def paginate_search(self, backend, query, request):
+        """
+        Returns the page of search results that follows (or precedes) the
+        position in the given cursor. The index pages on the same
+        `(field, id)` ordering as the database, so cursors are
+        interchangeable between the two.
+        Args:
+            `backend` (SearchBackend) -- The search backend to query.
+            `query` (dict) -- The backend query.
+            `request` (Request) -- The request containing the cursor params.
+        """
+
+        # Note, the page is topped up past any documents whose rows have
+        # already been deleted, so a short page still means the last page.
+        def fetch(ordering, position, size):
+            return backend.search_page(query, ordering, size,
+                    search_after=position)
+
+        return self.paginate(fetch, request)
+
+    def paginate(self, fetch, request):
+        """
+        Fetch the page at the request's cursor.
+        Args:
+            `fetch` (function) -- Fetches up to `size` rows following
+                `position`, in the given ordering.
+            `request` (Request) -- The request containing the cursor params.
+        """
+
+        self.limit = self.get_limit(request)
+        self.ordering, position, self.reverse = self.decode_cursor(request)
+
+        # Note, paging backwards is just paging forwards on the reversed
+        # ordering, and then flipping the results.
+        descending = self.ordering.startswith('-')
+        ordering = [self.ordering, '-id' if descending else 'id']
+        if self.reverse:
+            ordering = [self._flip(term) for term in ordering]
+
+        page = fetch(ordering, position, self.limit + 1)
+        has_following = len(page) > self.limit
+        page = page[:self.limit]
+        if self.reverse:
+            page.reverse()
+
+        # Determine whether there are any pages on either side of this one.
+        if self.reverse:
+            self.has_next, self.has_previous = True, has_following
+        else:
+            self.has_next, self.has_previous = has_following, bool(position)
+
+        self.page = page
+        return page
+
+    def get_paginated_data(self, data):
+        """
+        Returns the serialized page, along with the adjacent page cursors.
+        Args:
+            `data` (list) -- The serialized page.
+        """
+
+        next_cursor, previous_cursor = None, None
+        if self.page and self.has_next:
+            next_cursor = self.encode_cursor(self.page[-1], reverse=False)
+        if self.page and self.has_previous:
+            previous_cursor = self.encode_cursor(self.page[0], reverse=True)
+
+        return OrderedDict([
+                ('next', next_cursor),
+                ('previous', previous_cursor),
+                ('results', data)
+        ])
+
+    def get_limit(self, request):
+        """
+        Returns the page size, capped at `max_limit`.
+        Args:
+            `request` (Request) -- The request containing the cursor params.
+        """
+
+        try:
+            limit = int(request.query_params.get(
+                    self.limit_query_param, self.default_limit)
+            )
+        except ValueError:
+            limit = 0
+
+        if limit <= 0:
+            exc = APIException(detail={
+                'error': 'pagination params cannot be negative.'
+            })
+            exc.status_code = 401; raise exc
+
+        return min(limit, self.max_limit)
+
+    def decode_cursor(self, request):
+        """
+        Returns a tuple of the ordering, the position, and the direction
+        encoded in the request's cursor. An empty cursor starts at the
+        first page.
+        Args:
+            `request` (Request) -- The request containing the cursor params.
+        """
+
+        ordering = request.query_params.get(
+                self.ordering_query_param, self.default_ordering
+        )
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            if ordering not in self.orderings:
+                self._raise_invalid('invalid ordering {}.'.format(ordering))
+            return ordering, None, False
+
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+            ordering, position, reverse = cursor['o'], cursor['p'], cursor['r']
+            value, pk = position
+        except (TypeError, ValueError, KeyError, binascii.Error):
+            self._raise_invalid('invalid cursor.')
+
+        if ordering not in self.orderings:
+            self._raise_invalid('invalid cursor.')
+
+        # Datetimes are encoded as ISO 8601 strings.
+        if ordering.lstrip('-') in self.datetime_fields:
+            value = parse_datetime(value)
+            if value is None:
+                self._raise_invalid('invalid cursor.')
+
+        return ordering, (value, pk), bool(reverse)
+
+    def encode_cursor(self, instance, reverse):
+        """
+        Returns an opaque cursor pointing at the given instance.
+        Args:
+            `instance` (Model) -- The boundary row of the page.
+            `reverse` (bool) -- Whether the cursor pages backwards.
+        """
+
+        value = getattr(instance, self.ordering.lstrip('-'))
+        if hasattr(value, 'isoformat'):
+            value = value.isoformat()
+
+        # Note, non-integer keys (e.g. UUIDs) are encoded as strings.
+        pk = instance.pk
+        if not isinstance(pk, six.integer_types):
+            pk = six.text_type(pk)
+
+        cursor = {'o': self.ordering, 'p': [value, pk], 'r': reverse}
+        token = base64.urlsafe_b64encode(json.dumps(cursor).encode('utf-8'))
+
+        return token.decode('ascii')
+
+    @staticmethod
+    def _flip(term):
+        return term[1:] if term.startswith('-') else '-' + term
+
+    @staticmethod
+    def _raise_invalid(error_msg):
+
+        exc = APIException(detail={'error': error_msg})
+        exc.status_code = status.HTTP_400_BAD_REQUEST; raise exc
@@ -0,0 +1,4 @@
+from kproperty_signals import property_change_receiver, \
+        location_change_receiver, \
+        property_field_change_receiver, location_index_receiver, \
+        index_shipped_receiver
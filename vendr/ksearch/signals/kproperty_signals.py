@@ -0,0 +1,108 @@
+#
+# KProperty signals. Keeps the search result cache in sync with any
+# changes to Property models and their fields.
+#
+# ===============================================================
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from vendr_core.dispatch import receiver_extended
+from kproperty.models import Property, CoOp, Condo, Freehold, House, \
+        Townhouse, Manufactured, VacantLand, Location, Features, \
+        TaxRecords, Historical, Images
+from ksearch.cache import search_cache
+from vendr_core.models import IndexOutbox, index_shipped_signal
+
+PROPERTIES = [Property, CoOp, Condo, Freehold, House, Townhouse,
+        Manufactured, VacantLand]
+PROPERTY_FIELDS = [Features, TaxRecords, Historical, Images]
+PROPERTY_DOC_TYPE = Property()._index_meta['_doc_type']
+
+
+""" (Helper) Invalidate the given tags once the writer's transaction commits.
+    Until then, concurrent searches still read the old rows, and would cache
+    them under the new tag versions if we bumped the tags any earlier.
+    Args:
+        _type (str) -- The property's type.
+        cities (iterable of str) -- The cities the property was, or is, in.
+"""
+def invalidate_on_commit(_type, cities):
+
+    cities = list(cities)
+    transaction.on_commit(
+            lambda: search_cache.invalidate(_type=_type, cities=cities)
+    )
+
+
+""" (Helper) Invalidate the cache entries for the property with the given pk.
+    Args:
+        kproperty_pk (int) -- The primary key of the property that changed.
+"""
+def invalidate_property(kproperty_pk):
+
+    try:
+        _type, city = Property.objects.filter(pk=kproperty_pk).\
+                values_list('_type', 'location__city')[0]
+    except IndexError:
+        _type, city = None, None
+
+    invalidate_on_commit(_type, [city])
+
+
+""" Invalidate any searches that a property appears in when it's created,
+    updated, or deleted. """
+@receiver_extended(signals=[post_save, post_delete], senders=PROPERTIES)
+def property_change_receiver(sender, instance, **kwargs):
+
+    try:
+        city = instance.location.city
+    except Location.DoesNotExist:
+        city = None
+
+    invalidate_on_commit(instance._type, [city])
+
+
+""" Invalidate searches on a location's city, and on the city it moved out
+    of (loaded by kproperty's location_previous_receiver). """
+@receiver_extended(signals=[post_save, post_delete], senders=[Location])
+def location_change_receiver(sender, instance, **kwargs):
+
+    _type = Property.objects.filter(pk=instance.kproperty_id).\
+            values_list('_type', flat=True).first()
+    cities = [instance.city, getattr(instance, '_previous_city', None)]
+
+    invalidate_on_commit(_type, cities)
+
+
+""" Features, tax records, history, and images are all part of a property's
+    search result, so any change to them invalidates it too. """
+@receiver_extended(signals=[post_save, post_delete], senders=PROPERTY_FIELDS)
+def property_field_change_receiver(sender, instance, **kwargs):
+
+    invalidate_property(instance.kproperty_id)
+
+
+""" Locations are saved after their property, so the property's document
+    has to be refreshed to pick up its location fields. """
+@receiver(post_save, sender=Location)
+def location_index_receiver(sender, instance, **kwargs):
+
+    instance.kproperty._enqueue_index(IndexOutbox.INDEX)
+
+
+""" Searches are answered from the index, so a search made while a change
+    was still in the outbox would cache the old results under the new tag
+    versions. Once the change reaches the index, we invalidate them again. """
+@receiver(index_shipped_signal, sender=IndexOutbox)
+def index_shipped_receiver(sender, documents, **kwargs):
+
+    cities_by_type = {}
+    for doc_type, document in documents:
+        if doc_type == PROPERTY_DOC_TYPE:
+            cities_by_type.setdefault(document.get('property_type'), set()).\
+                    add(document.get('location__city'))
+
+    for _type, cities in cities_by_type.items():
+        search_cache.invalidate(_type=_type, cities=cities)
@@ -1,5 +1,8 @@
 from django.test import TestCase
 from django.contrib.auth import get_user_model
+from django.http import QueryDict
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
 from rest_framework.test import APIRequestFactory, APIClient, APITestCase
 from rest_framework.test import force_authenticate
@@ -9,6 +12,9 @@ from kproperty.models import *
 
 from kuser.models import KUser
 from ksearch.views import *
+from ksearch.backends import ElasticSearchBackend, SearchBackendError
+from ksearch.cache import SearchCache, search_cache
+from vendr_core.models import IndexOutbox
 
 User = get_user_model()
 
@@ -276,4 +282,287 @@ class TestPropertySearchList(APITestCase):
         response = self.view(request)
 
         self.assertEqual(response.status_code, 401)
+
+    ''' Results are hydrated in bulk, so the number of queries shouldn't grow
+        with the size of the page. '''
+    def test_hydration_queries(self):
+
+        with CaptureQueriesContext(connection) as page_0:
+            self.search_property(filters='&_type=house&limit=1&offset=0')
+        with CaptureQueriesContext(connection) as page_1:
+            data = self.search_property(filters='&_type=house&limit=2&offset=0')
+
+        self.assertEqual(len(data), 2)
+        self.assertEqual(len(page_0), len(page_1))
+
+    ''' Database results are ordered as the index orders them, so a page is
+        the same whichever of the two answers it. '''
+    def test_fallback_ordering(self):
+
+        data = self.search_property(filters='&features__feature=Spa&limit=2&offset=0')
+        self.assertEqual(
+                [result['id'] for result in data],
+                [self.user_a_house_0.id, self.user_house_0.id]
+        )
         
+
+
+'''   Tests for the search result cache. '''
+class TestSearchCache(TestPropertySearchList):
+
+    ''' Searches scoped to a city or type only depend on those tags. '''
+    def test_cache_tags(self):
+
+        self.assertEqual(search_cache.get_tags({}), [SearchCache.GLOBAL_TAG])
+        self.assertEqual(
+                search_cache.get_tags({'location__city': 'Toronto',
+                                       '_type__in': '[condo, house]'}),
+                ['city:toronto', 'type:condo', 'type:house']
+        )
+
+    ''' (Helper Function) Run the test transaction's on-commit hooks, as if
+        it had committed. Note, tests run inside a transaction that's never
+        committed, so the cache would otherwise never be invalidated. '''
+    def commit(self):
+
+        callbacks, connection.run_on_commit = connection.run_on_commit, []
+        for _, callback in callbacks:
+            callback()
+
+    ''' Updating a property should invalidate any cached search it's in. '''
+    def test_invalidate_on_update(self):
+
+        filters = '&location__city=Toronto&price__gt=10000000'
+        data = self.search_property(filters=filters)
+        self.assertEqual(len(data), 1)
+
+        self.user_house_0.price = 20000000; self.user_house_0.save()
+        self.commit()
+        data = self.search_property(filters=filters)
+        self.assertEqual(len(data), 2)
+
+    ''' Updating a nested field should invalidate any cached search on it. '''
+    def test_invalidate_on_nested_update(self):
+
+        filters = '&features__feature=Sauna'
+        self.assertEqual(len(self.search_property(filters=filters)), 0)
+
+        Features.objects.create(kproperty=self.user_condo_0, feature='Sauna')
+        self.commit()
+        self.assertEqual(len(self.search_property(filters=filters)), 1)
+
+    ''' Tags are only bumped once the change commits, so a search made before
+        then can't be cached under the new tag versions. '''
+    def test_invalidate_on_commit(self):
+
+        params = {'location__city': 'Toronto'}
+        key = search_cache.get_key(params)
+
+        self.user_house_0.price = 20000000; self.user_house_0.save()
+        self.assertEqual(search_cache.get_key(params), key)
+
+        self.commit()
+        self.assertNotEqual(search_cache.get_key(params), key)
+
+    ''' Searches are answered from the index, so they should be invalidated
+        again once a change reaches it. '''
+    def test_invalidate_on_ship(self):
+
+        filters = '&location__city=Toronto'
+        self.user_house_0.price = 20000000; self.user_house_0.save()
+        self.commit()
+        self.search_property(filters=filters)
+
+        IndexOutbox.objects.drain()
+        misses = search_cache.stats()['misses']
+        self.search_property(filters=filters)
+        self.assertEqual(search_cache.stats()['misses'], misses + 1)
+
+    ''' Deleted documents are invalidated by the values they had. '''
+    def test_invalidate_on_ship_delete(self):
+
+        params = {'_type': 'house'}
+        self.user_house_0.delete()
+        self.commit()
+        key = search_cache.get_key(params)
+
+        change = IndexOutbox.objects.ready_queue().last()
+        self.assertEqual(change.document['property_type'], 'house')
+        self.assertEqual(change.document['location__city'], 'Toronto')
+
+        IndexOutbox.objects.drain()
+        self.assertNotEqual(search_cache.get_key(params), key)
+
+    ''' Pages of the same search must not share a cache entry. '''
+    def test_pages_cached_separately(self):
+
+        page_0 = self.search_property(filters='&limit=1&offset=0')
+        page_1 = self.search_property(filters='&limit=1&offset=1')
+        self.assertNotEqual(page_0[0]['id'], page_1[0]['id'])
+
+
+
+'''   Tests for keyset (cursor) pagination. '''
+class TestKeysetPagination(TestPropertySearchList):
+
+    ''' Walking the next cursors should visit every result exactly once. '''
+    def test_cursor_walk(self):
+
+        data = self.search_property(filters='&cursor=&limit=1&ordering=price')
+        seen = [result['id'] for result in data['results']]
+        while data['next']:
+            data = self.search_property(
+                    filters='&cursor={}&limit=1'.format(data['next'])
+            )
+            seen += [result['id'] for result in data['results']]
+
+        self.assertEqual(len(seen), Property.objects.all().count())
+        self.assertEqual(len(set(seen)), len(seen))
+
+    ''' The previous cursor should take us back to the page we came from. '''
+    def test_previous_cursor(self):
+
+        page_0 = self.search_property(filters='&cursor=&limit=2')
+        self.assertIsNone(page_0['previous'])
+
+        page_1 = self.search_property(
+                filters='&cursor={}&limit=2'.format(page_0['next'])
+        )
+        data = self.search_property(
+                filters='&cursor={}&limit=2'.format(page_1['previous'])
+        )
+        self.assertEqual(data['results'], page_0['results'])
+
+    ''' A malformed cursor should raise a 400. '''
+    def test_invalid_cursor(self):
+
+        request = self.factory.get(self.path + '&cursor=notacursor', format='json')
+        request.GET._mutable = True; request.GET.pop('stype')[0]
+        force_authenticate(self.view)
+        response = self.view(request)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+
+'''   A backend that answers searches from a snapshot of the given properties,
+      as the index would, so that we can test against an index that lags the
+      database. Note, only the default ordering is supported. '''
+class SnapshotBackend(ElasticSearchBackend):
+
+    def __init__(self, kproperties):
+
+        super(SnapshotBackend, self).__init__()
+        self.hits = sorted((
+                {
+                    '_source': {'pk': kproperty.pk, 'property_type': kproperty._type},
+                    'sort': [self._sort_value(kproperty.created_time), kproperty.pk]
+                }
+                for kproperty in kproperties
+        ), key=lambda hit: hit['sort'], reverse=True)
+
+    def _search(self, body):
+
+        hits = self.hits
+        if 'search_after' in body:
+            hits = [hit for hit in hits if hit['sort'] < body['search_after']]
+        offset = body.get('from', 0)
+
+        return {'hits': {
+                    'total': len(self.hits),
+                    'hits': hits[offset:offset + body['size']]
+        }}
+
+
+'''   Tests for hydrating search results that the index is lagging on. '''
+class TestSearchBackendHydration(TestPropertySearchList):
+
+    def setUp(self):
+
+        super(TestSearchBackendHydration, self).setUp()
+
+        self.ordering = ['-created_time', '-id']
+        self.query = {'bool': {'filter': []}}
+        self.backend = SnapshotBackend(Property.objects.all())
+
+        # The second newest property is deleted, but the index still has it.
+        self.kproperties = list(Property.objects.order_by(*self.ordering))
+        self.deleted = self.kproperties.pop(1); self.deleted.delete()
+
+    ''' Hydration should report the properties that no longer exist. '''
+    def test_hydrate_missing(self):
+
+        keys = self.backend.search(self.query, self.ordering, 2)
+        kproperties, missing = self.backend.hydrate(keys)
+        self.assertEqual([kproperty.pk for kproperty in kproperties],
+                [self.kproperties[0].pk])
+        self.assertEqual(missing, [(self.deleted.pk, self.deleted._type)])
+
+    ''' Pages should be topped up past deleted properties, whether they're
+        found by offset, or by cursor. '''
+    def test_search_page(self):
+
+        pks = [kproperty.pk for kproperty in self.kproperties]
+        search_page = lambda size, **kwargs: [
+                kproperty.pk for kproperty in self.backend.search_page(
+                    self.query, self.ordering, size, **kwargs)
+        ]
+
+        self.assertEqual(search_page(2), pks[:2])
+        self.assertEqual(search_page(10), pks)
+
+        position = (self.kproperties[0].created_time, pks[0])
+        self.assertEqual(search_page(2, search_after=position), pks[1:3])
+
+
+'''   Tests for translating search filters into index queries. '''
+class TestSearchBackend(TestCase):
+
+    def setUp(self):
+
+        self.backend = ElasticSearchBackend()
+
+    ''' (Helper Function) Build a query from a querystring of filters. '''
+    def build_query(self, filters):
+
+        return self.backend.build_query(QueryDict(filters))['bool']['filter']
+
+    ''' Standard, range, and multi-key filters. '''
+    def test_filters(self):
+
+        clauses = self.build_query('price__gt=1000&location__city=Toronto&'
+                                   '_type__in=[condo, house]')
+        self.assertIn({'range': {'price': {'gt': 1000.0}}}, clauses)
+        self.assertIn({'term': {'location__city': 'Toronto'}}, clauses)
+        self.assertIn({'terms': {'property_type': ['condo', 'house']}}, clauses)
+
+    ''' Map searches become a bounding box on the geo-point. '''
+    def test_map_filter(self):
+
+        clauses = self.build_query('ne_lat=44&ne_lng=-79&sw_lat=43&sw_lng=-80')
+        box = clauses[0]['geo_bounding_box']['location__geo_point']
+        self.assertEqual(box['top_left'], {'lat': 44.0, 'lon': -80.0})
+        self.assertEqual(box['bottom_right'], {'lat': 43.0, 'lon': -79.0})
+
+    ''' Filters on non-indexed fields are left to the database. '''
+    def test_unsupported_filter(self):
+
+        with self.assertRaises(SearchBackendError):
+            self.build_query('features__feature=Pool')
+        with self.assertRaises(SearchBackendError):
+            self.build_query('ne_lat=44&ne_lng=-79')
+
+    ''' An index that was mapped dynamically can't answer searches, until it
+        has our mapping. '''
+    def test_mapping_check(self):
+
+        properties = dict(self.backend._meta['_mapping']['properties'])
+        properties['location__city'] = {'type': 'text'}
+        self.backend._get_mapping = lambda: properties
+        self.backend.mapping_check_interval = 0
+
+        with self.assertRaises(SearchBackendError):
+            self.backend.check_mapping()
+
+        properties['location__city'] = {'type': 'keyword'}
+        self.backend.check_mapping()
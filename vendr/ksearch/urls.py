@@ -3,5 +3,6 @@ from . import views
 
 urlpatterns = [
         url(r'^$', views.search_router),
+        url(r'^/cache-stats/$', views.SearchCacheStats.as_view()),
 ]
 
@@ -3,19 +3,17 @@
 #
 # ==========================================================================
 
-from hashlib import sha256
 from operator import and_ as AND
 
 from django.shortcuts import render
 from django.http import HttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.core.exceptions import FieldError
-from django.core.cache import cache
 from django.contrib.auth import get_user_model
 from django.db.models import Q
 from django.contrib.gis.geos import Polygon
 
-from rest_framework import generics, status
+from rest_framework import generics, status, permissions
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.decorators import api_view
@@ -27,25 +25,13 @@ import kproperty.models
 from kproperty.models import *
 from kproperty.serializers import *
 from kuser.serializers import UserReadSerializer
+from ksearch.backends import search_backend, SearchBackendError
+from ksearch.cache import search_cache
+from ksearch.pagination import KeysetPagination
 
 User = get_user_model()
 
 
-""" Create a unique identifier for a request.
-    Args:
-        request_params (OrderedDict) -- The request key=value pairs.
-"""
-def generate_cache_key(request_params):
-
-    # Hash the sorted request, and check if it's in our cache.
-    cache_key = ''
-    for param in sorted(request_params):
-        cache_key += param + request_params[param]
-
-    cache_key = sha256(cache_key).hexdigest()
-    return cache_key
-
-
 """ Handles search requests by routing to the appropriate view depending
     on the 'type' specified.
     Args:
@@ -81,53 +67,119 @@ class PropertySearch(generics.ListAPIView):
     # of flexibility if, for some inexplicable reason, we decide to use a different
     # pagination scheme.
     pagination_class = api_settings.DEFAULT_PAGINATION_CLASS
+
+    # The order of limit-offset (and unpaginated) results, whether they come
+    # from the index or the database, so that a page is the same either way.
+    default_ordering = ('-created_time', '-id')
     
     """ Overrides the default 'list()' method. We have a number of different model
         types, and a number of different (optional) filters.
         The first step is to parse the pagination parameters (if any) because we
         don't want to mix them up with the Property filter parameters. Once this is
-        taken care of, we can construct our queryset. We then apply our paginator
+        taken care of, we try to answer the search from the index, and fall back
+        to constructing our queryset if we can't. We then apply our paginator
         to its results and return the serialized response.
         Args:
             request (OrderedDict) -- The GET request.
     """
     def list(self, request):
         
-        # Parse the pagination parameters (if any), and generate the unique
-        # cache key for the request.
+        # Parse the pagination parameters (if any). Note, the pagination
+        # parameters must be part of the cache key, but not the filters.
         paginator = self.get_paginator(request)
-        cache_key = generate_cache_key(request.GET)
+        cache_params = request.GET.copy()
+        for param, value in self.pagination_params.items():
+            cache_params[param] = value
 
         # Check if the request is in our cache. If not, then we'll have to
         # handle it and add the result.
-        response = cache.get(cache_key)
-        if not response:
+        response = search_cache.get(cache_params)
+        if response is None:
 
-            # Get the queryset, and apply pagination if applicable.
+            # Build both the index query and the queryset before the pagination
+            # params are put back, so that neither treats them as filters.
+            try:
+                query = search_backend.build_query(request.GET)
+            except SearchBackendError:
+                query = None
             queryset = self.get_queryset()
-            if paginator:
-                request.GET['limit'] = paginator.limit
-                request.GET['offset'] = paginator.offset
-                queryset = paginator.paginate_queryset(queryset, request, self)
+            for param, value in self.pagination_params.items():
+                request.GET[param] = value
+
+            # Search the index, and fall back to the database if need be.
+            kproperties = None
+            if query is not None:
+                try:
+                    kproperties = self.search_index(query, paginator, request)
+                except SearchBackendError:
+                    kproperties = None
+
+            if kproperties is None:
+                kproperties = queryset.order_by(*self.default_ordering)
+                if paginator:
+                    kproperties = paginator.paginate_queryset(kproperties,
+                            request, self)
+                kproperties = Property.objects.hydrate(
+                        [(kproperty.pk, kproperty._type) for kproperty in kproperties]
+                )
             
             # Serialize queryset, and add it to our cache.
             response = []
-            for kproperty in queryset:
+            for kproperty in kproperties:
                 serializer = kproperty.get_serializer()
                 response.append(serializer(kproperty).data)
 
-            cache.set(cache_key, response)
+            # Cursor paginated responses also carry the adjacent page cursors.
+            if isinstance(paginator, KeysetPagination):
+                response = paginator.get_paginated_data(response)
+
+            search_cache.set(cache_params, response)
             
         return Response(response)
+
+    """ Answer the search from the index. Only the requested page is fetched
+        from the database.
+        Args:
+            query (dict) -- The index query.
+            paginator (BasePagination) -- The paginator, if any.
+            request (OrderedDict) -- The GET request.
+    """
+    def search_index(self, query, paginator, request):
+
+        if isinstance(paginator, KeysetPagination):
+            return paginator.paginate_search(search_backend, query, request)
+
+        ordering = list(self.default_ordering)
+        if paginator:
+            return search_backend.search_page(query, ordering,
+                    size=paginator.get_limit(request),
+                    offset=paginator.get_offset(request)
+            )
+
+        keys = search_backend.search_all(query, ordering)
+        kproperties, _ = search_backend.hydrate(keys)
+
+        return kproperties
     
     """ Handle pagination, if any pagination parameters are passed in. If the
         appropriate params are present and valid, then we'll return an instance
         of our pagination class (we're using Limit Offset Pagination). Otherwise,
         we'll return None.
+        Clients can opt in to cursor pagination by passing a `cursor` param
+        (which can be empty for the first page), in which case we'll return
+        an instance of our keyset paginator instead.
         Args:
             request (OrderedDict) -- The GET request.
     """
     def get_paginator(self, request):
+
+        self.pagination_params = {}
+        if KeysetPagination.cursor_query_param in request.GET:
+            for param in KeysetPagination.params:
+                if param in request.GET:
+                    self.pagination_params[param] = request.GET.pop(param)[0]
+
+            return KeysetPagination()
         
         try:
             limit, offset = request.GET.pop('limit')[0], request.GET.pop('offset')[0]
@@ -139,6 +191,7 @@ class PropertySearch(generics.ListAPIView):
             
             paginator = self.pagination_class()
             paginator.limit = limit; paginator.offset = offset
+            self.pagination_params = {'limit': limit, 'offset': offset}
             return paginator
         except KeyError:
             return None
@@ -146,7 +199,9 @@ class PropertySearch(generics.ListAPIView):
     """ Filters the queryset according to the specified parameters. """
     def get_queryset(self):
         
-        queryset = Property.objects.select_subclasses()
+        # Note, we only need enough of each row to page on, and to hydrate
+        # the page with. There's no need to join every subclass table.
+        queryset = Property.objects.only('id', '_type', 'price', 'created_time')
         
         # Construct a filter chain from the given parameters.
         filter_args = self._generate_filter_chain(self.request.GET)
@@ -222,6 +277,15 @@ class PropertySearch(generics.ListAPIView):
         return [key.encode('utf-8').strip() for key in multi_key]
 
 
+"""   Reports the search cache's hit, miss, and invalidation counters. """
+class SearchCacheStats(APIView):
+
+    permission_classes = ( permissions.IsAdminUser, )
+
+    def get(self, request, format=None):
+        return Response(search_cache.stats())
+
+
 """   Search view for User objects. """
 class UserSearch(generics.ListAPIView):
 
@@ -0,0 +1,169 @@
+#
+# Cached unread counters for notifications and chats.
+#
+# Clients poll for badge counts far more often than they read their inbox,
+# so each user's unread notifications and unopened chats are kept in Redis
+# sets, and counted with a single SCARD. Sets, rather than plain counters,
+# make every update idempotent, so a repeated signal can't skew the count.
+# A missing set (e.g. evicted, or never loaded) is rebuilt from Postgres on
+# the next read, and every set expires after a day, so any drift is
+# corrected on its own.
+#
+# ==========================================================================
+
+from __future__ import unicode_literals
+
+import redis
+
+from django.utils.encoding import force_text
+
+from vendr_core.publisher import get_redis
+
+
+class UnreadCounter(object):
+    """
+    Per-user set of unread item ids.
+    Fields:
+        `name` (str) -- The name of the counter (e.g. 'notifications').
+        `ttl` (int) -- Seconds before a set is rebuilt from scratch.
+    """
+
+    # Every loaded set holds this member, so that an empty set can be told
+    # apart from one that's missing.
+    sentinel = '-'
+
+    ttl = 60 * 60 * 24
+
+    # Adds members to a set only if it's loaded. Otherwise, the set would
+    # only hold the new members, and undercount until it expires.
+    ADD_SCRIPT = """
+        if redis.call('exists', KEYS[1]) == 1 then
+            return redis.call('sadd', KEYS[1], unpack(ARGV))
+        end
+        return 0
+    """
+
+    def __init__(self, name, load):
+        """
+        Args:
+            `name` (str) -- The name of the counter.
+            `load` (function) -- Returns the ids of a user's unread items,
+                given the user's pk.
+        """
+
+        self.name = name
+        self.load = load
+        self.redis = get_redis()
+        self._add = self.redis.register_script(self.ADD_SCRIPT)
+
+    def count(self, user_pk):
+        """
+        Returns the number of unread items the user has.
+        Args:
+            `user_pk` (int) -- The primary key of the user.
+        """
+
+        key = self._key(user_pk)
+        try:
+            count = self.redis.scard(key)
+        except redis.RedisError:
+            return len(self.load(user_pk))
+
+        if count:
+            return count - 1
+
+        # Rebuild the set. Note, this reads the same rows the set is built
+        # from, so the count we return is exact either way.
+        members = [force_text(member) for member in self.load(user_pk)]
+        try:
+            pipeline = self.redis.pipeline()
+            pipeline.sadd(key, self.sentinel, *members)
+            pipeline.expire(key, self.ttl)
+            pipeline.execute()
+        except redis.RedisError:
+            pass
+
+        return len(members)
+
+    def add(self, user_pks, member):
+        """
+        Mark an item as unread for each of the given users.
+        Args:
+            `user_pks` (iterable of int) -- The users' primary keys.
+            `member` -- The id of the item.
+        """
+        self._update(user_pks, member, added=True)
+
+    def remove(self, user_pks, member):
+        """
+        Mark an item as read for each of the given users.
+        Args:
+            `user_pks` (iterable of int) -- The users' primary keys.
+            `member` -- The id of the item.
+        """
+        self._update(user_pks, member, added=False)
+
+    def add_many(self, members):
+        """
+        Mark a batch of items as unread, in a single round-trip.
+        Args:
+            `members` (iterable of tuple) -- The (user_pk, member) pairs.
+        """
+
+        members = list(members)
+        try:
+            pipeline = self.redis.pipeline(transaction=False)
+            for user_pk, member in members:
+                self._add(keys=[self._key(user_pk)], args=[force_text(member)],
+                        client=pipeline)
+            pipeline.execute()
+        except redis.RedisError:
+            self._invalidate(user_pk for user_pk, member in members)
+
+    def _update(self, user_pks, member, added):
+        """
+        (Helper) Add or remove an item from each user's set. If Redis is
+        unavailable, the sets are dropped, so they're rebuilt once it's back.
+        """
+
+        user_pks = list(user_pks)
+        try:
+            pipeline = self.redis.pipeline(transaction=False)
+            for user_pk in user_pks:
+                if added:
+                    self._add(keys=[self._key(user_pk)],
+                            args=[force_text(member)], client=pipeline)
+                else:
+                    pipeline.srem(self._key(user_pk), force_text(member))
+            pipeline.execute()
+        except redis.RedisError:
+            self._invalidate(user_pks)
+
+    def _invalidate(self, user_pks):
+
+        try:
+            self.redis.delete(*[self._key(user_pk) for user_pk in user_pks])
+        except redis.RedisError:
+            pass
+
+    def _key(self, user_pk):
+        return 'kuser.unread.{}.{}'.format(self.name, user_pk)
+
+
+def _unread_notifications(user_pk):
+
+    from kuser.models import BaseNotification
+    return list(BaseNotification.objects.
+            filter(recipient=user_pk, is_viewed=False).
+            values_list('pk', flat=True))
+
+
+def _unopened_chats(user_pk):
+
+    from kuser.models import Chat
+    return list(Chat.objects.filter(participants=user_pk, opened=False).
+            values_list('pk', flat=True))
+
+
+notification_counter = UnreadCounter('notifications', _unread_notifications)
+chat_counter = UnreadCounter('chats', _unopened_chats)
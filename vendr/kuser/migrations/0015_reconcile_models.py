@@ -0,0 +1,359 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import uuid
+
+import custom_storage.vendr_storage
+from django.conf import settings
+import django.contrib.postgres.fields
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+import kuser.models.user
+
+
+def copy_transaction_notifications(apps, schema_editor):
+    """
+    Move each transaction notification's shared columns onto its new
+    BaseNotification row, keeping its id, so that the offer and contract
+    notifications that extend it keep their rows as well. Dynamic clause
+    notifications are dropped below, so their rows are kept as the contract
+    notifications they extend.
+    """
+
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+    BaseNotification = apps.get_model('kuser', 'BaseNotification')
+    TransactionNotification = apps.get_model('kuser', 'TransactionNotification')
+
+    dynamic_clause_types = set(ContentType.objects.filter(
+            app_label='kuser',
+            model='dynamicclausenotification'
+    ).values_list('pk', flat=True))
+    if dynamic_clause_types:
+        contract_type, _ = ContentType.objects.get_or_create(
+                app_label='kuser',
+                model='contractnotification'
+        )
+
+    batch = []
+    for notification in TransactionNotification.objects.iterator():
+        content_type_id = notification._content_type_id
+        if content_type_id in dynamic_clause_types:
+            content_type_id = contract_type.pk
+
+        # Note, these notifications never had a resource.
+        batch.append(BaseNotification(
+                id=notification.id,
+                recipient_id=notification.recipient_id,
+                sender=notification.sender,
+                description=notification.description,
+                is_viewed=notification.is_viewed,
+                timestamp=notification.timestamp,
+                resource='',
+                _content_type_id=content_type_id
+        ))
+        if len(batch) == 1000:
+            BaseNotification.objects.bulk_create(batch)
+            batch = []
+    BaseNotification.objects.bulk_create(batch)
+
+    TransactionNotification.objects.update(basenotification_ptr=models.F('id'))
+
+    # Note, Postgres won't alter a table with deferred foreign key checks
+    # still pending, and the tables written above are altered next.
+    schema_editor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+
+def generate_verification_tokens(apps, schema_editor):
+    """
+    Give each existing user their own verification token. Note, adding the
+    column gives every existing row the same token.
+    """
+
+    KUser = apps.get_model('kuser', 'KUser')
+    for pk in KUser.objects.values_list('pk', flat=True).iterator():
+        KUser.objects.filter(pk=pk).update(_verification_token=uuid.uuid4())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('kuser', '0014_kuser_favourites'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BaseAccount',
+            fields=[
+                ('id', models.UUIDField(db_index=True, default=uuid.uuid4, primary_key=True, serialize=False)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='accounts', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        # Note, the timestamp is set by the copy below, and only becomes
+        # auto_now_add once it's done.
+        migrations.CreateModel(
+            name='BaseNotification',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('sender', models.CharField(max_length=100)),
+                ('description', models.CharField(blank=True, max_length=150)),
+                ('is_viewed', models.BooleanField(db_index=True, default=False)),
+                ('timestamp', models.DateTimeField()),
+                ('resource', models.URLField(db_index=True)),
+                ('_content_type', models.ForeignKey(editable=False, on_delete=django.db.models.deletion.CASCADE, to='contenttypes.ContentType')),
+                ('recipient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Chat',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('opened', models.BooleanField(default=False)),
+                ('participants', models.ManyToManyField(to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Message',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('sender', models.PositiveIntegerField(editable=False)),
+                ('sender_name', models.CharField(editable=False, max_length=51)),
+                ('content', models.TextField()),
+                ('timestamp', models.DateTimeField(auto_now_add=True)),
+                ('chat', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='messages', to='kuser.Chat')),
+            ],
+            options={
+                'ordering': ['timestamp'],
+            },
+        ),
+        migrations.CreateModel(
+            name='AdvanceStageNotification',
+            fields=[
+                ('basenotification_ptr', models.OneToOneField(auto_created=True, on_delete=django.db.models.deletion.CASCADE, parent_link=True, primary_key=True, serialize=False, to='kuser.BaseNotification')),
+                ('_type', models.CharField(default='advance', editable=False, max_length=8)),
+                ('stage', models.PositiveIntegerField()),
+                ('kproperty_address', models.CharField(default='kproperty', editable=False, max_length=35)),
+                ('_is_owner', models.BooleanField(default=False, editable=False)),
+            ],
+            bases=('kuser.basenotification',),
+        ),
+        migrations.CreateModel(
+            name='BankAccount',
+            fields=[
+                ('baseaccount_ptr', models.OneToOneField(auto_created=True, on_delete=django.db.models.deletion.CASCADE, parent_link=True, primary_key=True, serialize=False, to='kuser.BaseAccount')),
+                ('bank', models.CharField(max_length=64)),
+                ('institution_number', models.CharField(max_length=3)),
+                ('branch_number', models.CharField(max_length=5)),
+                ('account_number', models.CharField(max_length=12)),
+            ],
+            bases=('kuser.baseaccount',),
+        ),
+        migrations.CreateModel(
+            name='ClauseChangeNotification',
+            fields=[
+                ('basenotification_ptr', models.OneToOneField(auto_created=True, on_delete=django.db.models.deletion.CASCADE, parent_link=True, primary_key=True, serialize=False, to='kuser.BaseNotification')),
+                ('_type', models.CharField(default='contract', editable=False, max_length=8)),
+                ('n_changes', models.PositiveIntegerField()),
+                ('kproperty_address', models.CharField(default='kproperty', editable=False, max_length=35)),
+                ('_is_owner', models.BooleanField(default=False, editable=False)),
+            ],
+            bases=('kuser.basenotification',),
+        ),
+        migrations.CreateModel(
+            name='OpenHouseCancelNotification',
+            fields=[
+                ('basenotification_ptr', models.OneToOneField(auto_created=True, on_delete=django.db.models.deletion.CASCADE, parent_link=True, primary_key=True, serialize=False, to='kuser.BaseNotification')),
+                ('_type', models.CharField(default='schedule', editable=False, max_length=8)),
+                ('openhouse_owner', models.CharField(default='openhouse_owner', editable=False, max_length=20)),
+                ('openhouse_address', models.CharField(default='kproperty', editable=False, max_length=35)),
+            ],
+            options={
+                'abstract': False,
+            },
+            bases=('kuser.basenotification',),
+        ),
+        migrations.CreateModel(
+            name='OpenHouseChangeNotification',
+            fields=[
+                ('basenotification_ptr', models.OneToOneField(auto_created=True, on_delete=django.db.models.deletion.CASCADE, parent_link=True, primary_key=True, serialize=False, to='kuser.BaseNotification')),
+                ('_type', models.CharField(default='schedule', editable=False, max_length=8)),
+                ('openhouse_owner', models.CharField(default='openhouse_owner', editable=False, max_length=20)),
+                ('openhouse_address', models.CharField(default='kproperty', editable=False, max_length=35)),
+            ],
+            options={
+                'abstract': False,
+            },
+            bases=('kuser.basenotification',),
+        ),
+        migrations.CreateModel(
+            name='OpenHouseCreateNotification',
+            fields=[
+                ('basenotification_ptr', models.OneToOneField(auto_created=True, on_delete=django.db.models.deletion.CASCADE, parent_link=True, primary_key=True, serialize=False, to='kuser.BaseNotification')),
+                ('_type', models.CharField(default='schedule', editable=False, max_length=8)),
+                ('openhouse_owner', models.CharField(default='openhouse_owner', editable=False, max_length=20)),
+                ('openhouse_address', models.CharField(default='kproperty', editable=False, max_length=35)),
+            ],
+            options={
+                'abstract': False,
+            },
+            bases=('kuser.basenotification',),
+        ),
+        migrations.CreateModel(
+            name='OpenHouseStartNotification',
+            fields=[
+                ('basenotification_ptr', models.OneToOneField(auto_created=True, on_delete=django.db.models.deletion.CASCADE, parent_link=True, primary_key=True, serialize=False, to='kuser.BaseNotification')),
+                ('_type', models.CharField(default='schedule', editable=False, max_length=8)),
+                ('openhouse_owner', models.CharField(default='openhouse_owner', editable=False, max_length=20)),
+                ('openhouse_address', models.CharField(default='kproperty', editable=False, max_length=35)),
+            ],
+            options={
+                'abstract': False,
+            },
+            bases=('kuser.basenotification',),
+        ),
+        migrations.CreateModel(
+            name='TransactionWithdrawNotification',
+            fields=[
+                ('basenotification_ptr', models.OneToOneField(auto_created=True, on_delete=django.db.models.deletion.CASCADE, parent_link=True, primary_key=True, serialize=False, to='kuser.BaseNotification')),
+                ('_type', models.CharField(default='transaction', editable=False, max_length=20)),
+                ('kproperty_address', models.CharField(default='kproperty', editable=False, max_length=35)),
+                ('_is_owner', models.BooleanField(default=False, editable=False)),
+            ],
+            bases=('kuser.basenotification',),
+        ),
+        migrations.AddField(
+            model_name='contractnotification',
+            name='_type',
+            field=models.CharField(default='contract', editable=False, max_length=8),
+        ),
+        migrations.AddField(
+            model_name='offernotification',
+            name='_type',
+            field=models.CharField(default='offer', editable=False, max_length=5),
+        ),
+        migrations.AddField(
+            model_name='kuser',
+            name='_tfa_code_validated',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='kuser',
+            name='_verification_token',
+            field=models.UUIDField(default=uuid.uuid4, editable=False),
+        ),
+        migrations.AddField(
+            model_name='kuser',
+            name='phone_num',
+            field=models.CharField(blank=True, max_length=15, null=True, validators=[django.core.validators.RegexValidator(code='invalid phone number', message='Phone number must comply with the E.124 format.', regex='^\\+?[1-9]\\d{1,15}$')]),
+        ),
+        migrations.AddField(
+            model_name='kuser',
+            name='tfa_code',
+            field=models.CharField(blank=True, max_length=6),
+        ),
+        migrations.AddField(
+            model_name='kuser',
+            name='tfa_enabled',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='kuser',
+            name='verified',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AlterField(
+            model_name='kuser',
+            name='favourites',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(blank=True), db_index=True, default=[], size=None),
+        ),
+        migrations.AlterField(
+            model_name='profile',
+            name='first_name',
+            field=models.CharField(blank=True, db_index=True, max_length=25),
+        ),
+        migrations.AlterField(
+            model_name='profile',
+            name='last_name',
+            field=models.CharField(blank=True, db_index=True, max_length=25),
+        ),
+        migrations.AlterField(
+            model_name='profile',
+            name='prof_pic',
+            field=models.ImageField(blank=True, db_index=True, default='https://s3.ca-central-1.amazonaws.com/media.vendr/users/defaults/default_user_prof.jpg', max_length=150, null=True, storage=custom_storage.vendr_storage.VendrMediaStorage(), upload_to=kuser.models.user.prof_pic_file_name),
+        ),
+
+        # Re-parent TransactionNotification onto BaseNotification. Its rows
+        # are copied onto the new table first, through a temporary link that
+        # becomes the parent link once its own columns are dropped. Note, the
+        # offer and contract notification links point at its primary key, so
+        # their constraints are dropped while it changes, then rebuilt.
+        migrations.AddField(
+            model_name='transactionnotification',
+            name='basenotification_ptr',
+            field=models.OneToOneField(null=True, on_delete=django.db.models.deletion.CASCADE, to='kuser.BaseNotification'),
+        ),
+        migrations.RunPython(generate_verification_tokens),
+        migrations.RunPython(copy_transaction_notifications),
+        migrations.AlterField(
+            model_name='offernotification',
+            name='transactionnotification_ptr',
+            field=models.OneToOneField(auto_created=True, db_constraint=False, on_delete=django.db.models.deletion.CASCADE, parent_link=True, primary_key=True, serialize=False, to='kuser.TransactionNotification'),
+        ),
+        migrations.AlterField(
+            model_name='contractnotification',
+            name='transactionnotification_ptr',
+            field=models.OneToOneField(auto_created=True, db_constraint=False, on_delete=django.db.models.deletion.CASCADE, parent_link=True, primary_key=True, serialize=False, to='kuser.TransactionNotification'),
+        ),
+        migrations.DeleteModel(
+            name='DynamicClauseNotification',
+        ),
+        migrations.RemoveField(
+            model_name='transactionnotification',
+            name='_content_type',
+        ),
+        migrations.RemoveField(
+            model_name='transactionnotification',
+            name='description',
+        ),
+        migrations.RemoveField(
+            model_name='transactionnotification',
+            name='is_viewed',
+        ),
+        migrations.RemoveField(
+            model_name='transactionnotification',
+            name='recipient',
+        ),
+        migrations.RemoveField(
+            model_name='transactionnotification',
+            name='sender',
+        ),
+        migrations.RemoveField(
+            model_name='transactionnotification',
+            name='timestamp',
+        ),
+        migrations.RemoveField(
+            model_name='transactionnotification',
+            name='id',
+        ),
+        migrations.AlterField(
+            model_name='transactionnotification',
+            name='basenotification_ptr',
+            field=models.OneToOneField(auto_created=True, on_delete=django.db.models.deletion.CASCADE, parent_link=True, primary_key=True, serialize=False, to='kuser.BaseNotification'),
+        ),
+        migrations.AlterField(
+            model_name='offernotification',
+            name='transactionnotification_ptr',
+            field=models.OneToOneField(auto_created=True, on_delete=django.db.models.deletion.CASCADE, parent_link=True, primary_key=True, serialize=False, to='kuser.TransactionNotification'),
+        ),
+        migrations.AlterField(
+            model_name='contractnotification',
+            name='transactionnotification_ptr',
+            field=models.OneToOneField(auto_created=True, on_delete=django.db.models.deletion.CASCADE, parent_link=True, primary_key=True, serialize=False, to='kuser.TransactionNotification'),
+        ),
+        migrations.AlterField(
+            model_name='basenotification',
+            name='timestamp',
+            field=models.DateTimeField(auto_now_add=True),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.5 on 2026-10-18 14:00
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kuser', '0015_reconcile_models'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='basenotification',
+            index_together=set([('recipient', 'timestamp', 'id')]),
+        ),
+    ]
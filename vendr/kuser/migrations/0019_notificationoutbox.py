@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.5 on 2026-10-18 14:00
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kuser', '0018_message_index_together'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationOutbox',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('created_time', models.DateTimeField(auto_now_add=True)),
+                ('available_time', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('notification', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='kuser.BaseNotification')),
+            ],
+        ),
+    ]
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.5 on 2026-10-18 14:00
+from __future__ import unicode_literals
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kuser', '0019_notificationoutbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationArchive',
+            fields=[
+                ('id', models.UUIDField(editable=False, primary_key=True, serialize=False)),
+                ('recipient', models.PositiveIntegerField(editable=False)),
+                ('notification_type', models.CharField(editable=False, max_length=100)),
+                ('timestamp', models.DateTimeField(editable=False)),
+                ('archived_time', models.DateTimeField(auto_now_add=True)),
+                ('data', django.contrib.postgres.fields.jsonb.JSONField()),
+            ],
+            options={
+                'index_together': set([('recipient', 'timestamp')]),
+            },
+        ),
+    ]
@@ -6,7 +6,8 @@ from .notification import BaseNotification, \
         AdvanceStageNotification, ClauseChangeNotification, \
         OpenHouseNotification, \
         OpenHouseCreateNotification, OpenHouseChangeNotification, \
-        OpenHouseCancelNotification, OpenHouseStartNotification
+        OpenHouseCancelNotification, OpenHouseStartNotification, \
+        NotificationOutbox, NotificationArchive
 from .chat import Chat, Message
 from .accounts import BaseAccount, BankAccount, AbstractAccountFactory
 
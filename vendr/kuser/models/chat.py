@@ -4,13 +4,16 @@
 # ==============================================================================
 
 import uuid
-import redis
-import json
 
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
 from django.contrib.postgres.fields import ArrayField
 
+from vendr_core.publisher import publisher
+from kuser.counters import chat_counter
+
 
 '''   These models are essentially containers for messages. Each chat has
       a set containing an arbitrary number of participants (users). '''
@@ -20,6 +23,45 @@ class Chat(models.Model):
     participants = models.ManyToManyField(settings.AUTH_USER_MODEL)
     opened = models.BooleanField(default=False)
 
+    # The time of the last message (or of the chat's creation), which we
+    # list chats by.
+    last_activity = models.DateTimeField(default=timezone.now)
+
+    # Seconds to cache each chat's participants for.
+    participants_timeout = 60 * 60
+
+    class Meta:
+        index_together = [('last_activity', 'id')]
+
+    ''' Returns the pks of a chat's participants. These are read on every
+        message, so they're cached until the participants change.
+        Args:
+            chat_pk -- The primary key of the chat.
+    '''
+    @classmethod
+    def get_participant_pks(cls, chat_pk):
+
+        key = cls._participants_key(chat_pk)
+        participant_pks = cache.get(key)
+        if participant_pks is None:
+            participant_pks = list(cls.participants.through.objects.\
+                    filter(chat=chat_pk).values_list('kuser', flat=True))
+            cache.set(key, participant_pks, cls.participants_timeout)
+
+        return participant_pks
+
+    ''' Drops a chat's cached participants.
+        Args:
+            chat_pk -- The primary key of the chat.
+    '''
+    @classmethod
+    def clear_participant_pks(cls, chat_pk):
+        cache.delete(cls._participants_key(chat_pk))
+
+    @staticmethod
+    def _participants_key(chat_pk):
+        return 'kuser.chat.{}.participants'.format(chat_pk)
+
 
 class Message(models.Model):
 
@@ -41,13 +83,14 @@ class Message(models.Model):
 
     class Meta:
         ordering = ['timestamp']
+        index_together = [('chat', 'timestamp', 'id')]
 
     ''' A minimal message representation used for instant message alerts. '''
     @property
     def alert(self):
 
         return {
-                    'chat': str(self.chat.pk), 'content': self.content,
+                    'chat': str(self.chat_id), 'content': self.content,
                     'sender': self.sender, 'sender_name': self.sender_name,
                     'timestamp': str(self.timestamp), 'pk': str(self.pk)
         }
@@ -55,29 +98,41 @@ class Message(models.Model):
     ''' There are two behaviors we need to enforce on message saves:
         1. Immutability (i.e. prevent any edits).
         2. Notifications for the recipient. We'll use our trusty Redis queue here.
+        Note, the message is inserted, and its chat marked as unopened, in a
+        single transaction. The message is only pushed once it's committed.
     '''
     def save(self, *args, **kwargs):
         
         if self._state.adding:
-            super(Message, self).save(*args, **kwargs)
-            self.chat.opened = False; self.chat.save()
-            self.publish()
+            with transaction.atomic():
+                super(Message, self).save(*args, **kwargs)
+                Chat.objects.filter(pk=self.chat_id).update(
+                        opened=False,
+                        last_activity=self.timestamp
+                )
+
+            # Keep a loaded chat in sync, so that saving it can't undo this.
+            chat = getattr(self, self._meta.get_field('chat').get_cache_name(),
+                    None)
+            if chat is not None:
+                chat.opened, chat.last_activity = False, self.timestamp
+
+            transaction.on_commit(self.publish)
 
     ''' Push our message into the appropriate channels. '''
     def publish(self):
 
             # Create a list of the other participant's channels.
+            participant_pks = Chat.get_participant_pks(self.chat_id)
             channels = [
-                            'users.{}.inbox'.format(recipient.pk)
-                            for recipient in self.chat.participants.all()
-                            if recipient.pk != self.sender
+                            'users.{}.inbox'.format(participant_pk)
+                            for participant_pk in participant_pks
+                            if participant_pk != self.sender
             ]
 
-            # Push our message alert to the appropriate channels.
-            message_json = json.dumps(self.alert)
-            r = redis.StrictRedis(host=settings.REDIS_HOST,
-                    port=settings.REDIS_PORT, db=0)
-            
-            for channel in channels:
-                r.publish(channel, message_json)
-
+            # Push our message alert to the appropriate channels, in a
+            # single round-trip. Note, the chat is now unopened for everyone,
+            # and chats are only counted once, so we can count it again.
+            alert = self.alert
+            publisher.publish_many((channel, alert) for channel in channels)
+            chat_counter.add(participant_pks, self.chat_id)
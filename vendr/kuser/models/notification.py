@@ -5,19 +5,25 @@
 
 from __future__ import unicode_literals
 
+import time
 import uuid
-import redis
-import json
+from datetime import timedelta
+from collections import defaultdict
 
-from django.db import models
+from django.db import models, transaction
 from django.db.models.signals import post_save, post_delete, pre_delete
 from django.apps import apps
 from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from django.contrib.postgres.fields import JSONField
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.dispatch import receiver
 
 from vendr_core.dispatch import receiver_extended
+from vendr_core.publisher import publisher
+from kuser.counters import notification_counter
 from transaction.models import Transaction, Offer, Contract
 from transaction.models import HouseContract, CoOpContract, CondoContract, \
         TownhouseContract, ManufacturedContract, VacantLandContract
@@ -64,10 +70,7 @@ def handler(sender, instance, **kwargs):
     # Publish to our Redis server iff a notification was created.
     if not notification: return
 
-    channel = 'users.{}.notifications'.format(notification.recipient.pk)
-    notification_json = json.dumps(notification.serialized)
-    r = redis.StrictRedis(host=settings.REDIS_HOST, port=settings.REDIS_PORT, db=0)
-    r.publish(channel, notification_json)
+    notification.publish()
 
 
 """ Determine the notification type for the given sender.
@@ -86,6 +89,30 @@ def resolve_type(sender_class):
 """   Abstract Base notification manager. """
 class BaseNotificationManager(models.Manager):
 
+    """ Returns the given notifications as their actual types, in order.
+        Rather than following each notification's `actual_type`, we group the
+        notifications by type, and read each type's table in a single query.
+        Args:
+            notifications (list of BaseNotification) -- The notifications.
+    """
+    def downcast(self, notifications):
+
+        pks_by_type = defaultdict(list)
+        for notification in notifications:
+            pks_by_type[notification._content_type_id].append(notification.pk)
+
+        # Note, content types are cached, so resolving them is free.
+        actual = {}
+        for content_type_id, pks in pks_by_type.items():
+            model = ContentType.objects.get_for_id(content_type_id).model_class()
+            actual.update(model._base_manager.select_related('recipient').\
+                    in_bulk(pks))
+
+        return [
+                actual.get(notification.pk, notification)
+                for notification in notifications
+        ]
+
     """ [Abstract] Notification for instance creation. Children must implement this. """
     def create_creation_notification(self, instance, resource):
         raise NotImplementedError('error: all notifications must implement this.')
@@ -185,6 +212,11 @@ class BaseNotification(models.Model):
     _content_type = models.ForeignKey(ContentType, editable=False)
     actual_type   = GenericForeignKey('_content_type', 'id')
 
+    objects = BaseNotificationManager()
+
+    class Meta:
+        index_together = [('recipient', 'timestamp', 'id')]
+
     """ Custom save method. Sets actual type value. """
     def save(self, *args, **kwargs):
         
@@ -194,17 +226,17 @@ class BaseNotification(models.Model):
 
         super(BaseNotification, self).save(*args, **kwargs)
 
-    """ Publish the notification to the appropriate channel. """
+    """ Queue the notification to be published to the appropriate channel. """
     def publish(self):
 
-        channel = 'users.{}.notifications'.format(self.recipient.pk)
-        notification_json = json.dumps(self.serialized)
-        r = redis.StrictRedis(
-                host=settings.REDIS_HOST,
-                port=settings.REDIS_PORT,
-                db=0
-        )
-        r.publish(channel, notification_json)
+        # Note, the notification is queued in the same transaction it's
+        # created in, and is only pushed once that transaction commits.
+        NotificationOutbox.objects.create(notification=self)
+
+    """ The channel this notification is published to. """
+    @property
+    def channel(self):
+        return 'users.{}.notifications'.format(self.recipient_id)
 
     """ Custom string representation. """
     def __str__(self):
@@ -350,6 +382,68 @@ class AdvanceStageNotification(BaseNotification):
         super(AdvanceStageNotification, self).save(*args, **kwargs)
     
 
+"""   Responsible for fanning out open house notifications. """
+class OpenHouseNotificationManager(BaseNotificationManager):
+
+    # The number of notifications to insert, and publish, at a time.
+    chunk_size = 500
+
+    """ Notify every recipient at once. The fields shared by the notifications
+        are resolved by the caller, so each chunk costs two INSERTs (one per
+        table) and a single round-trip to Redis, no matter its size.
+        Args:
+            recipients (iterable of User) -- The users to notify. Their
+                profiles should be loaded (e.g. with `select_related`).
+            openhouse_owner (str) -- The open house owner's first name.
+            openhouse_address (str) -- The address of the open house.
+            resource (str) -- The open house's URL resource.
+    """
+    def bulk_notify(self, recipients, openhouse_owner, openhouse_address,
+            resource):
+
+        content_type = ContentType.objects.get_for_model(self.model)
+        notifications = []
+        for recipient in recipients:
+            notification = self.model(
+                    recipient=recipient,
+                    openhouse_owner=openhouse_owner,
+                    openhouse_address=openhouse_address,
+                    resource=resource,
+                    _content_type=content_type
+            )
+            notification.description = notification.get_description()
+
+            # Note, the child's pk is its pointer to the parent row.
+            setattr(notification, self.model._meta.pk.attname, notification.id)
+            notifications.append(notification)
+
+        # Note, Django can't `bulk_create` multi-table models, so we insert
+        # the parent rows, then the child rows, ourselves.
+        fields = self.model._meta.local_concrete_fields
+        for start in range(0, len(notifications), self.chunk_size):
+            chunk = notifications[start:start + self.chunk_size]
+            with transaction.atomic():
+                BaseNotification.objects.bulk_create(chunk)
+                self.model._base_manager._insert(chunk, fields=fields)
+
+                # Note, bulk inserts don't send signals, so the unread
+                # counters are updated here.
+                unread = [
+                        (notification.recipient_id, notification.pk)
+                        for notification in chunk
+                ]
+                transaction.on_commit(
+                        lambda unread=unread: notification_counter.add_many(unread)
+                )
+
+                NotificationOutbox.objects.bulk_create([
+                        NotificationOutbox(notification=notification)
+                        for notification in chunk
+                ])
+
+        return notifications
+
+
 class OpenHouseNotification(BaseNotification):
 
     _type = models.CharField(default='schedule', max_length=8, editable=False)
@@ -358,64 +452,226 @@ class OpenHouseNotification(BaseNotification):
     openhouse_address = models.CharField(default='kproperty',
             max_length=35, editable=False)
 
-    class Meta:
-        abstract=True
+    objects = OpenHouseNotificationManager()
 
+    # Formatted with the `recipient`'s first name, the `owner`'s first
+    # name, and the open house's `address`.
+    description_format = None
 
-class OpenHouseCreateNotification(OpenHouseNotification):
+    class Meta:
+        abstract=True
 
     def save(self, *args, **kwargs):
 
         if self._state.adding:
-            self.description = "Hey {}, {} just created a new open house on " \
-                "their property that you subscribed to -- {}.".format(
-                        self.recipient.profile.first_name,
-                        self.openhouse_owner,
-                        self.openhouse_address
-            )
+            self.description = self.get_description()
 
-        super(OpenHouseCreateNotification, self).save(*args, **kwargs)
+        super(OpenHouseNotification, self).save(*args, **kwargs)
 
+    """ Returns the description of this notification. Note, the recipient's
+        profile is only read if the description needs it. """
+    def get_description(self):
 
-class OpenHouseStartNotification(OpenHouseNotification):
+        format_kwargs = {
+                'owner': self.openhouse_owner,
+                'address': self.openhouse_address
+        }
+        if '{recipient}' in self.description_format:
+            format_kwargs['recipient'] = self.recipient.profile.first_name
 
-    def save(self, *args, **kwargs):
+        return self.description_format.format(**format_kwargs)
 
-        if self._state.adding:
-            self.description = "Hey {}, just a reminder that the open house " \
-                "on {}'s home at {} is starting in an hour!".format(
-                        self.recipient.profile.first_name,
-                        self.openhouse_owner,
-                        self.openhouse_address
-            )
 
-        super(OpenHouseStartNotification, self).save(*args, **kwargs)
+class OpenHouseCreateNotification(OpenHouseNotification):
 
+    description_format = "Hey {recipient}, {owner} just created a new open " \
+            "house on their property that you subscribed to -- {address}."
 
-class OpenHouseChangeNotification(OpenHouseNotification):
 
-    def save(self, *args, **kwargs):
+class OpenHouseStartNotification(OpenHouseNotification):
+
+    description_format = "Hey {recipient}, just a reminder that the open " \
+            "house on {owner}'s home at {address} is starting in an hour!"
 
-        if self._state.adding:
-            self.description = "{} has changed the time and/or date of their " \
-                "open house on {}.".format(
-                        self.openhouse_owner,
-                        self.openhouse_address,
-            )
 
-        super(OpenHouseChangeNotification, self).save(*args, **kwargs)
+class OpenHouseChangeNotification(OpenHouseNotification):
 
+    description_format = "{owner} has changed the time and/or date of " \
+            "their open house on {address}."
 
-class OpenHouseCancelNotification(OpenHouseNotification):
 
-    def save(self, *args, **kwargs):
+class OpenHouseCancelNotification(OpenHouseNotification):
 
-        if self._state.adding:
-            self.description = "{} has cancelled the open house on their property " \
-                "{}.".format(
-                        self.openhouse_owner,
-                        self.openhouse_address
-            )
+    description_format = "{owner} has cancelled the open house on their " \
+            "property {address}."
+
+
+"""   Manages the queue of notifications waiting to be pushed. """
+class NotificationOutboxManager(models.Manager):
+
+    # Only one worker drains the outbox at a time.
+    lock_key = 'kuser.notification_outbox.lock'
+    lock_timeout = 60 * 5
+
+    """ Queue of pending notifications that are ready to be pushed. """
+    def ready_queue(self):
+
+        return super(NotificationOutboxManager, self).get_queryset().\
+                filter(available_time__lte=timezone.now()).\
+                order_by('id')
+
+    """ Push pending notifications, one batch at a time, until the outbox is
+        empty (or only holds notifications that are waiting to be retried).
+        Args:
+            batch_size (int) -- The maximum number of notifications per push.
+    """
+    def drain(self, batch_size=500):
+
+        if not cache.add(self.lock_key, True, self.lock_timeout):
+            return 0
+
+        pushed = 0
+        try:
+            while True:
+                batch = list(self.ready_queue()[:batch_size])
+                if not batch:
+                    break
+                pushed += self.ship(batch)
+        finally:
+            cache.delete(self.lock_key)
+
+        return pushed
+
+    """ Push a batch of notifications in a single round-trip. The batch is
+        only cleared once it's been pushed, so every notification is delivered
+        at least once. If the push fails, the batch is retried with an
+        exponential backoff.
+        Args:
+            batch (list of NotificationOutbox) -- The notifications to push.
+    """
+    def ship(self, batch):
+
+        # Read each notification as its actual type, one query per type.
+        notifications = BaseNotification.objects.downcast(list(
+                BaseNotification.objects.\
+                        filter(pk__in=[entry.notification_id for entry in batch]).\
+                        only('id', '_content_type')
+        ))
+        notifications = dict(
+                (notification.pk, notification) for notification in notifications
+        )
 
-        super(OpenHouseCancelNotification, self).save(*args, **kwargs)
+        messages = [
+                (notification.channel, notification.serialized)
+                for notification in (
+                    notifications.get(entry.notification_id) for entry in batch
+                ) if notification is not None
+        ]
+        if not publisher.publish_many(messages):
+            for entry in batch:
+                entry.retry()
+            return 0
+
+        self.filter(pk__in=[entry.pk for entry in batch]).delete()
+        return len(batch)
+
+
+"""   A notification waiting to be pushed to its recipient. Rows are written
+      in the same transaction as the notification, so a rolled back
+      notification is never pushed, and Redis being down never fails a
+      request. """
+class NotificationOutbox(models.Model):
+
+    objects = NotificationOutboxManager()
+
+    # Failed pushes are retried after 2^attempts seconds, up to this cap.
+    max_backoff = 60 * 10
+
+    # Note, a deleted notification no longer needs to be pushed.
+    notification = models.ForeignKey(
+            BaseNotification,
+            related_name='+',
+            on_delete=models.CASCADE
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    created_time = models.DateTimeField(auto_now_add=True)
+    available_time = models.DateTimeField(default=timezone.now, db_index=True)
+
+    """ Reschedule this notification after a failed attempt to push it. """
+    def retry(self):
+
+        self.attempts += 1
+        backoff = min(2 ** self.attempts, self.max_backoff)
+        self.available_time = timezone.now() + timedelta(seconds=backoff)
+        self.save(update_fields=['attempts', 'available_time'])
+
+
+"""   Manages the archive of old notifications. """
+class NotificationArchiveManager(models.Manager):
+
+    """ Move viewed notifications older than `before` out of the notification
+        tables, and into the archive. Each batch is archived, and deleted, in
+        its own transaction, so the hot tables are never locked for long.
+        Returns the number of notifications moved, and the seconds taken.
+        Args:
+            before (datetime) -- Only notifications older than this are moved.
+            batch_size (int) -- The maximum number of notifications per batch.
+    """
+    def archive(self, before, batch_size=1000):
+
+        started = time.time()
+        moved = 0
+        while True:
+            with transaction.atomic():
+                batch = list(
+                        BaseNotification.objects.\
+                                filter(is_viewed=True, timestamp__lt=before).\
+                                order_by('timestamp', 'id').\
+                                only('id', '_content_type')[:batch_size]
+                )
+                if not batch:
+                    break
+
+                # Read each notification as its actual type, one query per type.
+                notifications = BaseNotification.objects.downcast(batch)
+                self.bulk_create([
+                        self.model(
+                            id=notification.pk,
+                            recipient=notification.recipient_id,
+                            notification_type=ContentType.objects.get_for_id(
+                                notification._content_type_id).model,
+                            timestamp=notification.timestamp,
+                            data=notification.serialized
+                        )
+                        for notification in notifications
+                ])
+
+                # Note, the child rows are deleted along with their parents.
+                BaseNotification.objects.\
+                        filter(pk__in=[notification.pk for notification in batch]).\
+                        delete()
+                moved += len(batch)
+
+        return moved, time.time() - started
+
+
+"""   A compact copy of a notification that's been moved out of the
+      notification tables. We keep the notification as it was serialized,
+      rather than a row per notification type. """
+class NotificationArchive(models.Model):
+
+    objects = NotificationArchiveManager()
+
+    # The archived notification's primary key.
+    id = models.UUIDField(primary_key=True, editable=False)
+
+    # Soft reference to the recipient, as archived notifications outlive
+    # the users they were sent to.
+    recipient = models.PositiveIntegerField(editable=False)
+    notification_type = models.CharField(max_length=100, editable=False)
+    timestamp = models.DateTimeField(editable=False)
+    archived_time = models.DateTimeField(auto_now_add=True)
+    data = JSONField()
 
+    class Meta:
+        index_together = [('recipient', 'timestamp')]
@@ -50,6 +50,19 @@ class ChatListPermissions(permissions.BasePermission):
         return request.user == obj
 
 
+class CounterPermissions(permissions.BasePermission):
+
+    ''' Users can only read their own counters. Note, this is checked
+        against the endpoint, so we don't need to read the user.
+        Args:
+            request -- The request object.
+            view -- The CounterDetail view.
+    '''
+    def has_permission(self, request, view):
+
+        return int(view.kwargs['pk']) == request.user.pk
+
+
 class ChatDetailPermissions(permissions.BasePermission):
 
     ''' Only chat participants can view and update an chat.
@@ -37,7 +37,9 @@ class ChatSerializer(serializers.ModelSerializer):
         return chat
     
     ''' Custom representation of a Chat. We want to serialize the user's
-        profile pic in addition to their pk.
+        profile pic in addition to their pk. Note, if the chat's last message
+        has already been read (e.g. for a whole page of chats), it can be
+        passed in the `last_messages` context, keyed by chat pk.
         Args:
             instance -- The chat to be serialized.
     '''
@@ -57,12 +59,12 @@ class ChatSerializer(serializers.ModelSerializer):
                 })
         
         # Get the latest message (if any).
-        try:
-            last_message = MessageSerializer(
-                    instance.messages.latest('timestamp')
-            ).data
-        except Message.DoesNotExist:
-            last_message = ''
+        last_messages = self.context.get('last_messages')
+        if last_messages is not None:
+            message = last_messages.get(instance.pk)
+        else:
+            message = instance.messages.order_by('-timestamp').first()
+        last_message = MessageSerializer(message).data if message else ''
         
         chat['participants'] = participants
         chat['last_message'] = last_message
@@ -7,4 +7,6 @@ from transaction_signals import transaction_withdraw_receiver, \
         amendment_created_receiver, amendment_accepted_receiver, \
         waiver_created_receiver, waiver_accepted_receiver, \
         nof_accepted_receiver
-
+from counter_signals import notification_save_receiver, \
+        notification_delete_receiver, chat_save_receiver, \
+        chat_participants_receiver, chat_delete_receiver
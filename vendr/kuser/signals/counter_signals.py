@@ -0,0 +1,99 @@
+#
+# Unread counter signals.
+#
+# ===============================================================
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_delete, \
+        m2m_changed
+from django.dispatch import receiver
+
+from kuser.models import BaseNotification, Chat
+from kuser.counters import notification_counter, chat_counter
+
+
+""" Count new notifications as unread, and uncount them once they've been
+    viewed. Note, notification types are subclasses, so we can't connect to
+    a single sender. """
+@receiver(post_save)
+def notification_save_receiver(sender, instance, **kwargs):
+
+    if not isinstance(instance, BaseNotification):
+        return
+
+    recipient_pk, pk = instance.recipient_id, instance.pk
+    if instance.is_viewed:
+        transaction.on_commit(
+                lambda: notification_counter.remove([recipient_pk], pk)
+        )
+    elif kwargs['created']:
+        transaction.on_commit(
+                lambda: notification_counter.add([recipient_pk], pk)
+        )
+
+
+""" Uncount deleted notifications. """
+@receiver(post_delete)
+def notification_delete_receiver(sender, instance, **kwargs):
+
+    if not isinstance(instance, BaseNotification):
+        return
+
+    recipient_pk, pk = instance.recipient_id, instance.pk
+    transaction.on_commit(
+            lambda: notification_counter.remove([recipient_pk], pk)
+    )
+
+
+""" A chat is unopened for all of its participants until one of them opens
+    it. Note, the participants are cached, so this doesn't usually read them. """
+@receiver(post_save, sender=Chat)
+def chat_save_receiver(sender, instance, **kwargs):
+
+    if kwargs['created']:
+        return
+
+    pk = instance.pk
+    participant_pks = Chat.get_participant_pks(pk)
+    update = chat_counter.remove if instance.opened else chat_counter.add
+    transaction.on_commit(lambda: update(participant_pks, pk))
+
+
+""" (Helper) Drop the cached participants of the chats that changed. Note,
+    the participants can be changed from either side of the relation. """
+def clear_participants(instance, pk_set):
+
+    if isinstance(instance, Chat):
+        Chat.clear_participant_pks(instance.pk)
+    elif pk_set:
+        for chat_pk in pk_set:
+            Chat.clear_participant_pks(chat_pk)
+
+
+""" Count a chat for the participants that are added to it, and uncount it
+    for those that are removed. """
+@receiver(m2m_changed, sender=Chat.participants.through)
+def chat_participants_receiver(sender, instance, action, pk_set, **kwargs):
+
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        clear_participants(instance, pk_set)
+
+    if (not isinstance(instance, Chat)) or (not pk_set):
+        return
+
+    pk, participant_pks = instance.pk, list(pk_set)
+    if (action == 'post_add') and (not instance.opened):
+        transaction.on_commit(lambda: chat_counter.add(participant_pks, pk))
+    elif action == 'post_remove':
+        transaction.on_commit(lambda: chat_counter.remove(participant_pks, pk))
+
+
+""" Uncount deleted chats. Note, the participants must be read before the
+    chat (and its participants) are deleted. """
+@receiver(pre_delete, sender=Chat)
+def chat_delete_receiver(sender, instance, **kwargs):
+
+    pk = instance.pk
+    participant_pks = Chat.get_participant_pks(pk)
+    Chat.clear_participant_pks(pk)
+    transaction.on_commit(lambda: chat_counter.remove(participant_pks, pk))
@@ -3,12 +3,50 @@
 #
 # ===============================================================
 
+from django.db import transaction
 from django.dispatch import receiver
+from django.contrib.auth import get_user_model
 
 from kproperty.signals.dispatch import openhouse_create_signal, \
         openhouse_start_signal, openhouse_change_signal, openhouse_cancel_signal
 from kuser.models import OpenHouseCreateNotification, OpenHouseChangeNotification, \
         OpenHouseCancelNotification, OpenHouseStartNotification
+from kuser.tasks import openhouse_notify_task
+
+# Fan-outs to more recipients than this are deferred to a worker, rather
+# than run on the request thread.
+INLINE_FAN_OUT_LIMIT = 50
+
+
+""" Notify the given recipients of a change to an open house. The fields
+    shared by every notification are resolved once, up front.
+    Args:
+        model (OpenHouseNotification) -- The type of notification to send.
+        openhouse (OpenHouse) -- The open house in question.
+        recipients (QuerySet) -- The users to notify.
+        resource (str) -- The open house's URL resource.
+"""
+def fan_out(model, openhouse, recipients, resource):
+
+    # Note, the recipients are read now, as the open house might be deleted
+    # (e.g. cancelled) before a worker picks up the task.
+    recipient_pks = list(recipients.values_list('pk', flat=True))
+    if not recipient_pks:
+        return
+
+    openhouse_owner = openhouse.owner.profile.first_name
+    openhouse_address = openhouse.kproperty.location.address
+    if len(recipient_pks) > INLINE_FAN_OUT_LIMIT:
+        transaction.on_commit(lambda: openhouse_notify_task.delay(
+                model._meta.model_name, recipient_pks, openhouse_owner,
+                openhouse_address, resource
+        ))
+    else:
+        model.objects.bulk_notify(
+                get_user_model().objects.filter(pk__in=recipient_pks).\
+                        select_related('profile'),
+                openhouse_owner, openhouse_address, resource
+        )
 
 
 """ Notify anyone who has favourited this property that the owner has
@@ -17,19 +55,8 @@ from kuser.models import OpenHouseCreateNotification, OpenHouseChangeNotificatio
 def openhouse_create_receiver(sender, **kwargs):
 
     openhouse = sender
-    resource = kwargs['resource']
-    for subscriber in openhouse.kproperty._subscribers.all():
-
-        # Create the change notification.
-        notification = OpenHouseCreateNotification.objects.create(
-                recipient=subscriber,
-                openhouse_owner=openhouse.owner.profile.first_name,
-                openhouse_address=openhouse.kproperty.location.address,
-                resource=resource
-        )
-
-        # Publish notification.
-        notification.publish()
+    fan_out(OpenHouseCreateNotification, openhouse,
+            openhouse.kproperty._subscribers.all(), kwargs['resource'])
 
 
 """ Notify anyone who has RSVP'd to an Open House of any changes. """
@@ -37,20 +64,9 @@ def openhouse_create_receiver(sender, **kwargs):
 def openhouse_change_receiver(sender, **kwargs):
 
     openhouse = sender
-    resource = kwargs['resource']
-    for rsvp in openhouse.rsvp_list.all():
-
-        # Create the change notification.
-        recipient = rsvp.owner
-        notification = OpenHouseChangeNotification.objects.create(
-                recipient=recipient,
-                openhouse_owner=openhouse.owner.profile.first_name,
-                openhouse_address=openhouse.kproperty.location.address,
-                resource=resource
-        )
-
-        # Publish notification.
-        notification.publish()
+    fan_out(OpenHouseChangeNotification, openhouse,
+            get_user_model().objects.filter(rsvp_schedule__open_house=openhouse),
+            kwargs['resource'])
 
 
 """ Notify anyone who has RSVP'd to an Open House of any changes. """
@@ -58,20 +74,9 @@ def openhouse_change_receiver(sender, **kwargs):
 def openhouse_cancel_receiver(sender, **kwargs):
 
     openhouse = sender
-    resource = kwargs['resource']
-    for rsvp in openhouse.rsvp_list.all():
-
-        # Create the change notification.
-        recipient = rsvp.owner
-        notification = OpenHouseCancelNotification.objects.create(
-                recipient=recipient,
-                openhouse_owner=openhouse.owner.profile.first_name,
-                openhouse_address=openhouse.kproperty.location.address,
-                resource=resource
-        )
-
-        # Publish notification.
-        notification.publish()
+    fan_out(OpenHouseCancelNotification, openhouse,
+            get_user_model().objects.filter(rsvp_schedule__open_house=openhouse),
+            kwargs['resource'])
 
 
 """ Notify anyone who has RSVP'd to an Open House 1 hour before it starts. """
@@ -80,21 +85,9 @@ def openhouse_start_receiver(sender, **kwargs):
 
     # Send a notification to each user that has RSVP'd.
     openhouse = sender
-    resource = kwargs['resource']
-    for rsvp in openhouse.rsvp_list.all():
-
-        # Create notification.
-        recipient = rsvp.owner; sender = None
-        notification = OpenHouseStartNotification.objects.create(
-                recipient=recipient,
-                openhouse_owner=openhouse.owner.profile.first_name,
-                openhouse_address=openhouse.kproperty.location.address,
-                resource=resource
-        )
-
-        # Publish notification.
-        notification.publish()
+    fan_out(OpenHouseStartNotification, openhouse,
+            get_user_model().objects.filter(rsvp_schedule__open_house=openhouse),
+            kwargs['resource'])
 
     # Set the open house flag to prevent duplicate notifications.
     openhouse._recipients_notified = True; openhouse.save()
-
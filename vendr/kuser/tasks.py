@@ -0,0 +1,62 @@
+#
+# Periodic, and deferred, tasks for KUser objects and related models.
+#
+# ================================================================
+
+from __future__ import absolute_import
+from celery import shared_task
+
+import logging
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.utils import timezone
+from django.contrib.auth import get_user_model
+
+from kuser.models import NotificationOutbox, NotificationArchive
+
+logger = logging.getLogger(__name__)
+
+
+""" Notify a large group of recipients of a change to an open house. The
+    recipients are read, and notified, one chunk at a time.
+    Args:
+        model_name (str) -- The name of the open house notification model.
+        recipient_pks (list of int) -- The primary keys of the recipients.
+        openhouse_owner (str) -- The open house owner's first name.
+        openhouse_address (str) -- The address of the open house.
+        resource (str) -- The open house's URL resource.
+"""
+@shared_task
+def openhouse_notify_task(model_name, recipient_pks, openhouse_owner,
+        openhouse_address, resource):
+
+    model = apps.get_model(app_label='kuser', model_name=model_name)
+    chunk_size = model.objects.chunk_size
+    for start in range(0, len(recipient_pks), chunk_size):
+        recipients = get_user_model().objects.\
+                filter(pk__in=recipient_pks[start:start + chunk_size]).\
+                select_related('profile')
+        model.objects.bulk_notify(recipients, openhouse_owner,
+                openhouse_address, resource)
+
+
+""" Push any pending notifications to their recipients. """
+@shared_task
+def notification_outbox_drain_task():
+
+    NotificationOutbox.objects.drain()
+
+
+""" Move viewed notifications past their retention period into the archive,
+    so the notification tables (and their indexes) only hold the notifications
+    users still read. """
+@shared_task
+def notification_archive_task():
+
+    before = timezone.now() - timedelta(days=settings.NOTIFICATION_RETENTION_DAYS)
+    moved, elapsed = NotificationArchive.objects.archive(before)
+    logger.info('archived %d notifications in %.2fs.', moved, elapsed)
+
+    return {'moved': moved, 'elapsed': elapsed}
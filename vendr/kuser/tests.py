@@ -1,5 +1,8 @@
+from datetime import timedelta
+
 from django.test import TestCase
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 
 from rest_framework.test import APIRequestFactory, APIClient, APITestCase
 from rest_framework.test import force_authenticate
@@ -7,6 +10,7 @@ from rest_framework import status
 
 from kuser.models import *
 from kuser.views import *
+from kuser.counters import notification_counter, chat_counter
 
 User = get_user_model()
 
@@ -211,6 +215,49 @@ class TestChatList(APITestCase):
         }
         self.assertEquals(response.data[0], chat_response)
 
+    ''' Ensure the chat list costs the same number of queries, no matter
+        how many chats there are. '''
+    def test_read_chats_query_count(self):
+
+        for content in ('Hi', 'Hello', 'Hey'):
+            chat = Chat.objects.create()
+            chat.participants.add(self.user_a, self.user_b)
+            Message.objects.create(chat=chat, sender=self.user_b.pk,
+                    sender_name='B', content=content)
+        Message.objects.create(chat=chat, sender=self.user_a.pk,
+                sender_name='A', content='Bye')
+        chat_counter.count(self.user_a.pk)
+
+        request = self.factory.get(self.path_a, format='json')
+        force_authenticate(request, user=self.user_a)
+        with self.assertNumQueries(4):
+            response = self.view(request, self.user_a.pk)
+
+        # Ensure the most recently active chat is listed first.
+        chats = response.data['chats']
+        self.assertEqual(len(chats), 3)
+        self.assertEqual(chats[0]['last_message']['content'], 'Bye')
+        self.assertEqual(chats[0]['participants'][0]['user_pk'], self.user_b.pk)
+
+    ''' Ensure chats can be paged through by last activity. '''
+    def test_read_chats_pagination(self):
+
+        for _ in range(3):
+            chat = Chat.objects.create()
+            chat.participants.add(self.user_a, self.user_b)
+
+        request = self.factory.get(self.path_a, {'limit': 2}, format='json')
+        force_authenticate(request, user=self.user_a)
+        response = self.view(request, self.user_a.pk)
+        self.assertEqual(len(response.data['chats']), 2)
+
+        request = self.factory.get(self.path_a,
+                {'limit': 2, 'cursor': response.data['next']}, format='json')
+        force_authenticate(request, user=self.user_a)
+        following = self.view(request, self.user_a.pk)
+        self.assertEqual(len(following.data['chats']), 1)
+        self.assertIsNone(following.data['next'])
+
     ''' Ensure sender is included in participants implicitly. '''
     def test_sender_included_in_participants(self):
 
@@ -344,6 +391,92 @@ class TestMessageList(APITestCase):
         pass
 
 
+'''   Tests for paging through a chat's message history. '''
+class TestMessageHistory(APITestCase):
+
+    def setUp(self):
+
+        self.view = MessageList.as_view()
+        self.factory = APIRequestFactory()
+
+        self.user_a = User.objects.create_user(email='sender@vendr.xyz',
+                password='sender')
+        self.user_b = User.objects.create_user(email='recipient@vendr.xyz',
+                password='recipient')
+
+        self.chat = Chat.objects.create()
+        self.chat.participants.add(self.user_a, self.user_b)
+        self.messages = [
+                Message.objects.create(chat=self.chat, sender=self.user_b.pk,
+                    sender_name='B', content=str(n))
+                for n in range(5)
+        ]
+
+        self.path = '/v1/users/{}/chat/{}/messages/'.\
+                      format(self.user_a.pk, self.chat.pk)
+
+    ''' (Helper) Reads the chat's messages with the given params. '''
+    def get_messages(self, params):
+
+        request = self.factory.get(self.path, params)
+        force_authenticate(request, user=self.user_a)
+        return self.view(request, self.user_a.pk, self.chat.pk)
+
+    ''' Ensure we can page backwards through the history. '''
+    def test_before(self):
+
+        response = self.get_messages({'limit': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+                [message['content'] for message in response.data['results']],
+                ['3', '4']
+        )
+        self.assertTrue(response.data['has_more'])
+
+        response = self.get_messages({'limit': 3,
+                'before': response.data['results'][0]['pk']})
+        self.assertEqual(
+                [message['content'] for message in response.data['results']],
+                ['0', '1', '2']
+        )
+        self.assertFalse(response.data['has_more'])
+
+    ''' Ensure we can catch up on the messages since a given time. '''
+    def test_since(self):
+
+        response = self.get_messages({
+                'since': self.messages[2].timestamp.isoformat()
+        })
+        self.assertEqual(
+                [message['content'] for message in response.data['results']],
+                ['3', '4']
+        )
+        self.assertFalse(response.data['has_more'])
+
+    ''' Ensure sending a message costs one INSERT, and one UPDATE of the
+        chat (plus the savepoint they're wrapped in). '''
+    def test_send_message_queries(self):
+
+        self.chat.opened = True; self.chat.save()
+        with self.assertNumQueries(4):
+            message = Message.objects.create(chat=self.chat,
+                    sender=self.user_a.pk, sender_name='A', content='Hi')
+
+        self.assertFalse(self.chat.opened)
+        chat = Chat.objects.get(pk=self.chat.pk)
+        self.assertFalse(chat.opened)
+        self.assertEqual(chat.last_activity, message.timestamp)
+
+    ''' Ensure bad cursors are rejected. '''
+    def test_invalid_params(self):
+
+        for params in ({'before': 'abc'}, {'since': 'yesterday'},
+                {'limit': -1}):
+            response = self.get_messages(params)
+            self.assertEqual(response.status_code,
+                    status.HTTP_400_BAD_REQUEST)
+
+
 class AbstractNotificationSetup(APITestCase):
 
     def setUp(self):
@@ -552,6 +685,229 @@ class TestOpenhouseNotifications(AbstractNotificationSetup):
         self.assertEqual(response.status_code, 401)
         self.assertEqual(0, OpenHouseCancelNotification.objects.count())
 
+    """ Ensure that bulk notifications are saved as their actual type, with
+        a description for each recipient. """
+    def test_bulk_notify(self):
+
+        recipients = User.objects.filter(rsvp_schedule__open_house=self.oh).\
+                select_related('profile')
+        OpenHouseStartNotification.objects.bulk_notify(recipients,
+                'Seller', '74 Ulster St', 'resource')
+
+        self.assertEqual(2, OpenHouseStartNotification.objects.count())
+        notification = self.buyer_a.notifications.get()
+        self.assertEqual(
+                type(notification.actual_type).__name__,
+                'OpenHouseStartNotification'
+        )
+        self.assertEqual(
+                notification.description,
+                "Hey Buyer A, just a reminder that the open house on Seller's "
+                "home at 74 Ulster St is starting in an hour!"
+        )
+
+
+"""   Test the notification inbox. """
+class TestNotificationList(AbstractNotificationSetup):
+
+    def setUp(self):
+
+        super(TestNotificationList, self).setUp()
+
+        self.view = NotificationList.as_view()
+        self.path = '/v1/users/{}/notifications/'.format(self.buyer_a.pk)
+
+        recipients = User.objects.filter(pk=self.buyer_a.pk).\
+                select_related('profile')
+        for notification_type in (OpenHouseChangeNotification,
+                OpenHouseCancelNotification):
+            for _ in range(3):
+                notification_type.objects.bulk_notify(recipients,
+                        'Seller', '74 Ulster St', 'resource')
+
+    def get_inbox(self, params=None):
+
+        request = self.factory.get(self.path, params or {})
+        force_authenticate(request, user=self.buyer_a)
+        return self.view(request, self.buyer_a.pk)
+
+    """ Ensure that the inbox is read in one query per notification type,
+        no matter how many notifications there are. """
+    def test_inbox_query_count(self):
+
+        with self.assertNumQueries(3):
+            response = self.get_inbox()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 6)
+        self.assertEqual(
+                set(notification['description'] for notification in response.data),
+                set([
+                    "Seller has changed the time and/or date of their open "
+                    "house on 74 Ulster St.",
+                    "Seller has cancelled the open house on their property "
+                    "74 Ulster St."
+                ])
+        )
+
+    """ Ensure that the inbox can be paged through, newest first. """
+    def test_inbox_pagination(self):
+
+        response = self.get_inbox({'limit': 4})
+        self.assertEqual(len(response.data['results']), 4)
+        self.assertIsNone(response.data['previous'])
+
+        following = self.get_inbox({'limit': 4, 'cursor': response.data['next']})
+        self.assertEqual(len(following.data['results']), 2)
+        self.assertIsNone(following.data['next'])
+
+        notifications = response.data['results'] + following.data['results']
+        self.assertEqual(len(set(
+            notification['id'] for notification in notifications)), 6)
+        self.assertEqual(
+                [notification['timestamp'] for notification in notifications],
+                sorted([notification['timestamp'] for notification in notifications],
+                    reverse=True)
+        )
+
+
+"""   Test the unread counters. """
+class TestCounters(AbstractNotificationSetup):
+
+    def setUp(self):
+
+        super(TestCounters, self).setUp()
+
+        self.view = CounterDetail.as_view()
+        self.path = '/v1/users/{}/counters/'.format(self.buyer_a.pk)
+
+        # Note, counters outlive the test database, so start from scratch.
+        notification_counter._invalidate([self.buyer_a.pk])
+        chat_counter._invalidate([self.buyer_a.pk])
+
+        recipients = User.objects.filter(pk=self.buyer_a.pk).\
+                select_related('profile')
+        self.notification = OpenHouseChangeNotification.objects.bulk_notify(
+                recipients, 'Seller', '74 Ulster St', 'resource')[0]
+
+        self.chat = Chat.objects.create()
+        self.chat.participants.add(self.buyer_a, self.seller)
+
+    def get_counters(self, user):
+
+        request = self.factory.get(self.path)
+        force_authenticate(request, user=user)
+        return self.view(request, self.buyer_a.pk)
+
+    """ Ensure that counters are loaded once, and then kept up to date. """
+    def test_counters(self):
+
+        response = self.get_counters(self.buyer_a)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'notifications': 1, 'chats': 1})
+
+        notification_counter.remove([self.buyer_a.pk], self.notification.pk)
+        chat_counter.remove([self.buyer_a.pk], self.chat.pk)
+        with self.assertNumQueries(0):
+            response = self.get_counters(self.buyer_a)
+        self.assertEqual(response.data, {'notifications': 0, 'chats': 0})
+
+    """ Ensure that users can't read other users' counters. """
+    def test_counters_wrong_auth(self):
+
+        response = self.get_counters(self.seller)
+        self.assertEqual(response.status_code, 403)
+
+
+"""   Test the notification outbox. """
+class TestNotificationOutbox(AbstractNotificationSetup):
+
+    def setUp(self):
+
+        super(TestNotificationOutbox, self).setUp()
+
+        recipients = User.objects.filter(
+                pk__in=[self.buyer_a.pk, self.buyer_b.pk]).\
+                select_related('profile')
+        self.notifications = OpenHouseChangeNotification.objects.bulk_notify(
+                recipients, 'Seller', '74 Ulster St', 'resource')
+
+    """ Ensure that notifications are queued, rather than pushed, when
+        they're created. """
+    def test_enqueue(self):
+
+        self.assertEqual(
+                set(NotificationOutbox.objects.ready_queue().\
+                        values_list('notification', flat=True)),
+                set(notification.pk for notification in self.notifications)
+        )
+
+    """ Ensure that failed pushes are retried later, with a growing backoff. """
+    def test_retry(self):
+
+        entry = NotificationOutbox.objects.ready_queue().first()
+        entry.retry(); entry.retry()
+
+        self.assertEqual(entry.attempts, 2)
+        self.assertGreater(entry.available_time, timezone.now())
+        self.assertNotIn(entry, NotificationOutbox.objects.ready_queue())
+
+    """ Ensure that deleted notifications are dropped from the outbox. """
+    def test_delete(self):
+
+        self.notifications[0].delete()
+        self.assertEqual(NotificationOutbox.objects.count(), 1)
+
+
+"""   Test the notification archive. """
+class TestNotificationArchive(AbstractNotificationSetup):
+
+    def setUp(self):
+
+        super(TestNotificationArchive, self).setUp()
+
+        recipients = User.objects.filter(
+                pk__in=[self.buyer_a.pk, self.buyer_b.pk]).\
+                select_related('profile')
+        self.notifications = OpenHouseChangeNotification.objects.bulk_notify(
+                recipients, 'Seller', '74 Ulster St', 'resource')
+
+    """ Ensure that only old, viewed, notifications are archived, and that
+        they're removed from the notification tables. """
+    def test_archive(self):
+
+        viewed, unviewed = self.notifications
+        BaseNotification.objects.filter(pk__in=[viewed.pk, unviewed.pk]).\
+                update(timestamp=timezone.now() - timedelta(days=30))
+        BaseNotification.objects.filter(pk=viewed.pk).update(is_viewed=True)
+
+        moved, _ = NotificationArchive.objects.archive(
+                before=timezone.now() - timedelta(days=7), batch_size=1)
+
+        self.assertEqual(moved, 1)
+        self.assertEqual(
+                list(BaseNotification.objects.values_list('pk', flat=True)),
+                [unviewed.pk]
+        )
+        self.assertFalse(OpenHouseChangeNotification.objects.\
+                filter(pk=viewed.pk).exists())
+
+        archived = NotificationArchive.objects.get()
+        self.assertEqual(archived.pk, viewed.pk)
+        self.assertEqual(archived.recipient, viewed.recipient_id)
+        self.assertEqual(archived.notification_type, 'openhousechangenotification')
+        self.assertEqual(archived.data['description'], viewed.description)
+
+    """ Ensure that recent notifications are kept, even if they're viewed. """
+    def test_archive_recent(self):
+
+        BaseNotification.objects.update(is_viewed=True)
+        moved, _ = NotificationArchive.objects.archive(
+                before=timezone.now() - timedelta(days=7))
+
+        self.assertEqual(moved, 0)
+        self.assertEqual(BaseNotification.objects.count(), 2)
+
 
 class TestContractNotifications(AbstractNotificationSetup):
 
@@ -829,6 +1185,61 @@ class TestContractNotifications(AbstractNotificationSetup):
         )
 
 
+'''   Tests for TemplateClauseDetail() view. '''
+class TestTemplateClauseDetail(APITestCase):
+
+    def setUp(self):
+
+        from transaction.models import AbstractContractFactory, DepositClause
+
+        self.view = TemplateClauseDetail.as_view()
+        self.factory = APIRequestFactory()
+
+        self.user = User.objects.create_user(email='user@kangaa.xyz',
+                        password='user')
+        self.template = AbstractContractFactory.create_contract('condo',
+                self.user, None, is_template=True)
+        self.clause = DepositClause.objects.get(contract=self.template)
+
+    ''' Ensure that dynamic clauses are read without their clause table. '''
+    def test_get_dynamic_clause(self):
+
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from transaction.models import DepositClause
+
+        request = self.factory.get('/v1/users/{}/templates/{}/clauses/{}/'.\
+                format(self.user.pk, self.template.pk, self.clause.pk))
+        force_authenticate(request, self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.view(request, pk=self.user.pk,
+                    template_pk=self.template.pk, clause_pk=self.clause.pk)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['title'], self.clause.title)
+        table = DepositClause._meta.db_table
+        self.assertFalse(any(table in query['sql'] for query in queries))
+
+    ''' Ensure that a batch updates the template's digest in one go. '''
+    def test_batch_update(self):
+
+        from transaction.models import Contract, DepositClause
+
+        view = TemplateClauseBatchDetail.as_view()
+        update = [{'pk': str(self.clause.pk), 'data': {'value': 5000}}]
+        request = self.factory.put('/v1/users/{}/templates/{}/clauses/batch/'.\
+                format(self.user.pk, self.template.pk), update, format='json')
+        force_authenticate(request, self.user)
+        response = view(request, pk=self.user.pk, template_pk=self.template.pk)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(DepositClause.objects.get(pk=self.clause.pk).value, 5000)
+
+        template = Contract.objects.get(pk=self.template.pk)
+        digest = template.digest
+        self.assertEqual(template.refresh_digest(), digest)
+
+
 class TestTFA(APITestCase):
 
     def setUp(self):
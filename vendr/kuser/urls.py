@@ -23,6 +23,9 @@ urlpatterns = [
         url(r'^(?P<user_pk>[0-9]+)/notifications/(?P<pk>[0-9a-f-]+)/$',
             views.NotificationDetail.as_view()),
 
+        # Unread counters.
+        url(r'^(?P<pk>[0-9]+)/counters/$', views.CounterDetail.as_view()),
+
         # Chat views.
         url(r'^(?P<pk>[0-9]+)/chat/$', views.ChatList.as_view()),
         url(r'^(?P<pk>[0-9]+)/chat/(?P<chat_pk>[0-9a-f-]+)/$',
@@ -4,6 +4,7 @@ from ws_auth import WSAuth
 from tfa_view import TwoFactorAuth
 from notification_views import NotificationList, NotificationDetail
 from chat_views import ChatList, ChatDetail, MessageList
+from counter_views import CounterDetail
 from schedule_views import ScheduleList
 from profile_view import ProfileDetail
 from subscription_view import SubscriptionsList
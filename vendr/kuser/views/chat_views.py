@@ -3,6 +3,9 @@
 #
 # ========================================================================
 
+from django.db.models import Q, Prefetch
+from django.core.exceptions import ValidationError
+from django.utils.dateparse import parse_datetime
 from django.contrib.auth import get_user_model
 
 from rest_framework import permissions, status
@@ -11,6 +14,8 @@ from rest_framework.response import Response
 from rest_framework.exceptions import APIException
 
 from kuser.models import Chat, Message
+from kuser.counters import chat_counter
+from ksearch.pagination import KeysetPagination
 from kuser.serializers import ChatSerializer, MessageSerializer
 
 import kuser.permissions as kuser_permissions
@@ -18,24 +23,49 @@ import kuser.permissions as kuser_permissions
 User = get_user_model()
 
 
+''' Keyset pagination over a user's chats, most recently active first. '''
+class ChatPagination(KeysetPagination):
+
+    orderings = ('-last_activity', 'last_activity')
+    default_ordering = '-last_activity'
+    datetime_fields = ('last_activity', )
+
+
 '''   Chat list view. '''
 class ChatList(APIView):
 
     serializer_class   = ChatSerializer
+    pagination_class   = ChatPagination
     permission_classes = ( permissions.IsAuthenticated,
                            kuser_permissions.ChatListPermissions
     )
 
-    ''' Gets all Chats that a given user is part of.
+    ''' Gets all Chats that a given user is part of, along with each of their
+        participants' profiles.
         Args:
             pk -- The primary key of the user we're querying over.
     '''
     def get_queryset(self, pk):
 
-        queryset = User.objects.get(pk=pk).chat_set.all()
+        participants = Prefetch('participants',
+                queryset=User.objects.select_related('profile'))
+        queryset = Chat.objects.filter(participants=pk).\
+                prefetch_related(participants)
         return queryset
 
-    ''' Handles LIST / GET requests.
+    ''' Returns the last message in each of the given chats, keyed by chat pk.
+        Note, this is a single DISTINCT ON query, however many chats there are.
+        Args:
+            chats -- The chats to get the last messages of.
+    '''
+    def get_last_messages(self, chats):
+
+        messages = Message.objects.filter(chat__in=chats).\
+                order_by('chat', '-timestamp').distinct('chat')
+        return dict((message.chat_id, message) for message in messages)
+
+    ''' Handles LIST / GET requests. The chats are paginated if any of the
+        cursor params are given.
         Args:
             request: The GET request.
             pk: The primary key of the user we're querying over.
@@ -45,19 +75,30 @@ class ChatList(APIView):
         
         queryset = self.get_queryset(pk)
         self.check_object_permissions(request, User.objects.get(pk=pk))
-        context = {'sender': request.user}
-        
-        chats = []
-        for convo in queryset:
-            chats.append(
-                    self.serializer_class(convo, context=context).data
-            )
 
-        # Add the number of uonpened chats to our response.
-        response = Response({'chats': chats})
-        response.data['unopened_count'] = queryset.filter(opened=False).count()
+        paginator = None
+        if any(param in request.query_params
+                for param in self.pagination_class.params):
+            paginator = self.pagination_class()
+            page = paginator.paginate_queryset(queryset, request, self)
+        else:
+            page = list(queryset.order_by('-last_activity', '-id'))
+
+        context = {
+                'sender': request.user,
+                'last_messages': self.get_last_messages(page)
+        }
+        chats = self.serializer_class(page, many=True, context=context).data
+
+        # Add the number of uonpened chats (and any page cursors) to our
+        # response.
+        response = {'chats': chats, 'unopened_count': chat_counter.count(pk)}
+        if paginator:
+            paginated = paginator.get_paginated_data(chats)
+            response['next'] = paginated['next']
+            response['previous'] = paginated['previous']
 
-        return response
+        return Response(response)
     
     ''' Handles POST requests.
         Args:
@@ -143,16 +184,24 @@ class MessageList(APIView):
                            kuser_permissions.MessageListPermissions
     )
 
+    # Page sizes for the `before` and `since` queries.
+    default_limit = 50
+    max_limit = 200
+
     ''' Gets all Messages in a given chat.
         Args:
-            chat_pk -- The primary key of the Chat we're querying over.
+            chat -- The Chat we're querying over.
     '''
-    def get_queryset(self, chat_pk):
+    def get_queryset(self, chat):
     
-        queryset = Chat.objects.get(pk=chat_pk).messages.all()
+        queryset = chat.messages.all()
         return queryset
 
-    ''' Handles LIST / GET requests.
+    ''' Handles LIST / GET requests. By default, every message in the chat is
+        returned. Clients can instead page backwards through the history with
+        `?before=<message_id>&limit=`, or catch up on the messages they missed
+        with `?since=<timestamp>`. Both are answered from the
+        `(chat, timestamp, id)` index.
         Args:
             request: The GET request.
             pk: The primary key of the user we're querying over.
@@ -161,14 +210,92 @@ class MessageList(APIView):
     ''' 
     def get(self, request, pk, chat_pk, format=None):
 
-        self.check_object_permissions(request, Chat.objects.get(pk=chat_pk))
-        queryset = self.get_queryset(chat_pk)
-        
-        response = []
-        for message in queryset:
-            response.append(self.serializer_class(message).data)
+        chat = self.get_chat(chat_pk)
+        self.check_object_permissions(request, chat)
+        queryset = self.get_queryset(chat)
+
+        params = request.query_params
+        if not any(param in params for param in ('before', 'since', 'limit')):
+            serializer = self.serializer_class(queryset, many=True)
+            return Response(serializer.data)
+
+        limit = self.get_limit(params.get('limit'))
+        if 'since' in params:
+            # Catch up from the given time, oldest first.
+            try:
+                since = parse_datetime(params['since'])
+            except ValueError:
+                since = None
+            if since is None:
+                self._raise_bad_request('invalid since timestamp.')
+            messages = list(queryset.filter(timestamp__gt=since).\
+                    order_by('timestamp', 'id')[:limit + 1])
+            has_more = len(messages) > limit
+            messages = messages[:limit]
+        else:
+            # Page backwards from the given message (or the latest one).
+            if 'before' in params:
+                queryset = queryset.filter(
+                        self.get_before_filter(queryset, params['before'])
+                )
+            messages = list(queryset.order_by('-timestamp', '-id')[:limit + 1])
+            has_more = len(messages) > limit
+            messages = messages[:limit]; messages.reverse()
+
+        serializer = self.serializer_class(messages, many=True)
+        return Response({'results': serializer.data, 'has_more': has_more})
+
+    ''' Returns the Chat object with the given pk. '''
+    def get_chat(self, chat_pk):
 
-        return Response(response)
+        try:
+            return Chat.objects.get(pk=chat_pk)
+        except Chat.DoesNotExist:
+            self._raise_bad_request(
+                    'chat with id={} does not exist'.format(chat_pk)
+            )
+
+    ''' Returns the page size, capped at `max_limit`.
+        Args:
+            limit -- The requested page size (if any).
+    '''
+    def get_limit(self, limit):
+
+        if limit is None:
+            return self.default_limit
+
+        try:
+            limit = int(limit)
+        except ValueError:
+            limit = 0
+
+        if limit <= 0:
+            self._raise_bad_request('limit must be a positive integer.')
+
+        return min(limit, self.max_limit)
+
+    ''' Returns a filter for the messages that precede the given message.
+        Args:
+            queryset -- The chat's messages.
+            before -- The primary key of the message to page back from.
+    '''
+    def get_before_filter(self, queryset, before):
+
+        try:
+            timestamp = queryset.filter(pk=before).\
+                    values_list('timestamp', flat=True).get()
+        except (ValueError, ValidationError, Message.DoesNotExist):
+            self._raise_bad_request(
+                    'message with id={} does not exist'.format(before)
+            )
+
+        return Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lt=before)
+
+    @staticmethod
+    def _raise_bad_request(error_msg):
+
+        exc = APIException(detail={'error': error_msg})
+        exc.status_code = status.HTTP_400_BAD_REQUEST; raise exc
     
     ''' Handles POST requests.
         Args:
@@ -191,7 +318,6 @@ class MessageList(APIView):
                     sender_name=user_name,
                     chat=chat
             )
-            chat.opened = False; chat.save()
 
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
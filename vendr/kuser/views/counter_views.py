@@ -0,0 +1,34 @@
+#
+# Counter views.
+#
+# ========================================================================
+
+from rest_framework import permissions
+from rest_framework.views import APIView
+from rest_framework.response import Response
+
+from kuser.counters import notification_counter, chat_counter
+
+import kuser.permissions as kuser_permissions
+
+
+'''   Unread counters for a user's badges. These are answered from Redis, so
+      polling them doesn't touch the user's notifications or chats. '''
+class CounterDetail(APIView):
+
+    permission_classes = ( permissions.IsAuthenticated,
+                           kuser_permissions.CounterPermissions
+    )
+
+    ''' Handles GET requests.
+        Args:
+            request: The GET request.
+            pk: The primary key of the user we're querying over.
+            *format: Specified data format.
+    '''
+    def get(self, request, pk, format=None):
+
+        return Response({
+                'notifications': notification_counter.count(pk),
+                'chats': chat_counter.count(pk)
+        })
@@ -11,6 +11,7 @@ from rest_framework.exceptions import APIException
 
 import kuser.serializers
 
+from ksearch.pagination import KeysetPagination
 from kuser.models import *
 from kuser.permissions import IsNotificationOwner
 from kuser.exceptions import NotificationNotFound, InvalidFieldRequest
@@ -31,21 +32,32 @@ def resolve_serializer(serializer_class):
     return serializer
 
 
+''' Keyset pagination over a user's notifications, newest first. '''
+class NotificationPagination(KeysetPagination):
+
+    orderings = ('-timestamp', 'timestamp')
+    default_ordering = '-timestamp'
+    datetime_fields = ('timestamp', )
+
+
 '''   Notification list view. '''
 class NotificationList(APIView):
 
     permission_classes = ( permissions.IsAuthenticated, IsNotificationOwner, )
+    pagination_class = NotificationPagination
     
-    ''' Get the given user's notifications.
+    ''' Get the given user's notifications. Note, we only need enough of each
+        row to page on, and to find its actual type.
         Args:
             user_pk: The primary key of the user we're querying over.
     '''
     def get_queryset(self, user_pk):
 
         user = self.request.user
-        return user.notifications.all().order_by("-timestamp")
+        return user.notifications.only('id', 'timestamp', '_content_type')
 
-    ''' Get a list of notifications for a given user.
+    ''' Get a list of notifications for a given user. The notifications are
+        paginated if any of the cursor params are given.
         Args:
             request: The GET request data.
             user_pk: The primary key of the user we're querying over.
@@ -56,23 +68,29 @@ class NotificationList(APIView):
         # Get the notification queryset.
         queryset = self.get_queryset(user_pk)
 
-        # Serialize each notification. Note, our queryset only contains parent
-        # notifications, so we'll want to downcast so that we can their serializer.
-        response = []
-        for notification in queryset:
-            
-            # Downcast if necessary to get the correct type.
-            if notification.actual_type:
-                notification = notification.actual_type
-        
+        paginator = None
+        if any(param in request.query_params
+                for param in self.pagination_class.params):
+            paginator = self.pagination_class()
+            notifications = paginator.paginate_queryset(queryset, request, self)
+        else:
+            notifications = list(queryset.order_by('-timestamp', '-id'))
+
+        # Serialize each notification as its actual type. Note, there are
+        # only a handful of types, so each serializer is only resolved once.
+        serializers, response = {}, []
+        for notification in BaseNotification.objects.downcast(notifications):
             notification_class = notification.__class__
-            
-            # Get the appropriate serializer and serialize the data.
-            serializer_class = notification_class().get_serializer()
-            serializer       = resolve_serializer(serializer_class)
+            if notification_class not in serializers:
+                serializers[notification_class] = resolve_serializer(
+                        notification_class.get_serializer()
+                )
 
+            serializer = serializers[notification_class]
             response.append(serializer(notification).data)
 
+        if paginator:
+            return Response(paginator.get_paginated_data(response))
         return Response(response)
 
 
@@ -10,6 +10,8 @@ from rest_framework.generics import ListCreateAPIView, RetrieveUpdateDestroyAPIV
 from rest_framework.exceptions import APIException
 
 from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.db import transaction as db_transaction
 
 from transaction.models import AbstractContractFactory, Contract, StaticClause, DynamicClause
 from transaction.serializers import GenericClauseSerializer, StaticClauseSerializer, \
@@ -174,7 +176,7 @@ class TemplateClauseDetail(RetrieveUpdateDestroyAPIView):
         try:
             clause = template.static_clauses.get(pk=clause_pk)
         except StaticClause.DoesNotExist:
-            clause = template.dynamic_clauses.get(pk=clause_pk).actual_type
+            clause = template.dynamic_clauses.get(pk=clause_pk).actual
         except DynamicClause.DoesNotExist:
             error_msg = {'error': 'clause with pk {} does not exist.'}.\
                          format(clause_pk)
@@ -198,28 +200,54 @@ class TemplateClauseBatchDetail(TemplateClauseDetail):
         """
         Handles batch clause updates. Note, this is the only way we are handling
         these updates, as it allows us to minimize API requests, and connects
-        better with our notifications API.
+        better with our notifications API. Every change is validated before
+        any of them are written, and the dynamic clauses are written together
+        (see `Contract.update_clauses()`), so the template's fingerprint is
+        updated once for the whole batch.
         """
-        
-        response = []
+
+        user = User.objects.get(pk=self.kwargs["pk"])
+        template = user.templates.get(pk=self.kwargs["template_pk"])
+
+        clauses = []; static_serializers = []; changes = []
         for clause_data in request.data:
             pk = clause_data['pk']; data = clause_data['data']
             clause = self.get_object(clause_pk=pk)
-            serializer_class = self._resolve_serializer(clause.serializer)
-            serializer = serializer_class(
-                    clause,
-                    data=data,
-                    partial=True
-            )
-            if serializer.is_valid():
-                serializer.save()
-                response.append(serializer.data)
-            else:
-                return Response(
-                        serializer.errors,
-                        status=status.HTTP_400_BAD_REQUEST
+            clauses.append(clause)
+
+            if isinstance(clause, StaticClause):
+                serializer_class = self._resolve_serializer(clause.serializer)
+                serializer = serializer_class(
+                        clause,
+                        data=data,
+                        partial=True
                 )
-        
+                if not serializer.is_valid():
+                    return Response(
+                            serializer.errors,
+                            status=status.HTTP_400_BAD_REQUEST
+                    )
+                static_serializers.append(serializer)
+            else:
+                try:
+                    changes.append((clause, clause.apply_changes(data)))
+                except ValidationError as e:
+                    return Response(
+                            e.message_dict,
+                            status=status.HTTP_400_BAD_REQUEST
+                    )
+
+        with db_transaction.atomic():
+            for serializer in static_serializers:
+                serializer.save()
+            if changes:
+                template.update_clauses(changes)
+
+        response = [
+                self._resolve_serializer(clause.serializer)(clause).data
+                for clause in clauses
+        ]
+
         return Response(response)
 
     def delete(self, request, *args, **kwargs):
@@ -233,7 +261,7 @@ class TemplateClauseBatchDetail(TemplateClauseDetail):
         """
 
         mapping = {
-                "StaticSerializer": StaticClauseSerializer,
+                "StaticClauseSerializer": StaticClauseSerializer,
                 "DynamicClauseSerializer": DynamicClauseSerializer,
                 "DropdownClauseSerializer": DropdownClauseSerializer
         }
@@ -0,0 +1,126 @@
+/* Load test for the notification socket.
+ *
+ * Connects SOCKETS clients (10,000 by default) to the server, each joined to
+ * its user's notifications channel, and then publishes MESSAGES messages to
+ * random users' channels through Redis. Each message carries the time it
+ * was published, so we can report the delivery latency, along with how many
+ * messages were delivered to sockets that didn't own the channel (there
+ * should be none).
+ *
+ * The users to connect as are read from a JSON file of
+ *
+ *	[{"pk": <user_pk>, "token": <oauth_token>}, ...]
+ *
+ * and are reused round-robin, so a handful of users can hold every socket.
+ *
+ * Usage:
+ *	USERS_FILE=users.json SOCKETS=10000 MESSAGES=5000 node load_test.js
+ *
+ * N.b. -- Raise the open file limit (ulimit -n) on both ends first. */
+
+const URL = process.env.NOTIFY_URL || 'http://localhost:9000';
+const SOCKETS = parseInt(process.env.SOCKETS || '10000');
+const MESSAGES = parseInt(process.env.MESSAGES || '5000');
+const RATE = parseInt(process.env.RATE || '1000');
+
+const REDIS_SERVER = process.env.REDIS_HOST || 'localhost';
+const REDIS_PORT = process.env.REDIS_PORT || 9200;
+
+var fs = require('fs');
+var io = require('socket.io-client');
+var redis_pub = require('redis').createClient(REDIS_PORT, REDIS_SERVER);
+
+var users = JSON.parse(fs.readFileSync(process.env.USERS_FILE || 'users.json'));
+
+var stats = {connected: 0, failed: 0, delivered: 0, misrouted: 0};
+var latencies = [];
+var sockets_by_pk = {};
+
+/* Connect a socket as the given user, and join their channel. */
+function connect(user) {
+
+	var channel = 'users.' + user.pk + '.notifications';
+	var socket = io.connect(URL, {
+		transports: ['websocket'],
+		upgrade: false,
+		forceNew: true,
+		extraHeaders: {
+			'Authorization': 'Bearer ' + user.token,
+			'pk': String(user.pk)
+		}
+	});
+
+	return new Promise(function(resolve) {
+		socket.on('connect', function() {
+			socket.emit('join', channel);
+		});
+		socket.on('greeting', function() {
+			stats.connected++;
+			sockets_by_pk[user.pk] = (sockets_by_pk[user.pk] || 0) + 1;
+			resolve();
+		});
+		socket.on('error', function() {
+			stats.failed++;
+			resolve();
+		});
+		socket.on(channel, function(message) {
+			message = JSON.parse(message);
+			if (String(message.pk) !== String(user.pk)) {
+				stats.misrouted++;
+			}
+			stats.delivered++;
+			latencies.push(Date.now() - message.sent);
+		});
+	});
+}
+
+/* Publish MESSAGES messages at RATE messages per second. Resolves with the
+ * number of deliveries we expect (one per socket the recipient holds). */
+function publish() {
+
+	var expected = 0, published = 0;
+	return new Promise(function(resolve) {
+		var timer = setInterval(function() {
+			for (var i = 0; (i < RATE / 10) && (published < MESSAGES); i++) {
+				var user = users[Math.floor(Math.random() * users.length)];
+				expected += sockets_by_pk[user.pk] || 0;
+				redis_pub.publish('users.' + user.pk + '.notifications',
+					JSON.stringify({pk: user.pk, sent: Date.now()}));
+				published++;
+			}
+			if (published >= MESSAGES) {
+				clearInterval(timer);
+				resolve(expected);
+			}
+		}, 100);
+	});
+}
+
+function percentile(sorted, p) {
+	return sorted.length ? sorted[Math.min(sorted.length - 1,
+		Math.floor(sorted.length * p))] : 0;
+}
+
+var started = Date.now();
+var connections = [];
+for (var i = 0; i < SOCKETS; i++) {
+	connections.push(connect(users[i % users.length]));
+}
+
+Promise.all(connections).then(function() {
+	console.log('connected ' + stats.connected + ' sockets (' + stats.failed +
+		' failed) in ' + (Date.now() - started) + 'ms');
+	return publish();
+}).then(function(expected) {
+
+	// Give the last messages a few seconds to arrive.
+	setTimeout(function() {
+		latencies.sort(function(a, b) { return a - b; });
+		console.log('delivered ' + stats.delivered + '/' + expected +
+			' (' + stats.misrouted + ' misrouted)');
+		console.log('latency p50=' + percentile(latencies, 0.5) + 'ms p99=' +
+			percentile(latencies, 0.99) + 'ms max=' +
+			percentile(latencies, 1) + 'ms');
+		process.exit(stats.misrouted || (stats.delivered < expected) ? 1 : 0);
+	}, 5000);
+});
@@ -0,0 +1,84 @@
+#
+# Backfill the `kind` and `json_value` columns of dynamic clauses.
+#
+# Dynamic clauses created before these columns existed only keep their value
+# in their clause table, so reading them as their actual type costs a query
+# per clause. This copies each clause table's values onto the dynamic clause
+# table, one batch of rows (and one transaction) at a time, so that it can be
+# run while the site is up, and re-run if it's interrupted. Run it once
+# migration 0013 has added the columns. Until it has reached a clause, that
+# clause is read through `actual_type`, as before.
+#
+# ==========================================================================
+
+from __future__ import unicode_literals
+
+import time
+
+from django.db import connection, transaction
+from django.core.management.base import BaseCommand
+
+from transaction.models import DynamicClause, DYNAMIC_CLAUSES
+
+
+class Command(BaseCommand):
+
+    help = 'Copy dynamic clause values onto the dynamic clause table.'
+
+    # Note, dates are stored as ISO 8601 strings, and arrays as JSON arrays,
+    # the same as `DynamicClause.sync_value()` stores them.
+    backfill_sql = '''
+        UPDATE {parent} AS p
+        SET kind = %s, json_value = to_jsonb(c.value)
+        FROM {child} AS c
+        WHERE c.{ptr} = p.id AND p.id IN (
+            SELECT p2.id FROM {parent} AS p2
+            JOIN {child} AS c2 ON c2.{ptr} = p2.id
+            WHERE p2.kind IS NULL
+            LIMIT %s
+        )
+    '''
+
+    def add_arguments(self, parser):
+
+        parser.add_argument('--batch-size', type=int, default=5000,
+                help='The number of clauses to update at a time.')
+
+    def handle(self, *args, **options):
+
+        started = time.time()
+        total = 0
+        for kind, model in sorted(DYNAMIC_CLAUSES.items()):
+            updated = self.backfill(kind, model, options['batch_size'])
+            self.stdout.write('{}: {} clauses'.format(kind, updated))
+            total += updated
+
+        self.stdout.write('backfilled {} clauses in {:.2f}s.'.format(
+            total, time.time() - started))
+
+    def backfill(self, kind, model, batch_size):
+        """
+        Backfill the clauses of a single type. Returns the number of clauses
+        updated.
+        Args:
+            `kind` (str) -- The clause type's key in the dynamic clauses dict.
+            `model` (DynamicClause) -- The clause type.
+            `batch_size` (int) -- The number of clauses to update at a time.
+        """
+
+        qn = connection.ops.quote_name
+        sql = self.backfill_sql.format(
+                parent=qn(DynamicClause._meta.db_table),
+                child=qn(model._meta.db_table),
+                ptr=qn(model._meta.pk.column)
+        )
+
+        updated = 0
+        while True:
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(sql, [kind, batch_size])
+                if not cursor.rowcount:
+                    break
+                updated += cursor.rowcount
+
+        return updated
@@ -0,0 +1,117 @@
+#
+# Benchmark contract creation.
+#
+# Creates a batch of contracts of each type, once with their clauses saved
+# one at a time, and once with the clauses materialized from the contract
+# type's blueprint in bulk, and reports the time (and queries) per contract.
+# Everything is rolled back once we're done. Note, the row by row runs skip
+# the per-clause contract digest updates, so that they measure clause
+# creation as it was before contracts kept digests.
+#
+# ==========================================================================
+
+from __future__ import unicode_literals
+
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import CaptureQueriesContext
+
+from transaction.models import CoOpContract, CondoContract, HouseContract, \
+        TownhouseContract, ManufacturedContract, VacantLandContract, \
+        DynamicClause
+
+CONTRACT_TYPES = OrderedDict([
+        ('coop', CoOpContract),
+        ('condo', CondoContract),
+        ('house', HouseContract),
+        ('townhouse', TownhouseContract),
+        ('manufactured', ManufacturedContract),
+        ('vacant_land', VacantLandContract)
+])
+
+
+class Command(BaseCommand):
+
+    help = 'Time contract creation, with row by row, and bulk, clause inserts.'
+
+    def add_arguments(self, parser):
+
+        parser.add_argument('ctypes', nargs='*',
+                help='The contract types to benchmark (e.g. house). '
+                     'Defaults to all of them.')
+        parser.add_argument('--contracts', type=int, default=100,
+                help='The number of contracts to create per run.')
+
+    def handle(self, *args, **options):
+
+        ctypes = options['ctypes'] or list(CONTRACT_TYPES)
+        unknown = set(ctypes) - set(CONTRACT_TYPES)
+        if unknown:
+            raise CommandError('unknown contract types: {}'.format(
+                ', '.join(sorted(unknown))))
+
+        with transaction.atomic():
+            owner = get_user_model().objects.create_user(
+                    email='bench-{}@vendoor.ca'.format(uuid.uuid4().hex),
+                    password=uuid.uuid4().hex
+            )
+
+            for ctype in ctypes:
+                model = CONTRACT_TYPES[ctype]
+                before = self.run(model, owner, options['contracts'], bulk=False)
+                after = self.run(model, owner, options['contracts'], bulk=True)
+                self.stdout.write(
+                        '{:<13} row by row: {:7.2f}ms ({} queries)  '
+                        'bulk: {:7.2f}ms ({} queries)  {:.1f}x'.format(
+                            ctype, before[0], before[1], after[0], after[1],
+                            before[0] / after[0]
+                        )
+                )
+
+            transaction.set_rollback(True)
+
+    def run(self, model, owner, n_contracts, bulk):
+        """
+        Returns the average time (in ms), and number of queries, it took to
+        create each contract.
+        Args:
+            `model` (Contract) -- The type of contract to create.
+            `owner` (User) -- The owner of the contracts.
+            `n_contracts` (int) -- The number of contracts to create.
+            `bulk` (bool) -- Whether or not to insert the clauses in bulk.
+        """
+
+        with CaptureQueriesContext(connection) as queries:
+            started = time.time()
+            for _ in range(n_contracts):
+                if bulk:
+                    model.objects.create_contract(owner=owner,
+                            transaction=None, is_template=True)
+                else:
+                    with transaction.atomic(), self.without_digests():
+                        contract = model.objects.create(owner=owner,
+                                transaction=None, is_template=True)
+                        model.clause_blueprint.build(contract, bulk=False)
+            elapsed = time.time() - started
+
+        return (elapsed * 1000 / n_contracts,
+                len(queries) // n_contracts)
+
+    @contextmanager
+    def without_digests(self):
+        """
+        Stop saved clauses from updating their contract's digest.
+        """
+
+        digest_changes = vars(DynamicClause)['digest_changes']
+        DynamicClause.digest_changes = lambda clause: None
+        try:
+            yield
+        finally:
+            DynamicClause.digest_changes = digest_changes
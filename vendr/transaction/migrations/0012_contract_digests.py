@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transaction', '0011_auto_20170711_0258'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contract',
+            name='clause_digests',
+            field=django.contrib.postgres.fields.jsonb.JSONField(default=dict),
+        ),
+        migrations.AddField(
+            model_name='contract',
+            name='digest',
+            field=models.CharField(default=None, max_length=16, null=True),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transaction', '0012_contract_digests'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dynamicclause',
+            name='kind',
+            field=models.CharField(default=None, max_length=20, null=True),
+        ),
+        migrations.AddField(
+            model_name='dynamicclause',
+            name='json_value',
+            field=django.contrib.postgres.fields.jsonb.JSONField(default=None, null=True),
+        ),
+    ]
@@ -532,7 +532,7 @@ class ClauseDocumentMixin(object):
                 seller_accepted = True
 
         # Create (add) the clause to the document. Downcast clause if possible.
-        if hasattr(clause, 'actual_type'): clause = clause.actual_type
+        if hasattr(clause, 'actual'): clause = clause.actual
         new_clause = create_document_clause(
                 document=self,
                 clause=clause,
@@ -624,7 +624,7 @@ class Amendments(Document, ClauseDocumentMixin):
         contract_signing_date = None
         amended_clauses = ', '.join([str(clause) for clause in self.approved_clauses])
         irrevocability_date = contract.dynamic_clauses.get(title='Irrevocability').\
-                actual_type.value
+                actual.value
         self.content = self.content.format(contract_signing_date,
                 amended_clauses, irrevocability_date)
 
@@ -5,15 +5,19 @@
 
 from __future__ import unicode_literals
 
-from django.db import models
+from django.db import models, transaction as db_transaction
 from django.contrib.postgres.fields import ArrayField, JSONField
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
 
 from model_utils.managers import InheritanceManager
 
+import json
 import uuid
+import hashlib
 import datetime
 from collections import OrderedDict
 
@@ -62,6 +66,34 @@ class AbstractContractFactory(object):
                     transaction=transaction, **kwargs)
         return contract
 
+def clause_digest(title, value):
+    """
+    Returns a digest of a dynamic clause's title and value. Contracts are
+    equal iff their dynamic clauses' digests are.
+    Args:
+        `title` (str) -- The title of the clause.
+        `value` -- The value of the clause.
+    """
+
+    clause = json.dumps([title, value], cls=DjangoJSONEncoder, sort_keys=True)
+    return hashlib.sha1(clause.encode("utf-8")).hexdigest()[:16]
+
+
+def combine_digests(digests):
+    """
+    Returns the fingerprint for a set of clause digests. Note, digests are
+    combined with XOR, so the fingerprint doesn't depend on their order, and
+    a single digest can be swapped out without the others.
+    Args:
+        `digests` (iterable of str) -- The clause digests.
+    """
+
+    fingerprint = 0
+    for digest in digests:
+        fingerprint ^= int(digest, 16)
+
+    return "{:016x}".format(fingerprint)
+
 # Contract Managers
 # ===========================================================================
 
@@ -78,42 +110,33 @@ class BaseContractManager(models.Manager):
             STATIC_CLAUSES['agreement_in_writing'], STATIC_CLAUSES['time_and_date'],
         ]
 
+        # Dynamic clauses, by their key in the dynamic clauses doc.
+        self.dynamic_clauses = [
+            'deposit', 'completion_date', 'irrevocability', 'payment_method',
+            'buyer_mrtg_arrange',
+        ]
+
         super(BaseContractManager, self).__init__()
 
-    ''' Create a contract model. '''
+    ''' Create a contract model, along with its clauses. The clauses are
+        materialized from the contract type's blueprint, in the same
+        transaction as the contract.
+        Args:
+            owner: The owner of the contract.
+            transaction: The transaction this contract belongs to.
+    '''
     def create_contract(self, owner, transaction, **kwargs):
         
-        # Create a contract, and add static clauses to it.
-        contract = self.create(
-                owner=owner,
-                transaction=transaction,
-                **kwargs
-        )
-        self.add_static_clauses(contract)
-
-        # Create clauses.
-        deposit_clause = DepositClause.objects.create(contract=contract)
-        completion_date = CompletionDateClause.objects.create(contract=contract)
-        irrevocability_clause = IrrevocabilityClause.objects.create(contract=contract)
-        payment_clause = PaymentMethodClause.objects.create(contract=contract,
-                value='Credit Card')
-        buyer_arranges_mortgage = BuyerArrangesMortgageClause.objects.\
-                create(contract=contract)
+        with db_transaction.atomic():
+            contract = self.create(
+                    owner=owner,
+                    transaction=transaction,
+                    **kwargs
+            )
+            self.model.clause_blueprint.build(contract)
 
         return contract
 
-    ''' (Helper) Adds the appropriate static clauses to the given contract. '''
-    def add_static_clauses(self, contract):
-
-        # Create static clauses.
-        for static_clause in self.static_clauses:
-            clause = StaticClause.objects.create(contract=contract,
-                        title=static_clause['title'],
-                        preview=static_clause['preview'],
-                        explanation=static_clause['explanation'],
-                        _required=static_clause['required']
-            )
-
 
 class CoOpContractManager(BaseContractManager):
 
@@ -137,22 +160,10 @@ class CoOpContractManager(BaseContractManager):
                 COOP_STATIC_CLAUSES['loan_discharge'],
                 COOP_STATIC_CLAUSES['adjustments']
         ]
-
-    def create_contract(self, owner, transaction, **kwargs):
-
-        contract = super(CoOpContractManager, self).\
-                     create_contract(owner, transaction, **kwargs)
-
-        # Dynamic Clauses:
-        chattels_inc = ChattelsIncludedClause.objects.create(contract=contract)
-        fixtures_exc = FixturesExcludedClause.objects.create(contract=contract)
-        rented_items = RentalItemsClause.objects.create(contract=contract)
-        equipment = EquipmentClause.objects.create(contract=contract)
-        environment = EnvironmentClause.objects.create(contract=contract)
-        maintenance = MaintenanceClause.objects.create(contract=contract)
-        chattels_and_fixs = ChattelsAndFixsClause.objects.create(contract=contract)
-        
-        return contract
+        self.dynamic_clauses += [
+                'chattels_inc', 'fixtures_exc', 'rented_items', 'equipment',
+                'environmental', 'maintenance', 'chattels_and_fixs'
+        ]
 
 
 class CondoContractManager(CoOpContractManager):
@@ -178,22 +189,7 @@ class CondoContractManager(CoOpContractManager):
             CONDO_STATIC_CLAUSES['discharge'],
             CONDO_STATIC_CLAUSES['adjustments']
         ]
-                
-    ''' Create a Condo Contract.
-        Args:
-            owner: The owner of the contract.
-            transaction: The transaction this contract belongs to.
-    '''
-    def create_contract(self, owner, transaction, **kwargs):
-
-        contract = super(CondoContractManager, self).\
-                     create_contract(owner, transaction, **kwargs)
-
-        # Dynamic Clauses:
-        mortgage_deadline = MortgageDeadlineClause.objects.create(contract=contract)
-        uffi = UFFIClause.objects.create(contract=contract)
-        
-        return contract
+        self.dynamic_clauses += ['mortgage_date', 'uffi']
 
 
 '''   [Abstract] '''
@@ -218,28 +214,10 @@ class CoOwnershipContractManager(BaseContractManager):
                 COOWNERSHIP_STATIC_CLAUSES['residency'],
                 COOWNERSHIP_STATIC_CLAUSES['adjustments']
         ]
- 
-    ''' Create a CoOwnership Contract.
-        Args:
-            owner: The owner of the contract.
-            transaction: The transaction this contract belongs to.
-    '''
-    def create_contract(self, owner, transaction, **kwargs):
-        
-        contract = super(CoOwnershipContractManager, self).\
-                     create_contract(owner, transaction, **kwargs)
-
-        # Dynamic Clauses:
-        chattels_inc = ChattelsIncludedClause.objects.create(contract=contract)
-        fixtures_exc = FixturesExcludedClause.objects.create(contract=contract)
-        rented_items = RentalItemsClause.objects.create(contract=contract)
-        mortgage_deadline = MortgageDeadlineClause.objects.create(contract=contract)
-        equipment = EquipmentClause.objects.create(contract=contract)
-        environment = EnvironmentClause.objects.create(contract=contract)
-        maintenance = MaintenanceClause.objects.create(contract=contract)
-        chattels_and_fixs = ChattelsAndFixsClause.objects.create(contract=contract)
- 
-        return contract
+        self.dynamic_clauses += [
+                'chattels_inc', 'fixtures_exc', 'rented_items', 'mortgage_date',
+                'equipment', 'environmental', 'maintenance', 'chattels_and_fixs'
+        ]
 
 
 class HouseContractManager(BaseContractManager):
@@ -265,30 +243,11 @@ class HouseContractManager(BaseContractManager):
                 STATIC_CLAUSES['property_tax_assessment'],
                 STATIC_CLAUSES['tender'],
         ]
-    
-    ''' Create a House Contract.
-        Args:
-            owner: The owner of the contract.
-            transaction: The transaction this contract belongs to.
-    '''
-    def create_contract(self, owner, transaction, **kwargs):
-        
-        contract = super(HouseContractManager, self).\
-                     create_contract(owner, transaction, **kwargs)
-
-        # Dynamic Clauses:
-        chattels_inc = ChattelsIncludedClause.objects.create(contract=contract)
-        fixtures_exc = FixturesExcludedClause.objects.create(contract=contract)
-        rented_items = RentalItemsClause.objects.create(contract=contract)
-        mortgage_deadline = MortgageDeadlineClause.objects.create(contract=contract)
-        equipment = EquipmentClause.objects.create(contract=contract)
-        environment = EnvironmentClause.objects.create(contract=contract)
-        survey = SurveyDeadlineClause.objects.create(contract=contract)
-        maintenance = MaintenanceClause.objects.create(contract=contract)
-        uffi = UFFIClause.objects.create(contract=contract)
-        chattels_and_fixs = ChattelsAndFixsClause.objects.create(contract=contract)
- 
-        return contract
+        self.dynamic_clauses += [
+                'chattels_inc', 'fixtures_exc', 'rented_items', 'mortgage_date',
+                'equipment', 'environmental', 'survey_date', 'maintenance',
+                'uffi', 'chattels_and_fixs'
+        ]
 
 
 class TownhouseContractManager(HouseContractManager):
@@ -303,20 +262,6 @@ class TownhouseContractManager(HouseContractManager):
             STATIC_CLAUSES['meetings'],
             STATIC_CLAUSES['condo_laws_acknowledgement_pre'],
         ]
-    
-    ''' Create a Townhouse House Contract.
-        Args:
-            owner: The owner of the contract.
-            transaction: The transaction this contract belongs to.
-    '''
-    def create_contract(self, owner, transaction, **kwargs):
-        
-        contract = super(TownhouseContractManager, self).\
-              create_contract(owner, transaction, **kwargs)
-
-        # Dynamic Clauses:
- 
-        return contract
 
 
 class ManufacturedContractManager(BaseContractManager):
@@ -344,29 +289,10 @@ class ManufacturedContractManager(BaseContractManager):
                 MOBILE_STATIC_CLAUSES["inspection"],
                 MOBILE_STATIC_CLAUSES["insurance"]
         ]
-    
-    def create_contract(self, owner, transaction, **kwargs):
-        """
-        Create a Manufactured Contract.
-        Args:
-            `owner` (User) -- The owner of the contract.
-            `transaction` (Transaction) -- The transaction this contract belongs to.
-        """
-        
-        contract = super(ManufacturedContractManager, self).\
-              create_contract(owner, transaction, **kwargs)
-
-        # Dynamic Clauses:
-        chattels_inc = ChattelsIncludedClause.objects.create(contract=contract)
-        fixtures_exc = FixturesExcludedClause.objects.create(contract=contract)
-        rented_items = RentalItemsClause.objects.create(contract=contract)
-        mortgage_deadline = MortgageDeadlineClause.objects.create(contract=contract)
-        equipment = EquipmentClause.objects.create(contract=contract)
-        environment = EnvironmentClause.objects.create(contract=contract)
-        maintenance = MaintenanceClause.objects.create(contract=contract)
-        chattels_and_fixs = ChattelsAndFixsClause.objects.create(contract=contract)
- 
-        return contract
+        self.dynamic_clauses += [
+                "chattels_inc", "fixtures_exc", "rented_items", "mortgage_date",
+                "equipment", "environmental", "maintenance", "chattels_and_fixs"
+        ]
 
 
 class VacantLandContractManager(BaseContractManager):
@@ -396,22 +322,7 @@ class VacantLandContractManager(BaseContractManager):
                 STATIC_CLAUSES['property_tax_assessment'],
                 STATIC_CLAUSES['tender'],
         ]
-    
-    def create_contract(self, owner, transaction, **kwargs):
-        """
-        Create a Vacantland Contract.
-        Args:
-            `owner` (User) -- The owner of the contract.
-            `transaction` (Transaction) -- The transaction this contract belongs to.
-        """
-        
-        contract = super(VacantLandContractManager, self).\
-                     create_contract(owner, transaction, **kwargs)
-
-        mortgage_deadline = MortgageDeadlineClause.objects.create(contract=contract)
-        survey = SurveyDeadlineClause.objects.create(contract=contract)
-
-        return contract
+        self.dynamic_clauses += ["mortgage_date", "survey_date"]
 
 # ===========================================================================
 
@@ -448,6 +359,19 @@ class Contract(models.Model):
     
     is_template = models.BooleanField(default=False)
     title = models.CharField(max_length=32, default=None, null=True)
+
+    # The clauses a new contract of this type starts with. Compiled for each
+    # contract type once its clause models are defined (see below).
+    clause_blueprint = None
+
+    # The digest of each dynamic clause, by title, and their combined
+    # fingerprint, which we compare contracts by. The fingerprint is None
+    # until it's been computed.
+    clause_digests = JSONField(default=dict)
+    digest = models.CharField(max_length=16, default=None, null=True)
+
+    # Note, this lets us read contracts (e.g. templates) as their actual type.
+    objects = InheritanceManager()
     
     @property
     def clauses(self):
@@ -458,7 +382,7 @@ class Contract(models.Model):
         clauses = []
         clauses += self.static_clauses.all()
         clauses += [
-                        d_clause.actual_type
+                        d_clause.actual
                         for d_clause in self.dynamic_clauses.all()
         ]
         
@@ -475,17 +399,178 @@ class Contract(models.Model):
         required_clauses = []
         required_clauses += self.static_clauses.filter(_required=True)
         required_clauses += [
-                        d_clause.actual_type
+                        d_clause.actual
                         for d_clause in self.dynamic_clauses.filter(_required=True)
         ]
 
         return required_clauses
 
+    def get_dynamic_clauses(self):
+        """
+        Returns this contract's dynamic clauses, as their actual types, from
+        a single query.
+        """
+
+        return [clause.actual for clause in self.dynamic_clauses.all()]
+
+    def refresh_digest(self):
+        """
+        Rebuild this contract's digest from its dynamic clauses (e.g. if it
+        was created before we kept digests). Returns the new fingerprint.
+        """
+
+        self.clause_digests = dict(
+                (clause.title, clause_digest(clause.title, clause.value))
+                for clause in self.get_dynamic_clauses()
+        )
+        self.digest = combine_digests(self.clause_digests.values())
+        Contract.objects.filter(pk=self.pk).update(
+                clause_digests=self.clause_digests,
+                digest=self.digest
+        )
+
+        return self.digest
+
+    def update_digests(self, values=None, removed=()):
+        """
+        Swap the given clauses' digests into this contract's fingerprint,
+        after the clauses have been saved (or deleted). Returns the new
+        fingerprint.
+        Args:
+            `values` (dict) -- Maps the title of each saved clause to its
+                new value.
+            `removed` (iterable of str) -- The titles of any deleted clauses.
+        """
+
+        values = values or {}
+        with db_transaction.atomic():
+            contract = Contract.objects.select_for_update().\
+                    only("clause_digests", "digest").get(pk=self.pk)
+
+            # Note, the clauses' changes are already saved, so we just read them.
+            if contract.digest is None:
+                contract.refresh_digest()
+            else:
+                fingerprint = int(contract.digest, 16)
+                for title in list(values) + list(removed):
+                    old_digest = contract.clause_digests.pop(title, None)
+                    if old_digest is not None:
+                        fingerprint ^= int(old_digest, 16)
+                for title, value in values.items():
+                    new_digest = clause_digest(title, value)
+                    contract.clause_digests[title] = new_digest
+                    fingerprint ^= int(new_digest, 16)
+
+                contract.digest = "{:016x}".format(fingerprint)
+                Contract.objects.filter(pk=self.pk).update(
+                        clause_digests=contract.clause_digests,
+                        digest=contract.digest
+                )
+
+        self.clause_digests, self.digest = contract.clause_digests, contract.digest
+        return self.digest
+
+    def update_clauses(self, changes):
+        """
+        Write a batch of changes to this contract's dynamic clauses, in a
+        single transaction. The clauses are written in bulk (see
+        `DynamicClauseManager.bulk_update_clauses()`), and the fingerprint,
+        and the transaction's diff, are updated once for the whole batch, if
+        any of the clauses' titles, or values, changed.
+        Args:
+            `changes` (list of tuple) -- (clause, field names) pairs, where
+                each clause already holds its new values (see
+                `DynamicClause.apply_changes()`).
+        """
+
+        with db_transaction.atomic():
+            DynamicClause.objects.bulk_update_clauses(changes)
+
+            values, removed = {}, []
+            for clause, _ in changes:
+                digest_changes = clause.digest_changes()
+                if digest_changes is not None:
+                    values.update(digest_changes[0])
+                    removed.extend(digest_changes[1])
+            if not (values or removed):
+                return
+
+            self.update_digests(values, removed)
+            for clause, _ in changes:
+                clause._mark_saved()
+
+            if self.transaction_id is not None:
+                if self.transaction.contracts.count() == 2:
+                    self.transaction.check_diff()
+
+    def diff(self, other):
+        """
+        Returns the titles of the dynamic clauses that differ between this
+        contract and another, in order.
+        Args:
+            `other` (Contract) -- The contract to compare against.
+        """
+
+        for contract in (self, other):
+            if contract.digest is None:
+                contract.refresh_digest()
+
+        ours, theirs = self.clause_digests, other.clause_digests
+        return sorted(
+                title for title in set(ours) | set(theirs)
+                if ours.get(title) != theirs.get(title)
+        )
+
+    def copy(self, transaction):
+        """
+        Create a new contract on the given transaction, with a copy of each of
+        this contract's clauses (e.g. to start a contract from a template).
+        The clauses are read, and inserted, in bulk, one query per clause
+        table, so the cost doesn't grow with the number of clauses.
+        Args:
+            `transaction` (Transaction) -- The transaction the copy belongs to.
+        """
+
+        if self.digest is None:
+            self.refresh_digest()
+
+        # Note, the clauses are copied as is, and so are their digests.
+        with db_transaction.atomic():
+            contract = type(self).objects.create(
+                    owner_id=self.owner_id,
+                    transaction=transaction,
+                    title=self.title,
+                    clause_digests=self.clause_digests,
+                    digest=self.digest
+            )
+
+            static_clauses = list(self.static_clauses.all())
+            for clause in static_clauses:
+                clause.id = uuid.uuid4()
+                clause.contract = contract
+            StaticClause.objects.bulk_create(static_clauses)
+
+            dynamic_clauses = self.get_dynamic_clauses()
+            for clause in dynamic_clauses:
+                clause.id = uuid.uuid4()
+                setattr(clause, clause._meta.pk.attname, clause.id)
+                clause.contract = contract
+                clause.sync_value()
+
+            # Note, the clauses' values are copied as is.
+            DynamicClause.objects.bulk_create_clauses(dynamic_clauses, raw=True)
+
+            if transaction is not None:
+                if transaction.contracts.count() == 2:
+                    transaction.check_diff()
+
+        return contract
+
     def save(self, *args, **kwargs):
 
         # Check the count if we're creating a new contract that isn't a template.
         if (not self.pk) and (not self.is_template):
-            if self.transaction.contracts.filter(owner=self.owner).count() >= 1:
+            if self.transaction.contracts.filter(owner=self.owner).exists():
                 raise ValueError(
                     "error: the user already has a contract on this transaction."
                 )
@@ -570,11 +655,79 @@ class StaticClause(Clause):
 
 # ==========================================================================
 
+class DynamicClauseManager(models.Manager):
+    """
+    Dynamic clause manager.
+    """
+
+    def bulk_create_clauses(self, clauses, raw=False):
+        """
+        Insert the given clauses, of any type, with one INSERT into the
+        dynamic clause table, and then one per clause table. Note, Django
+        can't `bulk_create` multi-table models, so we insert the child rows
+        ourselves.
+        Args:
+            `clauses` (list of DynamicClause) -- The clauses to insert. Each
+                clause's pk must be set to its `id`.
+            `raw` (bool) -- If True, the clauses' values are inserted as is
+                (e.g. date clauses aren't set to today).
+        """
+
+        clauses_by_model = OrderedDict()
+        for clause in clauses:
+            clauses_by_model.setdefault(type(clause), []).append(clause)
+
+        self.bulk_create(clauses)
+        for model, model_clauses in clauses_by_model.items():
+            model._base_manager._insert(model_clauses,
+                    fields=model._meta.local_concrete_fields, raw=raw)
+
+        return clauses
+
+    def bulk_update_clauses(self, changes):
+        """
+        Write the given fields of each of the given clauses, of any type.
+        Clauses that share the same new values are written together, so the
+        dynamic clause table costs one UPDATE for each distinct set of values,
+        rather than one per clause. Note, each clause's value is mirrored
+        first, so its `json_value` (and `kind`, if it hasn't been backfilled)
+        is always written.
+        Args:
+            `changes` (list of tuple) -- (clause, field names) pairs, where
+                each clause is of its actual type.
+        """
+
+        updates = OrderedDict()
+        for clause, field_names in changes:
+            field_names = set(field_names) | {"json_value"}
+            if clause.kind is None:
+                field_names.add("kind")
+            clause.sync_value()
+
+            for model in (DynamicClause, type(clause)):
+                values = [
+                        (field.attname, getattr(clause, field.attname))
+                        for field in model._meta.local_concrete_fields
+                        if field.name in field_names
+                ]
+                if not values:
+                    continue
+
+                key = (model, json.dumps(values, cls=DjangoJSONEncoder))
+                updates.setdefault(key, (model, dict(values), []))[2].\
+                        append(clause.pk)
+
+        for model, values, pks in updates.values():
+            model._base_manager.filter(pk__in=pks).update(**values)
+
+
 class DynamicClause(Clause):
     """
     Dynamic Clauses are designed on a per-contract basis via user input.
     """
 
+    objects = DynamicClauseManager()
+
     prompt = models.CharField(max_length=75, editable=False)
     contract = models.ForeignKey(
             Contract,
@@ -615,29 +768,202 @@ class DynamicClause(Clause):
             db_index=True
     )
     actual_type = GenericForeignKey("_content_type", "id")
+
+    # The clause's kind (i.e. its key in the dynamic clauses dict), and its
+    # value, mirrored from its clause table. These let us read clauses as
+    # their actual type without a query per clause (see `actual`). Note,
+    # `kind` is None for clauses that haven't been backfilled yet.
+    kind = models.CharField(max_length=20, default=None, null=True)
+    json_value = JSONField(default=None, null=True)
+
+    # The clauses's key in the dynamic clauses dict. Children must set this.
+    clause_key = None
+
+    @property
+    def actual(self):
+        """
+        Returns this clause as its actual type. The clause is built from its
+        `kind` and `json_value`, so this doesn't cost a query, unless the
+        clause hasn't been backfilled, in which case we follow `actual_type`.
+        """
+
+        if type(self) is not DynamicClause:
+            return self
+        if self.kind is None:
+            return self.actual_type
+
+        model = DYNAMIC_CLAUSES[self.kind]
+        clause = model(**dict(
+                (field.attname, getattr(self, field.attname))
+                for field in DynamicClause._meta.concrete_fields
+        ))
+        setattr(clause, model._meta.pk.attname, self.id)
+        clause.value = model._meta.get_field("value").to_python(self.json_value)
+
+        # Any other fields of the clause type (e.g. dropdown options) are
+        # the same for every clause of that type.
+        blueprint = model.get_blueprint()
+        for field in model._meta.local_concrete_fields:
+            if field.attname in blueprint:
+                setattr(clause, field.attname, blueprint[field.attname])
+
+        clause._state.adding = False
+        clause._state.db = self._state.db
+        clause._mark_saved()
+
+        # Keep the clause's contract, if we've already loaded it.
+        cache_name = DynamicClause._meta.get_field("contract").get_cache_name()
+        if hasattr(self, cache_name):
+            setattr(clause, cache_name, getattr(self, cache_name))
+
+        return clause
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+
+        clause = super(DynamicClause, cls).from_db(db, field_names, values)
+        if (cls is not DynamicClause) and \
+                ("title" in field_names) and ("value" in field_names):
+            clause._mark_saved()
+
+        return clause
+
+    def _mark_saved(self):
+        """
+        Remember the title, and digest, that this clause was loaded (or last
+        saved) with, so that saving it only touches its contract's fingerprint
+        if they've changed.
+        """
+
+        self._saved_title = self.title
+        self._saved_digest = clause_digest(self.title, self.value)
+
+    def digest_changes(self):
+        """
+        Returns the (values, removed titles) to swap into the contract's
+        fingerprint for this clause (see `Contract.update_digests()`), or
+        None if its digest hasn't changed since it was loaded. Note, if its
+        title has changed, its old title's digest is removed.
+        """
+
+        saved_title = getattr(self, "_saved_title", None)
+        if (saved_title == self.title) and \
+                (self._saved_digest == clause_digest(self.title, self.value)):
+            return None
+
+        removed = [saved_title] if saved_title not in (None, self.title) else []
+        return {self.title: self.value}, removed
+
+    def sync_value(self):
+        """
+        Mirror this clause's kind, and value, onto the dynamic clause table.
+        """
+
+        self.kind = self.clause_key
+        self.json_value = json.loads(json.dumps(self.value, cls=DjangoJSONEncoder))
+
+    def apply_changes(self, data):
+        """
+        Set the given values on this clause, without saving it. Returns the
+        names of the fields that were set. Raises a ValidationError, keyed by
+        field, if any of the values are invalid.
+        Args:
+            `data` (dict) -- Maps field names to their new values. Anything
+                that isn't an editable, non-relation field of the clause is
+                ignored. Note, the value is always editable (date values are
+                only set automatically when the clause is created), but the
+                other fields of the clause type (e.g. dropdown options) are
+                not, as `actual` always reads them from the blueprint.
+        """
+
+        stored = set(field.name for field in DynamicClause._meta.concrete_fields)
+        stored.add("value")
+
+        field_names, errors = [], {}
+        for field in self._meta.concrete_fields:
+            if (field.name not in data) or field.is_relation:
+                continue
+            if (not field.editable) and (field.name != "value"):
+                continue
+            if field.name not in stored:
+                errors[field.name] = ["This field cannot be changed."]
+                continue
+
+            try:
+                value = field.to_python(data[field.name])
+            except ValidationError as e:
+                errors[field.name] = e.messages
+            else:
+                setattr(self, field.attname, value)
+                field_names.append(field.name)
+
+        if errors:
+            raise ValidationError(errors)
+
+        return field_names
+
+    @classmethod
+    def get_blueprint(cls):
+        """
+        Returns the field values that a new clause of this type starts with,
+        pulled from the dynamic clauses doc.
+        """
+
+        clause = DYNAMIC_STANDARD_CLAUSES[cls.clause_key]
+        blueprint = {
+                "category": clause["category"],
+                "title": clause["title"],
+                "prompt": clause["prompt"],
+                "explanation": clause["explanation"],
+                "_required": clause["required"]
+        }
+
+        return blueprint
     
-    def save(self, clause_key=None, *args, **kwargs):
+    def save(self, *args, **kwargs):
         """
         We have to override this in order to create our inheritance scheme.
-        Args:
-            `clause_key` (str) -- The clauses's key in the dynamic clauses dict.
         """
 
         if not self.pk:
             self.actual_type = self
 
             # Pull clause info from dynamic clauses doc.
-            self.category = DYNAMIC_STANDARD_CLAUSES[clause_key]["category"]
-            self.title = DYNAMIC_STANDARD_CLAUSES[clause_key]["title"]
-            self.prompt = DYNAMIC_STANDARD_CLAUSES[clause_key]["prompt"]
-            self.explanation = DYNAMIC_STANDARD_CLAUSES[clause_key]["explanation"]
-            self._required = DYNAMIC_STANDARD_CLAUSES[clause_key]["required"]
+            for field, value in self.get_blueprint().items():
+                setattr(self, field, value)
+
+        if type(self) is not DynamicClause:
+            self.sync_value()
  
         super(DynamicClause, self).save(*args, **kwargs)
 
-        # Ask the transaction to update the contract diff field. Note, we
-        # only do this if the transaction has more than one contract, and is not
-        # a template.
+        # Note, only the actual clause types have values, and the contract's
+        # fingerprint (and so the diff) only changes with a clause's title,
+        # or value. Edits to several clauses at once should go through
+        # `Contract.update_clauses()`, which does this once for all of them.
+        if type(self) is not DynamicClause:
+            digest_changes = self.digest_changes()
+            if digest_changes is not None:
+                self.contract.update_digests(*digest_changes)
+                self._mark_saved()
+                self._check_diff()
+
+    def delete(self, *args, **kwargs):
+
+        title = getattr(self, "_saved_title", None) or self.title
+        result = super(DynamicClause, self).delete(*args, **kwargs)
+        self.contract.update_digests(removed=[title])
+        self._check_diff()
+
+        return result
+
+    def _check_diff(self):
+        """
+        Ask the transaction to update the contract diff field. Note, we
+        only do this if the transaction has more than one contract, and is not
+        a template.
+        """
+
         if getattr(self.contract, "transaction"):
             _transaction = self.contract.transaction
             if _transaction.contracts.all().count() == 2:
@@ -710,19 +1036,18 @@ class DynamicChipClause(DynamicClause):
     
     class Meta: abstract = True
 
-    def save(self, clause_key, *args, **kwargs):
+    def sync_value(self):
         """
         We need to ensure that our value array is sorted, or our contract
         equivalence checks will fail. For example, if we have a value array
         like ["a", "b"], then ["a", "b"] == ["b", "a"], as we care only
         about combinations, but our contract equivalence algorithm sees
         clause values as permutatons. If we sort the values then we can
-        avoid this.
+        avoid this. Note, this runs on every save, and bulk update.
         """
 
         self.value = sorted(self.value)
-        super(DynamicChipClause, self).save(clause_key=clause_key,
-                *args, **kwargs)
+        super(DynamicChipClause, self).sync_value()
 
 
 class DynamicDateClause(DynamicClause):
@@ -732,14 +1057,19 @@ class DynamicDateClause(DynamicClause):
     
     class Meta: abstract = True
 
+    def sync_value(self):
+
+        # Note, new clauses are dated today, but only once they're inserted.
+        if self.value is None:
+            self.value = datetime.date.today()
+
+        super(DynamicDateClause, self).sync_value()
+
 # ==========================================================================
 
 class CompletionDateClause(DynamicDateClause):
 
-    def save(self, *args, **kwargs):
-
-        super(CompletionDateClause, self).save(clause_key='completion_date',
-                *args, **kwargs)
+    clause_key = 'completion_date'
 
     @property
     def preview(self):
@@ -755,10 +1085,7 @@ class CompletionDateClause(DynamicDateClause):
 
 class IrrevocabilityClause(DynamicDateClause):
 
-    def save(self, *args, **kwargs):
-
-        super(IrrevocabilityClause, self).save(clause_key='irrevocability',
-                *args, **kwargs)
+    clause_key = 'irrevocability'
 
     @property
     def preview(self):
@@ -773,10 +1100,7 @@ class IrrevocabilityClause(DynamicDateClause):
 
 class MortgageDeadlineClause(DynamicDateClause):
 
-    def save(self, *args, **kwargs):
-
-        super(MortgageDeadlineClause, self).save(clause_key='mortgage_date',
-                *args, **kwargs)
+    clause_key = 'mortgage_date'
 
     @property
     def preview(self):
@@ -788,10 +1112,7 @@ class MortgageDeadlineClause(DynamicDateClause):
 
 class SurveyDeadlineClause(DynamicDateClause):
 
-    def save(self, *args, **kwargs):
-
-        super(SurveyDeadlineClause, self).save(clause_key='survey_date',
-                *args, **kwargs)
+    clause_key = 'survey_date'
 
     @property
     def preview(self):
@@ -811,10 +1132,7 @@ class SurveyDeadlineClause(DynamicDateClause):
 class DepositClause(DynamicTextClause):
 
     value = models.PositiveIntegerField(null=True)
-
-    def save(self, *args, **kwargs):
-
-        super(DepositClause, self).save(clause_key='deposit', *args, **kwargs)
+    clause_key = 'deposit'
     
     @property
     def preview(self):
@@ -839,10 +1157,7 @@ class DepositClause(DynamicTextClause):
 
 class ChattelsAndFixsClause(DynamicToggleClause):
 
-    def save(self, *args, **kwargs):
-
-        super(ChattelsAndFixsClause, self).save(clause_key='chattels_and_fixs',
-                *args, **kwargs)
+    clause_key = 'chattels_and_fixs'
 
     @property
     def preview(self):
@@ -853,10 +1168,7 @@ class ChattelsAndFixsClause(DynamicToggleClause):
 
 class BuyerArrangesMortgageClause(DynamicToggleClause):
 
-    def save(self, *args, **kwargs):
-
-        super(BuyerArrangesMortgageClause, self).save(clause_key='buyer_mrtg_arrange',
-                *args, **kwargs)
+    clause_key = 'buyer_mrtg_arrange'
 
     @property
     def preview(self):
@@ -867,9 +1179,7 @@ class BuyerArrangesMortgageClause(DynamicToggleClause):
 
 class EquipmentClause(DynamicToggleClause):
 
-    def save(self, *args, **kwargs):
-
-        super(EquipmentClause, self).save(clause_key='equipment', *args, **kwargs)
+    clause_key = 'equipment'
 
     @property
     def preview(self):
@@ -880,10 +1190,7 @@ class EquipmentClause(DynamicToggleClause):
 
 class EnvironmentClause(DynamicToggleClause):
 
-    def save(self, *args, **kwargs):
-
-        super(EnvironmentClause, self).save(clause_key='environmental',
-                *args, **kwargs)
+    clause_key = 'environmental'
 
     @property
     def preview(self):
@@ -894,10 +1201,7 @@ class EnvironmentClause(DynamicToggleClause):
 
 class MaintenanceClause(DynamicToggleClause):
 
-    def save(self, *args, **kwargs):
-
-        super(MaintenanceClause, self).save(clause_key='maintenance',
-                *args, **kwargs)
+    clause_key = 'maintenance'
 
     @property
     def preview(self):
@@ -908,9 +1212,7 @@ class MaintenanceClause(DynamicToggleClause):
 
 class UFFIClause(DynamicToggleClause):
 
-    def save(self, *args, **kwargs):
-
-        super(UFFIClause, self).save(clause_key='uffi', *args, **kwargs)
+    clause_key = 'uffi'
 
     @property
     def preview(self):
@@ -926,11 +1228,15 @@ class PaymentMethodClause(DynamicDropdownClause):
             default="Credit Card"
     )
 
-    def save(self, *args, **kwargs):
-       
-        if not self.pk: self.options = ['Credit Card', 'Cheque', 'Cash']
-        super(PaymentMethodClause, self).save(clause_key='payment_method',
-                *args, **kwargs)
+    clause_key = 'payment_method'
+
+    @classmethod
+    def get_blueprint(cls):
+
+        blueprint = super(PaymentMethodClause, cls).get_blueprint()
+        blueprint['options'] = ['Credit Card', 'Cheque', 'Cash']
+
+        return blueprint
     
     @property
     def preview(self):
@@ -945,10 +1251,7 @@ class PaymentMethodClause(DynamicDropdownClause):
 
 class ChattelsIncludedClause(DynamicChipClause):
 
-    def save(self, *args, **kwargs):
-
-        super(ChattelsIncludedClause, self).save(clause_key='chattels_inc',
-                *args, **kwargs)
+    clause_key = 'chattels_inc'
 
     @property
     def preview(self):
@@ -962,10 +1265,7 @@ class ChattelsIncludedClause(DynamicChipClause):
 
 class FixturesExcludedClause(DynamicChipClause):
 
-    def save(self, *args, **kwargs):
-
-        super(FixturesExcludedClause, self).save(clause_key='fixtures_exc',
-                *args, **kwargs)
+    clause_key = 'fixtures_exc'
 
     @property
     def preview(self):
@@ -979,10 +1279,7 @@ class FixturesExcludedClause(DynamicChipClause):
 
 class RentalItemsClause(DynamicChipClause):
 
-    def save(self, *args, **kwargs):
-           
-        super(RentalItemsClause, self).save(clause_key='rented_items',
-                *args, **kwargs)
+    clause_key = 'rented_items'
 
     @property
     def preview(self):
@@ -993,3 +1290,107 @@ class RentalItemsClause(DynamicChipClause):
                   
         return preview
 
+# ==========================================================================
+
+class ClauseBlueprint(object):
+    """
+    The clauses that every new contract of a given type starts with. The
+    field values of each clause are compiled once, from the static and dynamic
+    clause docs, so materializing a contract's clauses costs one INSERT per
+    clause table, rather than one per clause.
+    """
+
+    def __init__(self, static_clauses, dynamic_clauses):
+        """
+        Args:
+            `static_clauses` (list of dict) -- The static clauses, as they
+                appear in the static clauses doc.
+            `dynamic_clauses` (list of str) -- The keys of the dynamic clauses.
+        """
+
+        self.static_clauses = [
+                {
+                    "title": clause["title"],
+                    "preview": clause["preview"],
+                    "explanation": clause["explanation"],
+                    "_required": clause["required"]
+                }
+                for clause in static_clauses
+        ]
+        self.dynamic_clauses = [
+                (DYNAMIC_CLAUSES[clause_key],
+                    DYNAMIC_CLAUSES[clause_key].get_blueprint())
+                for clause_key in dynamic_clauses
+        ]
+
+    def build(self, contract, bulk=True):
+        """
+        Create the clauses for the given contract.
+        Args:
+            `contract` (Contract) -- The newly created contract.
+            `bulk` (bool) -- If False, the clauses are saved one at a time
+                (e.g. to compare against the bulk inserts).
+        """
+
+        if not bulk:
+            for fields in self.static_clauses:
+                StaticClause.objects.create(contract=contract, **fields)
+            for model, _ in self.dynamic_clauses:
+                model.objects.create(contract=contract)
+            return
+
+        StaticClause.objects.bulk_create([
+                StaticClause(contract=contract, **fields)
+                for fields in self.static_clauses
+        ])
+
+        dynamic_clauses = []
+        for model, fields in self.dynamic_clauses:
+            clause = model(
+                    contract=contract,
+                    _content_type=ContentType.objects.get_for_model(model),
+                    **fields
+            )
+
+            # Note, the child's pk is its pointer to the parent row.
+            setattr(clause, model._meta.pk.attname, clause.id)
+            clause.sync_value()
+            dynamic_clauses.append(clause)
+
+        DynamicClause.objects.bulk_create_clauses(dynamic_clauses)
+
+        # Bulk inserts skip `DynamicClause.save()`, so set the contract's
+        # digest, and update the contract diff field, ourselves.
+        contract.clause_digests = dict(
+                (clause.title, clause_digest(clause.title, clause.value))
+                for clause in dynamic_clauses
+        )
+        contract.digest = combine_digests(contract.clause_digests.values())
+        Contract.objects.filter(pk=contract.pk).update(
+                clause_digests=contract.clause_digests,
+                digest=contract.digest
+        )
+
+        if contract.transaction_id is not None:
+            if contract.transaction.contracts.count() == 2:
+                contract.transaction.check_diff()
+
+
+# Dynamic clauses, by their key in the dynamic clauses dict.
+DYNAMIC_CLAUSES = dict(
+        (model.clause_key, model)
+        for model in (CompletionDateClause, IrrevocabilityClause,
+            MortgageDeadlineClause, SurveyDeadlineClause, DepositClause,
+            ChattelsAndFixsClause, BuyerArrangesMortgageClause, EquipmentClause,
+            EnvironmentClause, MaintenanceClause, UFFIClause,
+            PaymentMethodClause, ChattelsIncludedClause, FixturesExcludedClause,
+            RentalItemsClause)
+)
+
+# Compile each contract type's blueprint from its manager's clauses.
+for contract_model in (CoOpContract, CondoContract, ManufacturedContract,
+        HouseContract, TownhouseContract, VacantLandContract):
+    contract_model.clause_blueprint = ClauseBlueprint(
+            contract_model.objects.static_clauses,
+            contract_model.objects.dynamic_clauses
+    )
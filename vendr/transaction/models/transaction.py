@@ -216,15 +216,15 @@ class Transaction(models.Model):
                 "in question has both contracts in existence."
         )
 
-        contracts = self.contracts.all().prefetch_related("dynamic_clauses")
-        _c0 = { clause.title: clause.actual_type.value
-                for clause in contracts[0].dynamic_clauses.all()
-        }
-        _c1 = { clause.title: clause.actual_type.value
-                for clause in contracts[1].dynamic_clauses.all()
-        }
-
-        self.contracts_equal = _c0 == _c1
+        # Note, contracts keep a fingerprint of their clauses, so we don't
+        # need to read the clauses themselves.
+        digests = [
+                contract.digest if contract.digest is not None
+                else contract.refresh_digest()
+                for contract in self.contracts.only("id", "digest")
+        ]
+
+        self.contracts_equal = digests[0] == digests[1]
         self.save()
 
     def delete(self, *args, **kwargs):
@@ -48,7 +48,7 @@ class GenericClauseSerializer(ClauseSerializer):
             serializer = StaticClauseSerializer()
         elif isinstance(instance, DynamicClause):
             serializer = DynamicClauseSerializer()
-            instance = instance.actual_type
+            instance = instance.actual
         else:
             raise ValueError("error: invalid clause type given.")
 
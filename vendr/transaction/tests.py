@@ -1,4 +1,9 @@
+import uuid
+import datetime
+
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
 
 from rest_framework.test import APIRequestFactory, APIClient, APITestCase
@@ -7,7 +12,9 @@ from rest_framework import status
 
 from kuser.models import KUser
 from kproperty.models import Condo, Location, TaxRecords, Historical, Features
-from transaction.models import Transaction, Offer, Contract, AbstractContractFactory
+from transaction.models import Transaction, Offer, Contract, AbstractContractFactory, \
+        CondoContract, HouseContract, VacantLandContract, StaticClause, \
+        CompletionDateClause, DepositClause, DynamicClause, PaymentMethodClause
 from transaction.views import *
 
 User = get_user_model()
@@ -871,6 +878,386 @@ class TestContractList(APITestCase):
         response = self.view(request, self.transaction.pk, self.contract.pk)
         self.assertEquals(response.status_code, 401)
 
+'''   Sets up a transaction to create contracts on. '''
+class AbstractContractSetup(TestCase):
+
+    def setUp(self):
+
+        self.owner = User.objects.create_user(email='owner@kangaa.xyz',
+                        password='owner_pwd')
+        self.seller = User.objects.create_user(email='seller@kangaa.xyz',
+                        password='seller_pwd')
+
+        self.kproperty = Condo.objects.create(owner=self.seller, n_bathrooms=1,
+                            n_bedrooms=2, price=250000, sqr_ftg=3000, unit_num=11,
+                            parking_spaces=1, corporation_name='Test Condos')
+        Location.objects.create(kproperty=self.kproperty, address='74 Ulster St',
+                    city="Toronto", country="Canada", province='Ontario',
+                    postal_code='M1P0B2', latitude=43.773313, longitude=-79.258729)
+        self.transaction = Transaction.objects.create(buyer=self.owner,
+                seller=self.seller, kproperty=self.kproperty)
+
+
+'''   Tests for creating contracts from their clause blueprints. '''
+class TestContractCreation(AbstractContractSetup):
+
+    def setUp(self):
+
+        super(TestContractCreation, self).setUp()
+
+        self.template = HouseContract.objects.create_contract(owner=self.owner,
+                transaction=None, is_template=True)
+
+    ''' Returns a contract's clauses in a comparable form. '''
+    def get_clauses(self, contract):
+
+        static_clauses = sorted(
+                (clause.title, clause.explanation, clause._required)
+                for clause in contract.static_clauses.all()
+        )
+        dynamic_clauses = sorted(
+                sorted(clause.actual_type.generator.items())
+                for clause in contract.dynamic_clauses.all()
+        )
+
+        return static_clauses, dynamic_clauses
+
+    ''' Ensure that a contract's clauses are inserted with one query per
+        clause table. '''
+    def test_create_contract_queries(self):
+
+        # Note, the first contract warms up the content type cache.
+        HouseContract.objects.create_contract(owner=self.owner,
+                transaction=None, is_template=True)
+
+        # Contract & house contract, static clauses, dynamic clauses, each
+        # dynamic clause table, and the contract's digest, plus the savepoint.
+        n_tables = len(set(
+                model for model, _ in HouseContract.clause_blueprint.dynamic_clauses
+        ))
+        with self.assertNumQueries(2 + 1 + 1 + n_tables + 1 + 2):
+            contract = HouseContract.objects.create_contract(owner=self.owner,
+                    transaction=None, is_template=True)
+
+        self.assertEqual(contract.static_clauses.count(),
+                len(HouseContract.clause_blueprint.static_clauses))
+        self.assertEqual(contract.dynamic_clauses.count(),
+                len(HouseContract.clause_blueprint.dynamic_clauses))
+
+    ''' Ensure that bulk inserted clauses match clauses saved one at a time. '''
+    def test_bulk_matches_row_by_row(self):
+
+        for model in (CondoContract, HouseContract, VacantLandContract):
+            bulk = model.objects.create_contract(owner=self.owner,
+                    transaction=None, is_template=True)
+
+            row_by_row = model.objects.create(owner=self.owner,
+                    transaction=None, is_template=True)
+            model.clause_blueprint.build(row_by_row, bulk=False)
+
+            self.assertEqual(self.get_clauses(bulk), self.get_clauses(row_by_row))
+            self.assertEqual(bulk.digest,
+                    Contract.objects.get(pk=row_by_row.pk).digest)
+
+
+    ''' Ensure that copying a template copies its clauses, as they are. '''
+    def test_copy_template(self):
+
+        CompletionDateClause.objects.filter(contract=self.template).\
+                update(value=datetime.date(2030, 1, 1))
+        template = Contract.objects.get_subclass(pk=self.template.pk)
+
+        contract = template.copy(self.transaction)
+
+        self.assertIsInstance(contract, HouseContract)
+        self.assertFalse(contract.is_template)
+        self.assertEqual(contract.transaction, self.transaction)
+        self.assertEqual(self.get_clauses(contract), self.get_clauses(template))
+        self.assertEqual(
+                CompletionDateClause.objects.get(contract=contract).value,
+                datetime.date(2030, 1, 1)
+        )
+
+        # Ensure that the template keeps its own clauses.
+        self.assertEqual(template.static_clauses.count(),
+                len(HouseContract.clause_blueprint.static_clauses))
+        self.assertEqual(template.dynamic_clauses.count(),
+                len(HouseContract.clause_blueprint.dynamic_clauses))
+
+    ''' Ensure that the cost of copying a template doesn't depend on the
+        number of clauses it has. '''
+    def test_copy_template_queries(self):
+
+        template = Contract.objects.get_subclass(pk=self.template.pk)
+        with CaptureQueriesContext(connection) as queries:
+            contract = template.copy(self.transaction)
+        contract.delete()
+
+        StaticClause.objects.bulk_create([
+                StaticClause(contract=template, title='Clause {}'.format(i),
+                    preview='Preview', explanation='Explanation')
+                for i in range(10)
+        ])
+        with self.assertNumQueries(len(queries)):
+            template.copy(self.transaction)
+
+'''   Tests for reading dynamic clauses without downcasting them. '''
+class TestDynamicClauseStorage(AbstractContractSetup):
+
+    def setUp(self):
+
+        super(TestDynamicClauseStorage, self).setUp()
+
+        self.contract = AbstractContractFactory.create_contract('house',
+                self.owner, self.transaction)
+
+        clause = CompletionDateClause.objects.get(contract=self.contract)
+        clause.value = datetime.date(2030, 1, 1); clause.save()
+
+    ''' Ensure that a contract's clauses are read in one query per table. '''
+    def test_clauses_query_count(self):
+
+        contract = Contract.objects.get(pk=self.contract.pk)
+        with self.assertNumQueries(2):
+            clauses = contract.clauses
+
+        self.assertEqual(len(clauses), len(HouseContract.clause_blueprint.\
+                static_clauses) + len(HouseContract.clause_blueprint.dynamic_clauses))
+
+    ''' Ensure that clauses read from the dynamic clause table match their
+        actual types. '''
+    def test_actual(self):
+
+        for clause in self.contract.dynamic_clauses.all():
+            actual, actual_type = clause.actual, clause.actual_type
+            self.assertIs(type(actual), type(actual_type))
+            self.assertEqual(actual.pk, actual_type.pk)
+            self.assertEqual(actual.generator, actual_type.generator)
+
+        clause = self.contract.dynamic_clauses.get(kind='completion_date')
+        self.assertEqual(clause.actual.value, datetime.date(2030, 1, 1))
+
+    ''' Ensure that clauses that haven't been backfilled are still read as
+        their actual types. '''
+    def test_actual_not_backfilled(self):
+
+        DynamicClause.objects.filter(contract=self.contract).\
+                update(kind=None, json_value=None)
+
+        clause = self.contract.dynamic_clauses.get(title='Completion Date')
+        self.assertIsNone(clause.kind)
+        self.assertEqual(clause.actual.value, datetime.date(2030, 1, 1))
+
+    ''' Ensure that saving a clause read from the dynamic clause table
+        updates both tables. '''
+    def test_save_actual(self):
+
+        clause = self.contract.dynamic_clauses.get(kind='deposit').actual
+        clause.value = 5000; clause.save()
+
+        self.assertEqual(DepositClause.objects.get(pk=clause.pk).value, 5000)
+        self.assertEqual(DynamicClause.objects.get(pk=clause.pk).json_value, 5000)
+
+
+'''   Tests for comparing contracts by their clause digests. '''
+class TestContractDiff(AbstractContractSetup):
+
+    def setUp(self):
+
+        super(TestContractDiff, self).setUp()
+
+        self.view = ContractDiff.as_view()
+        self.factory = APIRequestFactory()
+        self.path = '/v1/transactions/{}/contracts/diff/'.format(self.transaction.pk)
+
+        self.buyer_contract = AbstractContractFactory.create_contract('house',
+                self.owner, self.transaction)
+        self.seller_contract = AbstractContractFactory.create_contract('house',
+                self.seller, self.transaction)
+
+    def get_diff(self):
+
+        request = self.factory.get(self.path)
+        force_authenticate(request, self.owner)
+        return self.view(request, self.transaction.pk)
+
+    ''' Ensure that contract equality follows clause changes. '''
+    def test_digest_updates(self):
+
+        self.transaction.refresh_from_db()
+        self.assertTrue(self.transaction.contracts_equal)
+
+        clause = DepositClause.objects.get(contract=self.seller_contract)
+        clause.value = 5000; clause.save()
+        self.transaction.refresh_from_db()
+        self.assertFalse(self.transaction.contracts_equal)
+
+        clause.value = None; clause.save()
+        self.transaction.refresh_from_db()
+        self.assertTrue(self.transaction.contracts_equal)
+
+    ''' Ensure that renaming a clause swaps out its old title's digest. '''
+    def test_digest_title_change(self):
+
+        clause = DepositClause.objects.get(contract=self.seller_contract)
+        old_title = clause.title
+        clause.title = 'Renamed deposit'; clause.save()
+
+        contract = Contract.objects.get(pk=self.seller_contract.pk)
+        self.assertNotIn(old_title, contract.clause_digests)
+        self.assertIn(clause.title, contract.clause_digests)
+
+        digest = contract.digest
+        self.assertEqual(contract.refresh_digest(), digest)
+
+    ''' Ensure that saving an unchanged clause doesn't touch its contract. '''
+    def test_digest_unchanged(self):
+
+        clause = DepositClause.objects.get(contract=self.seller_contract)
+        clause.comment = 'Just a comment.'
+
+        with CaptureQueriesContext(connection) as queries:
+            clause.save()
+
+        table = Contract._meta.db_table
+        self.assertFalse(any(table in query['sql'] for query in queries))
+
+    ''' Ensure that contracts without digests are compared by their clauses. '''
+    def test_refresh_digest(self):
+
+        digest = self.seller_contract.digest
+        Contract.objects.filter(pk=self.seller_contract.pk).\
+                update(digest=None, clause_digests={})
+
+        contract = Contract.objects.get(pk=self.seller_contract.pk)
+        self.assertEqual(contract.refresh_digest(), digest)
+
+    ''' Ensure that only the differing clauses are listed. '''
+    def test_diff(self):
+
+        response = self.get_diff()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'contracts_equal': True, 'clauses': []})
+
+        clause = DepositClause.objects.get(contract=self.seller_contract)
+        clause.value = 5000; clause.save()
+
+        response = self.get_diff()
+        self.assertEqual(response.data,
+                {'contracts_equal': False, 'clauses': [clause.title]})
+
+    ''' Ensure that only transaction members can compare contracts. '''
+    def test_diff_wrong_auth(self):
+
+        wrong_user = User.objects.create_user(email='wronguser@kangaa.xyz',
+                        password='wronguser')
+        request = self.factory.get(self.path)
+        force_authenticate(request, wrong_user)
+        response = self.view(request, self.transaction.pk)
+        self.assertEqual(response.status_code, 403)
+
+
+'''   Tests for the ClauseBatchDetail() view. '''
+class TestClauseBatchDetail(AbstractContractSetup):
+
+    def setUp(self):
+
+        super(TestClauseBatchDetail, self).setUp()
+
+        self.view = ClauseBatchDetail.as_view()
+        self.factory = APIRequestFactory()
+
+        self.contract = AbstractContractFactory.create_contract('house',
+                self.owner, self.transaction)
+        self.seller_contract = AbstractContractFactory.create_contract('house',
+                self.seller, self.transaction)
+        self.path = '/v1/transactions/{}/contracts/{}/clauses/batch/'.\
+                format(self.transaction.pk, self.contract.pk)
+
+        self.toggle_clauses = [
+                clause for clause in self.contract.get_dynamic_clauses()
+                if clause.ui_type == 'TOGGLE'
+        ]
+
+    def put(self, update):
+
+        request = self.factory.put(self.path, update, format='json')
+        force_authenticate(request, self.owner)
+        return self.view(request, self.transaction.pk, self.contract.pk)
+
+    ''' Ensure that a batch is written, and diffed, as a whole. '''
+    def test_batch_update(self):
+
+        update = [
+                {'pk': str(clause.pk), 'data': {'value': False}}
+                for clause in self.toggle_clauses
+        ]
+        response = self.put(update)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), len(update))
+
+        for clause in self.toggle_clauses:
+            self.assertFalse(type(clause).objects.get(pk=clause.pk).value)
+        contract = Contract.objects.get(pk=self.contract.pk)
+        self.assertEqual(
+                contract.diff(self.seller_contract),
+                sorted(clause.title for clause in self.toggle_clauses)
+        )
+
+        self.transaction.refresh_from_db()
+        self.assertFalse(self.transaction.contracts_equal)
+
+    ''' Ensure that a batch costs one query per clause table, on top of a
+        fixed number of queries, rather than a full update per clause. '''
+    def test_batch_update_queries(self):
+
+        def update(clauses, value):
+            return [
+                    {'pk': str(clause.pk), 'data': {'value': value}}
+                    for clause in clauses
+            ]
+
+        with CaptureQueriesContext(connection) as queries:
+            self.put(update(self.toggle_clauses[:1], False))
+
+        # Note, each toggle clause has its own table, but they share a single
+        # UPDATE of the dynamic clause table.
+        n_clauses = len(self.toggle_clauses)
+        with self.assertNumQueries(len(queries) + n_clauses - 1):
+            self.put(update(self.toggle_clauses, True))
+
+    ''' Ensure that nothing is written if any change in the batch is invalid. '''
+    def test_batch_update_invalid(self):
+
+        first, last = self.toggle_clauses[0], self.toggle_clauses[-1]
+        update = [
+                {'pk': str(first.pk), 'data': {'value': False}},
+                {'pk': str(last.pk), 'data': {'value': 'not a boolean'}}
+        ]
+        response = self.put(update)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('value', response.data)
+        self.assertTrue(type(first).objects.get(pk=first.pk).value)
+
+        update[1]['pk'] = str(uuid.uuid4())
+        response = self.put(update)
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(type(first).objects.get(pk=first.pk).value)
+
+    ''' Ensure that fields we don't store per clause can't be changed. '''
+    def test_batch_update_blueprint_field(self):
+
+        clause = PaymentMethodClause.objects.get(contract=self.contract)
+        update = [{'pk': str(clause.pk), 'data': {'options': ['Bitcoin']}}]
+        response = self.put(update)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('options', response.data)
+        self.assertEqual(
+                PaymentMethodClause.objects.get(pk=clause.pk).options,
+                PaymentMethodClause.get_blueprint()['options']
+        )
+
+
 '''   Tests for ClauseList() view. '''
 class TestClauseList(APITestCase):
 
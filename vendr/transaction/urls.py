@@ -19,6 +19,8 @@ urlpatterns = [
         # Contract views.
         url(r'^(?P<transaction_pk>[0-9a-f-]+)/contracts/$',
             views.ContractList.as_view()),
+        url(r'^(?P<transaction_pk>[0-9a-f-]+)/contracts/diff/$',
+            views.ContractDiff.as_view()),
         url(r'^(?P<transaction_pk>[0-9a-f-]+)/contracts/(?P<pk>[0-9a-f-]+)/$',
             views.ContractDetail.as_view()),
 
@@ -1,6 +1,6 @@
 from .transaction_views import TransactionList, TransactionDetail, AdvanceStageList
 from .offer_views import OfferList, OfferDetail
-from .contract_views import ContractList, ContractDetail
+from .contract_views import ContractList, ContractDetail, ContractDiff
 from .contract_views import ClauseList, ClauseDetail, ClauseBatchDetail
 from .closing_views import ClosingDetail, \
     WaiverList, WaiverClauseList, WaiverClauseDetail, \
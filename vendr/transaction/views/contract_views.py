@@ -5,6 +5,8 @@
 
 from django.contrib.auth import get_user_model
 from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction as db_transaction
 
 from rest_framework.views import APIView
 from rest_framework.exceptions import APIException
@@ -96,7 +98,7 @@ class ContractList(APIView):
         """
 
         try:
-            template = Contract.objects.get(pk=template)
+            template = Contract.objects.get_subclass(pk=template)
         except Contract.DoesNotExist:
             error_msg = {
                     "error": "template with pk {} does not exist.".\
@@ -104,31 +106,18 @@ class ContractList(APIView):
             }
             raise BadTransactionRequest(error_msg)
 
-        # Make a copy of the clauses. We'll need this to copy everything over
-        # to the new contract instance.
-        clauses = template.clauses
-
-        # Copy the template.
+        # Copy the template, along with its clauses.
         try:
-            template.pk = None
-            template.transaction = transaction
-            template.is_template = False
-            template.save()
+            contract = template.copy(transaction)
         except ValueError:
             error_msg = {
                     "error": "{} already has a contract for this transaction".\
                             format(template.owner.email)
             }
             raise BadTransactionRequest(error_msg)
-
-        # Copy over the clauses.
-        for c in clauses:
-            c.pk = None
-            c.contract = template
-            c.save()
  
         serializer = self.serializer_class()
-        return serializer.to_representation(template), status.HTTP_201_CREATED
+        return serializer.to_representation(contract), status.HTTP_201_CREATED
 
     def _create_from_ctype(self, ctype, transaction):
         """
@@ -231,6 +220,43 @@ class ContractDetail(APIView):
 
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+'''   Contract diff view. '''
+class ContractDiff(APIView):
+
+    permission_classes = ( permissions.IsAuthenticated,
+                           transaction_permissions.TransactionMemberPermission
+    )
+
+    ''' Handles GET requests. Returns the titles of the dynamic clauses that
+        differ between the transaction's contracts. Note, contracts keep a
+        digest of each of their clauses, so the clauses themselves aren't read.
+        Args:
+            request: The GET request.
+            transaction_pk: The primary key of the transaction we're querying over.
+            *format: Specified data format.
+    '''
+    def get(self, request, transaction_pk, format=None):
+
+        transaction = Transaction.objects.get(pk=transaction_pk)
+        self.check_object_permissions(self.request, transaction)
+
+        contracts = list(transaction.contracts.only(
+                "id", "owner", "clause_digests", "digest"))
+        if len(contracts) != 2:
+            error_msg = {
+                    "error": "the transaction must have both contracts to "
+                             "compare them."
+            }
+            raise BadTransactionRequest(error_msg)
+
+        clauses = contracts[0].diff(contracts[1])
+        response = {
+                "contracts_equal": not clauses,
+                "clauses": clauses
+        }
+
+        return Response(response)
+
 # ============================================================================
 # Clause Views.
 
@@ -335,7 +361,7 @@ class ClauseDetail(APIView):
         try:
             clause = contract.static_clauses.get(pk=pk)
         except StaticClause.DoesNotExist:
-            clause = contract.dynamic_clauses.get(pk=pk).actual_type
+            clause = contract.dynamic_clauses.get(pk=pk).actual
         except DynamicClause.DoesNotExist:
             error_msg = {'error': 'clause with pk {} does not exist.'}.\
                          format(pk)
@@ -381,36 +407,83 @@ class ClauseDetail(APIView):
 '''   Clause view for batch updates. '''
 class ClauseBatchDetail(ClauseDetail):
 
-    ''' Handles PUT requests on Clause models.
+    ''' Handles PUT requests on Clause models. The batch is all or nothing:
+        every clause is read up front, with one query per clause table, and
+        every change is validated before any of them are written. The writes
+        then happen in a single transaction, after which the contract diff
+        is checked, and the other party notified, once for the whole batch.
         Args:
-            request: The PUT request.
+            request: The PUT request, with a list of {'pk', 'data'} changes.
             transaction_pk: The transaction that the clause contract belongs to.
             contract_pk: The primary key of the contract the clause belongs to.
-            pk: The primary key of the clause to update.
             *format: Specified data format (e.g. JSON).
     '''
     def put(self, request, transaction_pk, contract_pk, format=None):
-        
-        response = []
+
+        transaction = Transaction.objects.get(pk=transaction_pk)
+        contract = transaction.contracts.get(pk=contract_pk)
+
+        batch = []
         for clause_data in request.data:
-            pk = clause_data['pk']; data = clause_data['data']
-            clause = self.get_object(transaction_pk, contract_pk, pk)
-            serializer = self.serializer_class(
-                    clause,
-                    data=data,
-                    partial=True
-            )
-            if serializer.is_valid():
-                serializer.save()
-                response.append(serializer.data)
-            else:
-                return Response(
-                        serializer.errors,
-                        status=status.HTTP_400_BAD_REQUEST
+            try:
+                pk = DynamicClause._meta.pk.to_python(clause_data['pk'])
+            except ValidationError:
+                raise self.clause_does_not_exist(clause_data['pk'])
+            batch.append((pk, clause_data['data']))
+
+        if not batch:
+            return Response([])
+
+        pks = [pk for pk, _ in batch]
+        clauses = dict(
+                (clause.pk, clause)
+                for clause in contract.static_clauses.filter(pk__in=pks)
+        )
+        clauses.update(
+                (clause.pk, clause.actual)
+                for clause in contract.dynamic_clauses.filter(pk__in=pks)
+        )
+
+        # Validate every change before we write any of them.
+        static_serializers = []; changes = []
+        for pk, data in batch:
+            clause = clauses.get(pk)
+            if clause is None:
+                raise self.clause_does_not_exist(pk)
+            self.check_object_permissions(request, clause)
+
+            if isinstance(clause, StaticClause):
+                serializer = resolve_serializer(clause.serializer)(
+                        clause,
+                        data=data,
+                        partial=True
                 )
-        
-        n_changes = len(response)
-        contract = Contract.objects.get(pk=contract_pk)
+                if not serializer.is_valid():
+                    return Response(
+                            serializer.errors,
+                            status=status.HTTP_400_BAD_REQUEST
+                    )
+                static_serializers.append(serializer)
+            else:
+                try:
+                    changes.append((clause, clause.apply_changes(data)))
+                except ValidationError as e:
+                    return Response(
+                            e.message_dict,
+                            status=status.HTTP_400_BAD_REQUEST
+                    )
+
+        with db_transaction.atomic():
+            for serializer in static_serializers:
+                serializer.save()
+            if changes:
+                contract.update_clauses(changes)
+
+        response = [
+                resolve_serializer(clauses[pk].serializer)(clauses[pk]).data
+                for pk, _ in batch
+        ]
+
         resource = '{}transactions/{}/contracts/{}/'.format(
                 settings.BASE_WEB_URL,
                 transaction_pk,
@@ -418,9 +491,17 @@ class ClauseBatchDetail(ClauseDetail):
         )
         clause_change_signal.send(
                 sender=contract,
-                n_changes=n_changes,
+                n_changes=len(response),
                 resource=resource
         )
 
         return Response(response)
 
+    ''' Returns the error for a clause that isn't in the contract.
+        Args:
+            pk: The primary key of the clause.
+    '''
+    def clause_does_not_exist(self, pk):
+
+        error_msg = {'error': 'clause with pk {} does not exist.'.format(pk)}
+        return BadTransactionRequest(error_msg)
@@ -1,5 +1,6 @@
 from __future__ import absolute_import, unicode_literals
 import os
+from datetime import timedelta
 from celery import Celery
 from celery.schedules import crontab
 
@@ -35,6 +36,36 @@ app.conf.beat_schedule = {
         'openhouse_start': {
             'task': 'kproperty.tasks.openhouse_start',
             'schedule': crontab(minute='*/15')
+        },
+
+        # Flush the buffered property views every minute.
+        'property_views_flush': {
+            'task': 'kproperty.tasks.property_views_flush_task',
+            'schedule': crontab()
+        },
+
+        # Ship pending search index changes to ES.
+        'index_outbox_drain': {
+            'task': 'vendr_core.tasks.index_outbox_drain_task',
+            'schedule': timedelta(seconds=10)
+        },
+
+        # Push pending notifications to their recipients.
+        'notification_outbox_drain': {
+            'task': 'kuser.tasks.notification_outbox_drain_task',
+            'schedule': timedelta(seconds=2)
+        },
+
+        # Archive old, viewed, notifications every day.
+        'notification_archive': {
+            'task': 'kuser.tasks.notification_archive_task',
+            'schedule': crontab(minute=30, hour=4)
+        },
+
+        # Prune the autocomplete change feed every day.
+        'completion_change_prune': {
+            'task': 'autocomplete.tasks.completion_change_prune_task',
+            'schedule': crontab(minute=0, hour=4)
         }
 }
 
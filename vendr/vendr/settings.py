@@ -43,6 +43,7 @@ BASE_APPS = [
 ]
 
 KANGAA_APPS = [
+    'vendr_core',
     'ksearch',
     'kproperty',
     'kuser',
@@ -109,10 +110,11 @@ REDIS_PORT = 9200
 # Cache settings.
 # Note, we'll be using Memcached here.
 # Memcached uses LRU by default, which works (and makes sense) for our
-# use case. Note, we'll also set the cache time-to-live to 30 minutes.
+# use case. Search results are invalidated by tag whenever a property
+# changes, so we can afford to keep them around for a day.
 CACHE_HOST = 'localhost'
 CACHE_PORT = '11214'
-CACHE_TTL = (60) * 30
+CACHE_TTL = (60 * 60) * 24
 CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
@@ -135,6 +137,10 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_TASK_TIME_LIMIT = 600
 CELERY_RESULT_SERIALIZER = 'json'
 
+# Notifications.
+# Viewed notifications are archived after this many days.
+NOTIFICATION_RETENTION_DAYS = 90
+
 # Authorized user model.
 AUTH_USER_MODEL = 'kuser.KUser'
 
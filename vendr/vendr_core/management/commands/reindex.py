@@ -0,0 +1,251 @@
+#
+# Rebuild search indices from scratch.
+#
+# Rows are streamed from Postgres in primary key order, one chunk at a time,
+# and shipped to a fresh, versioned index with parallel bulk requests. Once
+# every row has been shipped, the index's alias is swapped over to the new
+# index in a single atomic step, so searches never see a partial index.
+# The last shipped pk is checkpointed after every chunk, so an interrupted
+# rebuild can be resumed with `--resume`.
+#
+# ==========================================================================
+
+from __future__ import unicode_literals
+
+import os
+import json
+import time
+import tempfile
+
+from elasticsearch.helpers import parallel_bulk, BulkIndexError
+
+from django.apps import apps
+from django.db import models, transaction
+from django.db.models.functions import Cast
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from vendr_core.models import es, IndexedModel, IndexOutbox
+
+
+class Command(BaseCommand):
+
+    help = 'Rebuild the search indices, and swap them in atomically.'
+
+    # Settings for the new index while it's being loaded, and once it's live.
+    load_settings = {'refresh_interval': '-1', 'number_of_replicas': 0}
+    live_settings = {'refresh_interval': '1s', 'number_of_replicas': 1}
+
+    def add_arguments(self, parser):
+
+        parser.add_argument('models', nargs='*',
+                help='The indexed models to rebuild (e.g. kproperty.property). '
+                     'Defaults to all of them.')
+        parser.add_argument('--chunk-size', type=int, default=5000,
+                help='The number of rows to read, and checkpoint, at a time.')
+        parser.add_argument('--bulk-size', type=int, default=500,
+                help='The number of documents per bulk request.')
+        parser.add_argument('--threads', type=int, default=4,
+                help='The number of concurrent bulk requests.')
+        parser.add_argument('--resume', action='store_true',
+                help='Resume from the last checkpoint.')
+        parser.add_argument('--checkpoint-dir', default=tempfile.gettempdir(),
+                help='Where to keep checkpoints.')
+
+    def handle(self, *args, **options):
+
+        self.options = options
+        indexed_models = self.get_models(options['models'])
+
+        # Changes made during the rebuild are held in the outbox until the
+        # new index is live, and are then shipped to it.
+        self.acquire_outbox()
+        try:
+            for model in indexed_models:
+                self.reindex(model)
+        finally:
+            cache.delete(IndexOutbox.objects.lock_key)
+
+    def get_models(self, labels):
+        """
+        Returns the models to reindex. Subclasses share their parent's
+        index (and rows), so only the root of each hierarchy is rebuilt.
+        Args:
+            `labels` (list of str) -- The labels of the models to reindex.
+        """
+
+        if labels:
+            try:
+                return [apps.get_model(label) for label in labels]
+            except (LookupError, ValueError) as exc:
+                raise CommandError(str(exc))
+
+        return [
+                model for model in apps.get_models()
+                if issubclass(model, IndexedModel) and not any(
+                    issubclass(parent, IndexedModel)
+                    for parent in model._meta.parents
+                )
+        ]
+
+    def reindex(self, model):
+        """
+        Rebuild a model's index.
+        Args:
+            `model` (IndexedModel) -- The model to reindex.
+        """
+
+        prototype = model()
+        _meta = prototype._index_meta
+        alias = _meta['_index']
+
+        checkpoint = self.load_checkpoint(alias) if self.options['resume'] \
+                else None
+        if checkpoint:
+            index, last_pk, shipped = checkpoint['index'], \
+                    checkpoint['last_pk'], checkpoint['shipped']
+            self.stdout.write('{}: resuming {} after pk {}.'.format(
+                    alias, index, last_pk))
+        else:
+            index, last_pk, shipped = self.create_index(_meta), 0, 0
+            self.stdout.write('{}: building {}.'.format(alias, index))
+
+        rows = model._get_document_values().order_by('pk')
+        chunk_size = self.options['chunk_size']
+        started, started_count = time.time(), shipped
+        while True:
+            chunk = list(rows.filter(pk__gt=last_pk)[:chunk_size])
+            if not chunk:
+                break
+
+            actions = [{
+                    '_index': index,
+                    '_type': _meta['_doc_type'],
+                    '_id': str(row['pk']),
+                    '_source': prototype._prepare_document(row)
+                } for row in chunk
+            ]
+            try:
+                for ok, item in parallel_bulk(es, actions,
+                        thread_count=self.options['threads'],
+                        chunk_size=self.options['bulk_size']):
+                    pass
+            except BulkIndexError as exc:
+                raise CommandError(
+                        '{}: {} documents failed after pk {}. Run again with '
+                        '--resume to continue.'.format(alias, len(exc.errors),
+                        last_pk)
+                )
+
+            last_pk, shipped = chunk[-1]['pk'], shipped + len(chunk)
+            self.save_checkpoint(alias, index, last_pk, shipped)
+            cache.set(IndexOutbox.objects.lock_key, True,
+                    IndexOutbox.objects.lock_timeout)
+
+            elapsed = max(time.time() - started, 0.001)
+            self.stdout.write('{}: {} documents ({:.0f}/s).'.format(
+                    alias, shipped, (shipped - started_count) / elapsed))
+
+        self.swap(model, alias, index)
+        self.clear_checkpoint(alias)
+        self.stdout.write(self.style.SUCCESS(
+                '{}: {} is live with {} documents.'.format(alias, index, shipped)
+        ))
+
+    def create_index(self, _meta):
+        """
+        Create a new, versioned index for an alias. Refreshes and replicas
+        are turned off while it's loaded.
+        Args:
+            `_meta` (dict) -- Meta config for the index.
+        """
+
+        index = '{}_{}'.format(
+                _meta['_index'], timezone.now().strftime('%Y%m%d%H%M%S')
+        )
+        body = {'settings': {'index': self.load_settings}}
+        if _meta.get('_mapping'):
+            body['mappings'] = {_meta['_doc_type']: _meta['_mapping']}
+
+        es.indices.create(index=index, body=body)
+        return index
+
+    def swap(self, model, alias, index):
+        """
+        Point the alias at the new index, and drop the indices it replaces.
+        Args:
+            `model` (IndexedModel) -- The model that was reindexed.
+            `alias` (str) -- The name searches use for the index.
+            `index` (str) -- The new index.
+        """
+
+        es.indices.put_settings(index=index, body={'index': self.live_settings})
+        es.indices.refresh(index=index)
+
+        # Every document in the new index is keyed by pk, so any ids left over
+        # from the old index (including ones waiting in the outbox) go too.
+        with transaction.atomic():
+            model.objects.filter(_document_id__isnull=False).\
+                    update(_document_id=None)
+            IndexOutbox.objects.filter(index=alias).update(
+                    document_id=Cast('object_id', models.CharField(max_length=32))
+            )
+
+        actions, old_indices = [{'add': {'index': index, 'alias': alias}}], []
+        if es.indices.exists_alias(name=alias):
+            old_indices = list(es.indices.get_alias(name=alias).keys())
+            actions = [
+                    {'remove': {'index': old_index, 'alias': alias}}
+                    for old_index in old_indices
+            ] + actions
+        elif es.indices.exists(index=alias):
+            # The index predates aliasing, so it's dropped in the same step.
+            actions.insert(0, {'remove_index': {'index': alias}})
+
+        es.indices.update_aliases(body={'actions': actions})
+        old_indices = [name for name in old_indices if name != index]
+        if old_indices:
+            es.indices.delete(index=','.join(old_indices))
+
+    def acquire_outbox(self):
+        """
+        Take the outbox lock, waiting for any running drain to finish.
+        """
+
+        waited = 0
+        while not cache.add(IndexOutbox.objects.lock_key, True,
+                IndexOutbox.objects.lock_timeout):
+            if waited >= IndexOutbox.objects.lock_timeout:
+                raise CommandError('timed out waiting for the outbox lock.')
+            time.sleep(1); waited += 1
+
+    def checkpoint_path(self, alias):
+        return os.path.join(
+                self.options['checkpoint_dir'], 'reindex-{}.json'.format(alias)
+        )
+
+    def load_checkpoint(self, alias):
+
+        try:
+            with open(self.checkpoint_path(alias)) as checkpoint:
+                return json.load(checkpoint)
+        except (IOError, ValueError):
+            return None
+
+    def save_checkpoint(self, alias, index, last_pk, shipped):
+
+        # Note, the checkpoint is replaced atomically, so a crash can't
+        # leave a truncated one behind.
+        path = self.checkpoint_path(alias)
+        with open(path + '.tmp', 'w') as checkpoint:
+            json.dump({'index': index, 'last_pk': last_pk, 'shipped': shipped},
+                    checkpoint)
+        os.rename(path + '.tmp', path)
+
+    def clear_checkpoint(self, alias):
+
+        try:
+            os.remove(self.checkpoint_path(alias))
+        except OSError:
+            pass
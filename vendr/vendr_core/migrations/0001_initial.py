@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndexOutbox',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.CharField(max_length=64)),
+                ('doc_type', models.CharField(max_length=64)),
+                ('document_id', models.CharField(max_length=32)),
+                ('model', models.CharField(max_length=100)),
+                ('object_id', models.PositiveIntegerField()),
+                ('action', models.CharField(choices=[('index', 'Index'), ('delete', 'Delete')], max_length=6)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('created_time', models.DateTimeField(auto_now_add=True)),
+                ('available_time', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
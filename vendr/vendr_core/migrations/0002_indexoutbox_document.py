@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vendr_core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='indexoutbox',
+            name='document',
+            field=django.contrib.postgres.fields.jsonb.JSONField(default=None, null=True),
+        ),
+    ]
@@ -4,23 +4,48 @@
 # @author :: tallosan
 # ================================================================
 
+import json
+from datetime import timedelta
+from collections import OrderedDict, defaultdict
+
 from elasticsearch import Elasticsearch
+from elasticsearch.helpers import streaming_bulk
+from elasticsearch.exceptions import ElasticsearchException
 
-from django.db import models
+from django.apps import apps
+from django.db import models, transaction
 from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.contrib.postgres.fields import JSONField
+from django.dispatch import Signal
+from django.utils import timezone
 
 es = Elasticsearch([settings.ES_CONFIG])
 
+# Sent once a batch of changes has reached the index, with the (doc type,
+# document) of each document that was (re)indexed or deleted. Note, deleted
+# documents are sent as they were when they were deleted.
+index_shipped_signal = Signal(providing_args=['documents'])
+
+# Indices whose mappings have been put by this process.
+_initialized_indices = set()
+
 
 class IndexedModel(models.Model):
     """
     Custom model for models that require indexing functionality. Note,
     the core setup here is in the `_index_meta` property, which contains
     a persistant and immutable representation of our model's config.
+    Changes aren't sent to ES directly. Instead, they're written to the
+    `IndexOutbox` in the same transaction as the change itself, and
+    shipped to ES in bulk by the `index_outbox_drain_task`.
     Fields:
-        `_document_id` (int) -- The Elastic search index Id.
+        `_document_id` (int) -- The Elastic search index Id. Only set on
+            documents that were indexed before we began keying documents
+            by the model's pk.
     """
-    
+
     # Note, this is optional to keep the model validator happy.
     _document_id = models.CharField(
             max_length=32,
@@ -39,93 +64,99 @@ class IndexedModel(models.Model):
             `_index` (str) -- The index this document will belong to.
             `_indexable` (list of str) -- A list of fields to index.
             `_doc_type` (str) -- The type of document.
+            `_mapping` (dict) -- (Optional) Field mappings for the document
+                type. Without one, ES will infer the mappings itself.
         """
         raise NotImplementedError(
                 "error: all indexable models must implement this."
         )
 
-    def _create_or_update_index(self):
+    @classmethod
+    def _get_documents(cls, pks):
         """
-        Creates (or updates) an index, and returns a boolean value
-        that represents the result of the operation. Condensing these
-        two operations into a single wrapping function makes sense
-        here due to the way this method will be used going forwards.
+        Returns a dictionary of pk to document body, for each of the given
+        pks that still exists.
+        Args:
+            `pks` (list of int) -- The primary keys of the models to index.
         """
 
+        prototype = cls()
+        rows = cls._get_document_values().filter(pk__in=pks)
 
-        # Ensure that all ES configs are initialized, and valid.
-        _meta = self._index_meta
+        return dict(
+                (row["pk"], prototype._prepare_document(row)) for row in rows
+        )
+
+    @classmethod
+    def _get_document_values(cls):
+        """
+        Returns a queryset of the values that make up each document.
+        """
+
+        _meta = cls()._index_meta
         assert _meta["_indexable"] and _meta["_doc_type"], (
                 "error: the `_index_meta` property does not have an "
                 "an entry for `_indexable`. nothing to index!"
         )
-        assert _meta["_doc_type"], (
-                "error: `_index_meta` property does not have the "
-                "_doc_type` entry set. document type must "
-                "be specified!"
-        )
-
-        model_cls = type(self)
-        values = model_cls.objects.values(
-                "pk",
-                *_meta["_indexable"]
-        ).get(id=self.pk)
 
-        # Index (or re-index) the necessary values.
-        if self._document_id == None:
-            document_id = self._create(values, _meta)
-        else:
-            document_id = self._update(values, _meta)
+        return cls.objects.values("pk", *_meta["_indexable"])
 
-        return document_id
-
-    def _create(self, values, _meta):
+    def _prepare_document(self, values):
         """
-        Create a document in the given index.
+        Hook for transforming the indexed values into the document body
+        (e.g. to combine coordinates into a geo-point). By default, the
+        values are indexed as is.
         Args:
-            `values` (dict) -- The values contained in the document.
-            `_meta` (dict) -- Meta config for index.
+            `values` (dict) -- The values to be indexed.
         """
+        return values
 
-        response = es.index(
-                index=_meta["_index"],
-                doc_type=_meta["_doc_type"],
-                body=values
-        )
-
-        return response["_id"]
-
-    def _update(self, values, _meta):
+    def _init_index(self, _meta):
         """
-        Updates a document in the given index.
+        Create the index with its mappings, if it doesn't already exist.
+        This only hits ES once per index, per process.
         Args:
-            `values` (dict) -- The values contained in the document.
             `_meta` (dict) -- Meta config for index.
         """
 
-        response = es.update(
-                index=_meta["_index"],
-                doc_type=_meta["_doc_type"],
-                id=self._document_id,
-                body={"doc": values}
-        )
+        if _meta["_index"] in _initialized_indices:
+            return
 
-        return response["_id"]
+        body = {}
+        if _meta.get("_mapping"):
+            body["mappings"] = {_meta["_doc_type"]: _meta["_mapping"]}
 
-    def _delete_index(self):
+        # Note, ES returns a 400 if the index already exists. An existing
+        # index keeps its old mapping, and isn't searched until it's rebuilt
+        # (see `ElasticSearchBackend.check_mapping`).
+        es.indices.create(index=_meta["_index"], body=body, ignore=400)
+        _initialized_indices.add(_meta["_index"])
+
+    def _enqueue_index(self, action):
         """
-        Remove this model's document from the index it belongs to.
+        Queue this model's document to be (re)indexed, or deleted.
+        Args:
+            `action` (str) -- One of the `IndexOutbox` actions.
         """
 
+        # Note, we keep a copy of a deleted document, as there'll be nothing
+        # to read it from once it's shipped.
+        document = None
+        if action == IndexOutbox.DELETE:
+            document = self._get_documents([self.pk]).get(self.pk)
+            document = json.loads(json.dumps(document, cls=DjangoJSONEncoder))
+
         _meta = self._index_meta
-        response = es.delete(
+        IndexOutbox.objects.create(
                 index=_meta["_index"],
                 doc_type=_meta["_doc_type"],
-                id=self._document_id
+                document_id=self._document_id or str(self.pk),
+                model=self._meta.label_lower,
+                object_id=self.pk,
+                action=action,
+                document=document
         )
 
-        return response["result"] == "deleted"
-
     def save(self, *args, **kwargs):
         """
         We're overriding this to ensure that changes to this model type
@@ -134,19 +165,9 @@ class IndexedModel(models.Model):
         model (and an recently updated index).
         """
 
-        # We can't create any indices before the initial save because
-        # the related model's fields won't be available. Thus, to get
-        # around this we can keep track of the state, and do a second
-        # save if the model is newly created.
-        set_doc_id = True if self._state.adding else False
-        super(IndexedModel, self).save(*args, **kwargs)
-        self._document_id = self._create_or_update_index()
-
-        # If the model was just created, we need to toggle `force_insert`
-        # to false, so that we don't attempt to create a duplicate.
-        if set_doc_id:
-            kwargs["force_insert"] = False
+        with transaction.atomic():
             super(IndexedModel, self).save(*args, **kwargs)
+            self._enqueue_index(IndexOutbox.INDEX)
 
     def delete(self, *args, **kwargs):
         """
@@ -154,6 +175,182 @@ class IndexedModel(models.Model):
         subsequently reflected in our index.
         """
 
-        self._delete_index()
-        super(IndexedModel, self).delete(*args, **kwargs)
+        with transaction.atomic():
+            self._enqueue_index(IndexOutbox.DELETE)
+            super(IndexedModel, self).delete(*args, **kwargs)
+
+
+class IndexOutboxManager(models.Manager):
+
+    # Only one worker drains the outbox at a time.
+    lock_key = "vendr_core.index_outbox.lock"
+    lock_timeout = 60 * 5
+
+    """ Queue of pending changes that are ready to be shipped. """
+    def ready_queue(self):
+
+        return super(IndexOutboxManager, self).get_queryset().\
+                filter(available_time__lte=timezone.now()).\
+                order_by("id")
+
+    """ Ship pending changes to ES, one batch at a time, until the outbox is
+        empty (or only holds changes that are waiting to be retried).
+        Args:
+            batch_size (int) -- The maximum number of changes per bulk request.
+    """
+    def drain(self, batch_size=500):
+
+        if not cache.add(self.lock_key, True, self.lock_timeout):
+            return 0
+
+        shipped = 0
+        try:
+            while True:
+                batch = list(self.ready_queue()[:batch_size])
+                if not batch:
+                    break
+                shipped += self.ship(batch)
+        finally:
+            cache.delete(self.lock_key)
+
+        return shipped
+
+    """ Ship a batch of changes to ES. Repeated changes to the same document
+        are coalesced into a single action, and the document is read as it is
+        now, so only its latest state is sent. Changes that fail are retried
+        with an exponential backoff. Once the batch is written, the documents
+        that were shipped are sent with the `index_shipped_signal`.
+        Args:
+            batch (list of IndexOutbox) -- The changes to ship.
+    """
+    def ship(self, batch):
+
+        # Coalesce the changes on each document, keeping the latest.
+        changes = OrderedDict()
+        for change in batch:
+            key = (change.index, change.doc_type, change.document_id)
+            changes.setdefault(key, []).append(change)
+
+        # Read the current state of every document we're (re)indexing.
+        pks_by_model = defaultdict(list)
+        for key, document_changes in changes.items():
+            latest = document_changes[-1]
+            if latest.action == IndexOutbox.INDEX:
+                pks_by_model[latest.model].append(latest.object_id)
+
+        documents = {}
+        for label, pks in pks_by_model.items():
+            model_cls = apps.get_model(label)
+            for pk, body in model_cls._get_documents(pks).items():
+                documents[(label, pk)] = body
+
+        # The indices must exist (with their mappings) before we write to
+        # them, otherwise ES will create them with inferred mappings.
+        try:
+            for label in set(change.model for change in batch):
+                prototype = apps.get_model(label)()
+                prototype._init_index(prototype._index_meta)
+        except ElasticsearchException:
+            for change in batch:
+                change.retry()
+            return 0
+
+        # Note, a document that's been deleted since its change was queued
+        # is deleted from the index too.
+        actions = []
+        for (index, doc_type, document_id), document_changes in changes.items():
+            latest = document_changes[-1]
+            action = {"_index": index, "_type": doc_type, "_id": document_id}
+            body = documents.get((latest.model, latest.object_id))
+            if latest.action == IndexOutbox.INDEX and body is not None:
+                action.update({"_op_type": "index", "_source": body})
+            else:
+                action["_op_type"] = "delete"
+            actions.append(action)
+
+        # Note, results are yielded in the same order as the actions.
+        failed = set()
+        results = streaming_bulk(es, actions, raise_on_error=False,
+                raise_on_exception=False)
+        for key, (ok, item) in zip(changes.keys(), results):
+            op_type, info = item.popitem()
+            missing = (op_type == "delete") and (info.get("status") == 404)
+            if not (ok or missing):
+                failed.add(key)
+
+        # Clear what was shipped, and reschedule what wasn't.
+        shipped, retries, shipped_documents = [], [], []
+        for (key, document_changes), action in zip(changes.items(), actions):
+            if key in failed:
+                retries += document_changes
+                continue
+
+            shipped += [change.pk for change in document_changes]
+            if action["_op_type"] == "index":
+                shipped_documents.append((key[1], action["_source"]))
+            else:
+                shipped_documents += [
+                        (key[1], change.document) for change in document_changes
+                        if change.document is not None
+                ][-1:]
+
+        self.filter(pk__in=shipped).delete()
+        for change in retries:
+            change.retry()
+
+        if shipped_documents:
+            index_shipped_signal.send(sender=IndexOutbox,
+                    documents=shipped_documents)
+
+        return len(changes) - len(failed)
+
+
+class IndexOutbox(models.Model):
+    """
+    A pending change to a search index. Rows are written in the same
+    transaction as the change to the model, so the index can never miss an
+    update, and ES being down never fails a write.
+    Fields:
+        `index` (str) -- The index the document belongs to.
+        `doc_type` (str) -- The type of document.
+        `document_id` (str) -- The document's id in the index.
+        `model` (str) -- The label of the model the document is built from.
+        `object_id` (int) -- The pk of the model instance.
+        `action` (str) -- Whether to (re)index, or delete the document.
+        `document` (dict) -- The document as it was when it was deleted.
+        `attempts` (int) -- The number of failed attempts to ship this change.
+        `available_time` (datetime) -- When this change can next be shipped.
+    """
+
+    objects = IndexOutboxManager()
+
+    INDEX = "index"
+    DELETE = "delete"
+    _ACTIONS = (
+            (INDEX, "Index"),
+            (DELETE, "Delete")
+    )
+
+    # Failed changes are retried after 2^attempts seconds, up to this cap.
+    max_backoff = 60 * 10
+
+    index = models.CharField(max_length=64)
+    doc_type = models.CharField(max_length=64)
+    document_id = models.CharField(max_length=32)
+    model = models.CharField(max_length=100)
+    object_id = models.PositiveIntegerField()
+    action = models.CharField(choices=_ACTIONS, max_length=6)
+    document = JSONField(default=None, null=True)
+    attempts = models.PositiveIntegerField(default=0)
+    created_time = models.DateTimeField(auto_now_add=True)
+    available_time = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def retry(self):
+        """
+        Reschedule this change after a failed attempt to ship it.
+        """
 
+        self.attempts += 1
+        backoff = min(2 ** self.attempts, self.max_backoff)
+        self.available_time = timezone.now() + timedelta(seconds=backoff)
+        self.save(update_fields=["attempts", "available_time"])
@@ -0,0 +1,138 @@
+#
+# Redis publisher.
+#
+# Every process shares a single Redis connection pool, rather than opening
+# a new connection per message. Messages bound for several channels (e.g. a
+# chat message to each of its participants) are pipelined, so a fan-out
+# costs one round-trip no matter how many channels it reaches.
+#
+# ==========================================================================
+
+from __future__ import unicode_literals
+
+import json
+import time
+import logging
+import threading
+
+import redis
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# The connection pool shared by this process. Note, redis-py pools are
+# thread-safe, and are reset automatically in forked workers.
+connection_pool = redis.ConnectionPool(
+        host=settings.REDIS_HOST,
+        port=settings.REDIS_PORT,
+        db=0
+)
+
+
+def get_redis():
+    """
+    Returns a Redis client backed by the shared connection pool.
+    """
+    return redis.StrictRedis(connection_pool=connection_pool)
+
+
+class Publisher(object):
+    """
+    Publishes JSON messages to Redis channels. Pushes are best-effort, as
+    whatever we publish is also persisted (e.g. as a notification), so a
+    failed publish is counted and logged rather than raised.
+    Fields:
+        `redis` (StrictRedis) -- The client to publish with.
+    """
+
+    STATS = ('published', 'batches', 'errors')
+
+    def __init__(self, client=None):
+
+        self.redis = client or get_redis()
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    def publish(self, channel, message):
+        """
+        Publish a message to a single channel. Returns True if it was sent.
+        Args:
+            `channel` (str) -- The channel to publish to.
+            `message` (dict) -- The message. It's serialized as JSON.
+        """
+        return self.publish_many([(channel, message)])
+
+    def publish_many(self, messages):
+        """
+        Publish a batch of messages in a single round-trip. Returns True if
+        they were all sent.
+        Args:
+            `messages` (iterable of tuple) -- The (channel, message) pairs
+                to publish, in order.
+        """
+
+        # Note, messages are serialized once, however many channels they go to.
+        # Each message is kept alongside its payload, so that its id can't be
+        # reused by a later message (e.g. temporary dicts from a generator).
+        payloads, batch = {}, []
+        for channel, message in messages:
+            if id(message) not in payloads:
+                payloads[id(message)] = (message, json.dumps(message))
+            batch.append((channel, payloads[id(message)][1]))
+
+        if not batch:
+            return True
+
+        started = time.time()
+        try:
+            pipeline = self.redis.pipeline(transaction=False)
+            for channel, payload in batch:
+                pipeline.publish(channel, payload)
+            pipeline.execute()
+        except redis.RedisError:
+            logger.exception('failed to publish %d messages.', len(batch))
+            self._record(batch, started, failed=True)
+            return False
+
+        self._record(batch, started)
+        return True
+
+    def stats(self):
+        """
+        Returns this process's publish counters, and its publish latency
+        in milliseconds.
+        """
+
+        with self._lock:
+            stats = dict(self._stats)
+            latency = dict(self._latency)
+
+        stats['latency_avg'] = (latency['total'] / stats['batches']) \
+                if stats['batches'] else 0
+        stats['latency_max'] = latency['max']
+        return stats
+
+    def reset_stats(self):
+
+        with self._lock:
+            self._stats = dict((stat, 0) for stat in self.STATS)
+            self._latency = {'total': 0.0, 'max': 0.0}
+
+    def _record(self, batch, started, failed=False):
+        """
+        (Helper) Update the counters for a batch.
+        """
+
+        elapsed = (time.time() - started) * 1000
+        with self._lock:
+            self._stats['batches'] += 1
+            if failed:
+                self._stats['errors'] += 1
+            else:
+                self._stats['published'] += len(batch)
+            self._latency['total'] += elapsed
+            self._latency['max'] = max(self._latency['max'], elapsed)
+
+
+publisher = Publisher()
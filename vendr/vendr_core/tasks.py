@@ -0,0 +1,16 @@
+#
+# Periodic tasks for core models.
+#
+# ================================================================
+
+from __future__ import absolute_import
+from celery import shared_task
+
+from vendr_core.models import IndexOutbox
+
+
+""" Ship any pending search index changes to ES. """
+@shared_task
+def index_outbox_drain_task():
+
+    IndexOutbox.objects.drain()
@@ -0,0 +1,117 @@
+import json
+import redis
+
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+
+from kproperty.models import House, Location
+from vendr_core.models import IndexOutbox
+from vendr_core.publisher import Publisher, get_redis
+
+User = get_user_model()
+
+
+'''   Tests for the search index outbox. '''
+class TestIndexOutbox(TestCase):
+
+    def setUp(self):
+
+        self.user = User.objects.create_user(email='test@kanga.xyz', password='test')
+        self.house = House.objects.create(owner=self.user,
+                n_bathrooms=3, n_bedrooms=3, price=4500000, sqr_ftg=4200)
+
+    ''' Saving a model should queue its document to be indexed. '''
+    def test_enqueue_on_save(self):
+
+        change = IndexOutbox.objects.ready_queue().last()
+        self.assertEqual(change.action, IndexOutbox.INDEX)
+        self.assertEqual(change.document_id, str(self.house.pk))
+        self.assertEqual(change.model, 'kproperty.house')
+
+        Location.objects.create(kproperty=self.house, address='18 Bay Street',
+                city='Toronto', country='Canada', province='Ontario',
+                postal_code='M230B3', latitude=43.773313, longitude=-79.258729
+        )
+        self.assertEqual(IndexOutbox.objects.filter(object_id=self.house.pk).\
+                count(), 2)
+
+    ''' Deleting a model should queue its document to be deleted. '''
+    def test_enqueue_on_delete(self):
+
+        pk = self.house.pk
+        self.house.delete()
+
+        change = IndexOutbox.objects.ready_queue().last()
+        self.assertEqual(change.action, IndexOutbox.DELETE)
+        self.assertEqual(change.object_id, pk)
+
+    ''' Failed changes should be retried later, with a growing backoff. '''
+    def test_retry(self):
+
+        change = IndexOutbox.objects.ready_queue().last()
+        change.retry(); change.retry()
+
+        self.assertEqual(change.attempts, 2)
+        self.assertGreater(change.available_time, timezone.now())
+        self.assertNotIn(change, IndexOutbox.objects.ready_queue())
+
+    ''' A document's latest state is read in bulk when it's shipped. '''
+    def test_get_documents(self):
+
+        documents = House._get_documents([self.house.pk])
+        self.assertEqual(documents[self.house.pk]['price'], 4500000)
+        self.assertEqual(documents[self.house.pk]['property_type'], 'house')
+
+
+'''   Tests for the pipelined Redis publisher. '''
+class TestPublisher(TestCase):
+
+    ''' A batch of messages should be published in a single round-trip. '''
+    def test_publish_many(self):
+
+        subscriber = get_redis().pubsub(ignore_subscribe_messages=True)
+        subscriber.subscribe('users.1.inbox', 'users.2.inbox')
+
+        publisher = Publisher()
+        message = {'content': 'Hi'}
+        self.assertTrue(publisher.publish_many([
+                ('users.1.inbox', message), ('users.2.inbox', message)
+        ]))
+
+        stats = publisher.stats()
+        self.assertEqual(stats['published'], 2)
+        self.assertEqual(stats['batches'], 1)
+        self.assertEqual(stats['errors'], 0)
+
+        received = [subscriber.get_message(timeout=1) for _ in range(2)]
+        self.assertEqual(sorted(received_message['channel'] for
+                received_message in received), [b'users.1.inbox', b'users.2.inbox'])
+        subscriber.close()
+
+    ''' Distinct messages should each be sent as themselves, even if they're
+        only created as the batch is read. '''
+    def test_publish_many_generated(self):
+
+        subscriber = get_redis().pubsub(ignore_subscribe_messages=True)
+        subscriber.subscribe('users.1.inbox', 'users.2.inbox', 'users.3.inbox')
+
+        publisher = Publisher()
+        self.assertTrue(publisher.publish_many(
+                ('users.{}.inbox'.format(i), {'content': i}) for i in range(1, 4)
+        ))
+
+        received = [subscriber.get_message(timeout=1) for _ in range(3)]
+        self.assertEqual(sorted(json.loads(received_message['data'])['content']
+                for received_message in received), [1, 2, 3])
+        subscriber.close()
+
+    ''' A failed publish should be counted, rather than raised. '''
+    def test_publish_error(self):
+
+        publisher = Publisher(client=redis.StrictRedis(port=1))
+        self.assertFalse(publisher.publish('users.1.inbox', {'content': 'Hi'}))
+
+        stats = publisher.stats()
+        self.assertEqual(stats['errors'], 1)
+        self.assertEqual(stats['published'], 0)